@@ -0,0 +1,151 @@
+import pandas as pd
+from utils import findCharacterAverages, spliceDialogueSpans, joinSentimentSeries, balanceScript
+from script_store import loadScoredScript
+from interaction_index import buildInteractionIndex, receivedAverages
+from character_registry import (buildRegistry, copyRegistry, canonicalizeScripts, characterLabels,
+                                CHARACTER_LIST, TRAINING_DATA, CLASSIFICATIONS)
+from artifact_cache import buildStage, fingerprintStage, ARTIFACT_DIR
+
+# The scored scripts every analysis starts from, in movie order
+SCORED_SCRIPTS = ['scripts/EpisodeIV_Sentiments.csv',
+                  'scripts/EpisodeV_Sentiments.csv',
+                  'scripts/EpisodeVI_Sentiments.csv']
+
+# ************************************************************************************************
+# Function: loadRegistry()
+# Description: This function builds the character registry from the default files
+# Input Parameters: N/A
+# Returns: The registry (see character_registry.buildRegistry())
+# Pre: N/A
+# Post: N/A
+# ************************************************************************************************
+def loadRegistry():
+    return buildRegistry(CHARACTER_LIST, TRAINING_DATA, CLASSIFICATIONS)
+
+# ************************************************************************************************
+# Function: loadMovies()
+# Description: This function loads the scored scripts of the three movies
+# Input Parameters: The character registry
+# Returns: A list of dataframes with the columns 'line', 'character', and 'sentiment'
+# Pre: N/A
+# Post: The 'character' columns are registry Categoricals, so aliases are merged and every movie's
+#       codes are the same character ids. Names the registry doesn't know are registered in a copy of
+#       it, since the registry is a cached stage of its own and must not change after it is stored
+# ************************************************************************************************
+def loadMovies(registry):
+    return canonicalizeScripts(copyRegistry(registry), [loadScoredScript(path, ['line', 'character', 'sentiment'])
+                                                        for path in SCORED_SCRIPTS])
+
+# ************************************************************************************************
+# Function: concatenateMovies()
+# Description: This function puts the movies end to end
+# Input Parameters: The list of movie dataframes
+# Returns: A single dataframe with every line of every movie
+# Pre: N/A
+# Post: N/A
+# ************************************************************************************************
+def concatenateMovies(movies):
+    return pd.concat(movies)
+
+# ************************************************************************************************
+# Function: loadClassifications()
+# Description: This function loads the protagonist and antagonist classification of every character
+# Input Parameters: N/A
+# Returns: A dataframe with the columns 'character' and 'classification'
+# Pre: N/A
+# Post: N/A
+# ************************************************************************************************
+def loadClassifications():
+    return pd.read_csv(CLASSIFICATIONS)
+
+# ************************************************************************************************
+# Function: classifyMovies()
+# Description: This function labels every line with its speaker's classification
+# Input Parameters: The list of movie dataframes and the character registry
+# Returns: A single dataframe of every classified line with the columns 'character', 'sentiment', and
+#          'classification'
+# Pre: The movies' 'character' columns are registry Categoricals (see loadMovies()). Their codes may go
+#      past the registry's ids for names that were only registered while loading the movies
+# Post: Each line's label is looked up by indexing the registry's label array with the column's codes,
+#       which gives the same lines, in the same order, as merging each movie with
+#       Protagonist_or_Antagonist.csv on the character names. Lines by unclassified characters are
+#       dropped, like the merge's inner join did
+# ************************************************************************************************
+def classifyMovies(movies, registry):
+    classified = []
+    for movie in movies:
+        labels = characterLabels(registry, movie['character'].cat.codes.to_numpy())
+        keep = pd.notna(labels)
+        classified.append(pd.DataFrame({'character': movie['character'].to_numpy()[keep].astype(object),
+                                        'sentiment': movie['sentiment'].to_numpy()[keep],
+                                        'classification': labels[keep]}))
+    return pd.concat(classified)
+
+# The analysis pipeline. Each stage lists the stages whose results it takes (in argument order), the
+# data files and code it depends on, and its parameters with their defaults
+PIPELINE = {'registry': {'function': loadRegistry,
+                         'files': [CHARACTER_LIST, TRAINING_DATA, CLASSIFICATIONS],
+                         'code': ['character_registry.py']},
+            'movies': {'function': loadMovies,
+                       'inputs': ['registry'],
+                       'files': SCORED_SCRIPTS,
+                       'code': ['script_store.py', 'character_registry.py']},
+            'full_script': {'function': concatenateMovies,
+                            'inputs': ['movies']},
+            'character_averages': {'function': findCharacterAverages,
+                                   'inputs': ['full_script'],
+                                   'code': ['utils.py'],
+                                   'params': {'minLines': 20}},
+            'dialogues': {'function': spliceDialogueSpans,
+                          'inputs': ['movies'],
+                          'code': ['utils.py'],
+                          'params': {'minLength': 4}},
+            'interactions': {'function': buildInteractionIndex,
+                             'inputs': ['movies', 'dialogues'],
+                             'code': ['utils.py', 'interaction_index.py']},
+            'average_received': {'function': receivedAverages,
+                                 'inputs': ['interactions'],
+                                 'code': ['interaction_index.py'],
+                                 'params': {'minLines': 20}},
+            'sentiment_table': {'function': joinSentimentSeries,
+                                'inputs': ['character_averages', 'average_received'],
+                                'code': ['utils.py']},
+            'classifications': {'function': loadClassifications,
+                                'files': [CLASSIFICATIONS]},
+            'classified_script': {'function': classifyMovies,
+                                  'inputs': ['movies', 'registry'],
+                                  'code': ['character_registry.py']},
+            'balanced_script': {'function': balanceScript,
+                                'inputs': ['classified_script'],
+                                'code': ['utils.py'],
+                                'params': {'seed': 0}}}
+
+# Results already loaded or computed in this process, by fingerprint, so each notebook cell that asks
+# for an artifact again gets it straight from memory
+_results = {}
+
+# ************************************************************************************************
+# Function: buildArtifact()
+# Description: This function gets the result of one stage of the analysis pipeline
+# Input Parameters: The stage's name, the settings dict (parameter overrides keyed by stage name,
+#                   e.g. {'dialogues': {'minLength': 6}}), and the cache folder
+# Returns: The stage's result
+# Pre: The name is a key of PIPELINE
+# Post: Only the stages whose fingerprints have changed since they were last stored are computed.
+#       data_analysis.py and classification.py share the stored 'movies' and everything built on it
+# ************************************************************************************************
+def buildArtifact(name, settings=None, cacheDir=ARTIFACT_DIR):
+    return buildStage(PIPELINE, name, settings, cacheDir, _results)
+
+# ************************************************************************************************
+# Function: artifactFingerprint()
+# Description: This function gives the fingerprint of one stage of the analysis pipeline
+# Input Parameters: The stage's name, the settings dict (see buildArtifact()), and a dict of
+#                   fingerprints already found, shared between calls so each file is hashed once
+# Returns: The stage's fingerprint as a hex string
+# Pre: The name is a key of PIPELINE
+# Post: Only the data files and code are hashed. No stage is loaded or computed
+# ************************************************************************************************
+def artifactFingerprint(name, settings=None, fingerprints=None):
+    return fingerprintStage(PIPELINE, name, {} if settings is None else settings,
+                            {} if fingerprints is None else fingerprints)
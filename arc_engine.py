@@ -0,0 +1,219 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+from profiling import profiled
+
+# ************************************************************************************************
+# Function: newArcState()
+# Description: This function starts the running state of one sentiment-arc stream
+# Input Parameters: The number of lines in the rolling window, the half-life (in lines) of the
+#                   exponentially weighted average, and the change-point settings: the CUSUM
+#                   threshold and drift (in standard deviations) and the fewest lines a segment needs
+#                   before a change can end it
+# Returns: A dict holding the settings and everything carried from one batch to the next
+# Pre: window >= 1 and halfLife > 0
+# Post: The state's size never grows with the number of lines. Only the last window - 1 sentiments,
+#       a few running sums, and one running total per character are kept
+# ************************************************************************************************
+def newArcState(window=25, halfLife=10, threshold=5.0, drift=0.25, minSegment=10):
+    return {'window': window,
+            'alpha': 1 - 0.5 ** (1 / halfLife),
+            'threshold': threshold,
+            'drift': drift,
+            'minSegment': minSegment,
+            'lines': 0,
+            'tail': np.zeros(0),
+            'ewma': None,
+            'characters': {},
+            'segment': [0, 0.0, 0.0],
+            'cusum': [0.0, 0.0]}
+
+# ************************************************************************************************
+# Function: rollingMeans()
+# Description: This function finds the rolling average sentiment at each line of a batch
+# Input Parameters: The arc state and the batch's sentiments
+# Returns: An array with the average of each line and the window - 1 lines before it (fewer at the
+#          start of the stream)
+# Pre: N/A
+# Post: The window is one cumulative sum over the carried tail plus the batch, and the tail is
+#       replaced with the batch's last window - 1 sentiments
+# ************************************************************************************************
+def rollingMeans(state, values):
+    window = state['window']
+    tail = state['tail']
+    sums = np.r_[0, np.cumsum(np.r_[tail, values])]
+    ends = np.arange(len(tail) + 1, len(sums))
+    starts = np.maximum(ends - window, 0)
+    state['tail'] = np.r_[tail, values][-(window - 1):] if window > 1 else np.zeros(0)
+    return (sums[ends] - sums[starts]) / (ends - starts)
+
+# ************************************************************************************************
+# Function: ewmaValues()
+# Description: This function finds the exponentially weighted average sentiment at each line of a
+#              batch
+# Input Parameters: The arc state and the batch's sentiments
+# Returns: An array of the weighted averages, the same as pandas' ewm(alpha, adjust=False).mean()
+#          over the whole stream
+# Pre: N/A
+# Post: The recurrence is run by scipy's lfilter() with the last average as its initial condition, so
+#       no line is visited in Python. The stream's first line starts the average
+# ************************************************************************************************
+def ewmaValues(state, values):
+    if not len(values):
+        return np.zeros(0)
+    alpha = state['alpha']
+    previous = values[0] if state['ewma'] is None else state['ewma']
+    averages, _ = lfilter([alpha], [1, alpha - 1], values, zi=[(1 - alpha) * previous])
+    state['ewma'] = averages[-1]
+    return averages
+
+# ************************************************************************************************
+# Function: characterRunningAverages()
+# Description: This function finds each speaker's average sentiment so far at each line of a batch
+# Input Parameters: The arc state and the batch's characters and sentiments
+# Returns: An array with each line's speaker's average over all of their lines up to and including it
+# Pre: N/A
+# Post: The batch's totals per character are found with one grouped cumulative sum and added to the
+#       totals carried from earlier batches, which are then updated
+# ************************************************************************************************
+def characterRunningAverages(state, characters, values):
+    codes, names = pd.factorize(pd.Series(characters, dtype=object))
+    totals = state['characters']
+    priorCounts = np.array([totals.get(name, (0, 0.0))[0] for name in names], dtype=float)
+    priorSums = np.array([totals.get(name, (0, 0.0))[1] for name in names], dtype=float)
+
+    grouped = pd.Series(values).groupby(codes)
+    counts = grouped.cumcount().to_numpy() + 1 + priorCounts[codes]
+    sums = grouped.cumsum().to_numpy() + priorSums[codes]
+
+    batchCounts = np.bincount(codes, minlength=len(names))
+    batchSums = np.bincount(codes, weights=values, minlength=len(names))
+    for code, name in enumerate(names):
+        totals[name] = (priorCounts[code] + batchCounts[code], priorSums[code] + batchSums[code])
+    return sums / counts
+
+# ************************************************************************************************
+# Function: detectChangePoints()
+# Description: This function flags the lines where the sentiment level shifts
+# Input Parameters: The arc state and the batch's sentiments
+# Returns: An array with 1 where the sentiment shifts up, -1 where it shifts down, and 0 elsewhere
+# Pre: N/A
+# Post: A two-sided CUSUM is run on each line's deviation from the current segment's mean, in units
+#       of the segment's standard deviation (both kept with Welford's method). Once either sum passes
+#       the threshold, the line is flagged and a new segment starts with it. Nothing is tested until
+#       the segment has minSegment lines, so the first lines' noisy spread can't set one off
+# ************************************************************************************************
+def detectChangePoints(state, values):
+    threshold, drift, minSegment = state['threshold'], state['drift'], state['minSegment']
+    count, mean, squares = state['segment']
+    upper, lower = state['cusum']
+    changes = np.zeros(len(values), dtype=np.int8)
+
+    for i, value in enumerate(values.tolist()):
+        if count >= minSegment:
+            deviation = (value - mean) / max((squares / (count - 1)) ** 0.5, 1e-9)
+            upper = max(0.0, upper + deviation - drift)
+            lower = max(0.0, lower - deviation - drift)
+            if upper > threshold or lower > threshold:
+                changes[i] = 1 if upper > threshold else -1
+                count, mean, squares = 0, 0.0, 0.0
+                upper, lower = 0.0, 0.0
+        count += 1
+        delta = value - mean
+        mean += delta / count
+        squares += delta * (value - mean)
+
+    state['segment'] = [count, mean, squares]
+    state['cusum'] = [upper, lower]
+    return changes
+
+# ************************************************************************************************
+# Function: updateArc()
+# Description: This function runs one batch of lines through an arc stream
+# Input Parameters: The arc state and a dataframe of the next lines, in script order
+# Returns: A dataframe with the batch's 'line', 'character', and 'sentiment' columns plus 'rolling',
+#          'ewma', 'character_average', and 'change' (1, -1, or 0)
+# Pre: The batch has the columns 'line', 'character', and 'sentiment'
+# Post: Every result depends only on the lines up to it, so the output is the same however the
+#       stream is cut into batches
+# ************************************************************************************************
+@profiled('arc', countResult=True)
+def updateArc(state, batch):
+    values = batch['sentiment'].to_numpy(dtype=float)
+    characters = batch['character'].to_numpy(dtype=object)
+    arc = pd.DataFrame({'line': batch['line'].to_numpy(),
+                        'character': characters,
+                        'sentiment': values,
+                        'rolling': rollingMeans(state, values),
+                        'ewma': ewmaValues(state, values),
+                        'character_average': characterRunningAverages(state, characters, values),
+                        'change': detectChangePoints(state, values)})
+    state['lines'] += len(values)
+    return arc
+
+# ************************************************************************************************
+# Function: streamArc()
+# Description: This function runs a stream of batches through a new arc stream
+# Input Parameters: An iterable of batches (see updateArc()) and the settings for newArcState()
+# Returns: A generator of the arc dataframes, one per batch, each yielded as soon as it is done
+# Pre: The batches are one script (or one continuous story) in order
+# Post: Only one batch and the arc state are held at a time
+# ************************************************************************************************
+def streamArc(batches, **settings):
+    state = newArcState(**settings)
+    for batch in batches:
+        yield updateArc(state, batch)
+
+# ************************************************************************************************
+# Function: readScoredBatches()
+# Description: This function reads a scored script CSV a fixed number of lines at a time
+# Input Parameters: The path to the scored script CSV and the number of lines per batch
+# Returns: A generator of dataframes with the columns 'line', 'character', and 'sentiment'
+# Pre: N/A
+# Post: Only the three columns are parsed and only one batch is in memory at a time
+# ************************************************************************************************
+def readScoredBatches(csvPath, batchSize=1024):
+    with pd.read_csv(csvPath, usecols=['line', 'character', 'sentiment'], chunksize=batchSize) as reader:
+        for batch in reader:
+            yield batch
+
+# ************************************************************************************************
+# Function: writeArc()
+# Description: This function streams a scored script through the arc engine into a CSV file
+# Input Parameters: The path to the scored script CSV, the path to write the arc to, the number of
+#                   lines per batch, and the settings for newArcState()
+# Returns: A dataframe of the change points (the arc rows where 'change' isn't 0)
+# Pre: N/A
+# Post: Each batch's arc is appended to the output as soon as it is computed, so memory stays flat
+#       however long the script is
+# ************************************************************************************************
+def writeArc(csvPath, outputPath, batchSize=1024, **settings):
+    changePoints = []
+    with open(outputPath, 'w', newline='', encoding='utf-8') as outputFile:
+        for number, arc in enumerate(streamArc(readScoredBatches(csvPath, batchSize), **settings)):
+            arc.to_csv(outputFile, index=False, header=number == 0)
+            changePoints.append(arc[arc['change'] != 0])
+    return pd.concat(changePoints, ignore_index=True) if changePoints else pd.DataFrame()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stream scored scripts into rolling sentiment arcs with change points')
+    parser.add_argument('scripts', nargs='+', help='scored script CSV files')
+    parser.add_argument('--output-dir', default='arcs')
+    parser.add_argument('--batch-size', type=int, default=1024)
+    parser.add_argument('--window', type=int, default=25, help='lines in the rolling average')
+    parser.add_argument('--half-life', type=float, default=10, help='half-life of the weighted average in lines')
+    parser.add_argument('--threshold', type=float, default=5.0, help='CUSUM threshold in standard deviations')
+    parser.add_argument('--drift', type=float, default=0.25, help='CUSUM drift in standard deviations')
+    parser.add_argument('--min-segment', type=int, default=10, help='fewest lines between change points')
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for script in args.scripts:
+        output = os.path.join(args.output_dir, os.path.basename(script).replace('_Sentiments', '_Arc'))
+        changes = writeArc(script, output, args.batch_size, window=args.window, halfLife=args.half_life,
+                           threshold=args.threshold, drift=args.drift, minSegment=args.min_segment)
+        print(script, '->', output)
+        for line, change, level in zip(changes['line'], changes['change'], changes['ewma']):
+            print('   line', line, 'up' if change > 0 else 'down', 'at weighted average %.3f' % level)
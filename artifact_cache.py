@@ -0,0 +1,116 @@
+import hashlib
+import inspect
+import json
+import os
+import pathlib
+import pickle
+import numpy as np
+import pandas as pd
+from manifest import fileDigest
+from profiling import stage, countEvent
+
+# Where stage results are pickled, one file per stage and fingerprint
+ARTIFACT_DIR = 'scripts/artifact_cache'
+
+# ************************************************************************************************
+# Function: fingerprintStage()
+# Description: This function hashes everything that decides what a pipeline stage produces
+# Input Parameters: The pipeline dict, the stage's name, the settings dict (parameter overrides keyed
+#                   by stage name), and a dict of fingerprints already found in this run
+# Returns: The stage's fingerprint as a hex string
+# Pre: Every stage named in an 'inputs' list is in the pipeline and the pipeline has no cycles
+# Post: The stage's name, its function's source, its parameters (defaults overridden by the
+#       settings), the contents of its 'files' and 'code' files, the numpy and pandas versions, and
+#       the fingerprints of its inputs are hashed together with SHA-256. A change anywhere upstream
+#       therefore changes every stage below it, and nothing else. Each file is only hashed once a run
+# ************************************************************************************************
+def fingerprintStage(pipeline, name, settings, fingerprints):
+    if name in fingerprints:
+        return fingerprints[name]
+    definition = pipeline[name]
+    params = dict(definition.get('params', {}), **settings.get(name, {}))
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps({'stage': name,
+                              'params': params,
+                              'source': inspect.getsource(definition['function']),
+                              'versions': [np.__version__, pd.__version__]}, sort_keys=True).encode('utf-8'))
+    for path in definition.get('files', []) + definition.get('code', []):
+        if 'file:' + path not in fingerprints:
+            fingerprints['file:' + path] = fileDigest(path) if os.path.isfile(path) else 'missing'
+        digest.update((path + '=' + fingerprints['file:' + path] + '\n').encode('utf-8'))
+    for inputName in definition.get('inputs', []):
+        digest.update((inputName + '=' + fingerprintStage(pipeline, inputName, settings, fingerprints) + '\n').encode('utf-8'))
+
+    fingerprints[name] = digest.hexdigest()
+    return fingerprints[name]
+
+# ************************************************************************************************
+# Function: artifactPath()
+# Description: This function gives the file a stage's result is stored in
+# Input Parameters: The cache folder, the stage's name, and its fingerprint
+# Returns: A pathlib.Path like scripts/artifact_cache/dialogues-<first 16 hex digits>.pkl
+# Pre: N/A
+# Post: Nothing is read or written
+# ************************************************************************************************
+def artifactPath(cacheDir, name, fingerprint):
+    return pathlib.Path(cacheDir) / (name + '-' + fingerprint[:16] + '.pkl')
+
+# ************************************************************************************************
+# Function: pruneArtifacts()
+# Description: This function removes a stage's oldest stored results
+# Input Parameters: The cache folder, the stage's name, and the number of results to keep
+# Returns: N/A
+# Pre: N/A
+# Post: The most recently used results are kept, so switching a parameter back and forth between a
+#       few values never recomputes anything
+# ************************************************************************************************
+def pruneArtifacts(cacheDir, name, keep=3):
+    stored = sorted(pathlib.Path(cacheDir).glob(name + '-*.pkl'), key=lambda path: path.stat().st_mtime, reverse=True)
+    for path in stored[keep:]:
+        path.unlink()
+
+# ************************************************************************************************
+# Function: buildStage()
+# Description: This function gets a pipeline stage's result, computing only what isn't cached
+# Input Parameters: The pipeline dict, the stage's name, the settings dict (parameter overrides keyed
+#                   by stage name), the cache folder, a dict of results already loaded in this run,
+#                   and a dict of fingerprints already found in this run
+# Returns: The stage's result
+# Pre: Each stage's function takes its inputs' results, in the order of its 'inputs' list, followed
+#      by its parameters as keyword arguments, and returns something that can be pickled
+# Post: A stage with a stored result for its fingerprint is loaded without even loading its inputs.
+#       Otherwise its inputs are built the same way, it is computed, and its result is written to a
+#       temporary file and moved into place so a crash never leaves half an artifact behind. Results
+#       are kept in memory for the rest of the run
+# ************************************************************************************************
+def buildStage(pipeline, name, settings=None, cacheDir=ARTIFACT_DIR, results=None, fingerprints=None):
+    settings = {} if settings is None else settings
+    results = {} if results is None else results
+    fingerprints = {} if fingerprints is None else fingerprints
+    fingerprint = fingerprintStage(pipeline, name, settings, fingerprints)
+    if fingerprint in results:
+        return results[fingerprint]
+
+    path = artifactPath(cacheDir, name, fingerprint)
+    if path.is_file():
+        countEvent('artifact_hits')
+        with stage('load'), open(path, 'rb') as artifactFile:
+            results[fingerprint] = pickle.load(artifactFile)
+        os.utime(path)
+        return results[fingerprint]
+
+    countEvent('artifact_misses')
+    definition = pipeline[name]
+    inputs = [buildStage(pipeline, inputName, settings, cacheDir, results, fingerprints)
+              for inputName in definition.get('inputs', [])]
+    params = dict(definition.get('params', {}), **settings.get(name, {}))
+    results[fingerprint] = definition['function'](*inputs, **params)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tempPath = path.with_name(path.name + '.tmp')
+    with open(tempPath, 'wb') as artifactFile:
+        pickle.dump(results[fingerprint], artifactFile, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tempPath, path)
+    pruneArtifacts(cacheDir, name)
+    return results[fingerprint]
@@ -0,0 +1,229 @@
+import argparse
+import json
+import platform
+import subprocess
+import time
+import numpy as np
+import pandas as pd
+import sklearn
+from synthetic_scripts import makeSyntheticScript, makeSyntheticClassifications
+from utils import (spliceDialogues, spliceDialogueSpans, findAverageReceived, findCharacterAverages,
+                   joinSentimentSeries, balanceScript, fitRegression)
+from interaction_index import buildInteractionIndex
+from profiling import peakRssMegabytes
+
+# Each benchmark takes the prepared data for one script size and runs one analytics function on it
+BENCHMARKS = {'spliceDialogues': lambda data: spliceDialogues(data['movies']),
+              'spliceDialogueSpans': lambda data: spliceDialogueSpans(data['movies']),
+              'findAverageReceived': lambda data: findAverageReceived(data['movies'], data['spans']),
+              'buildInteractionIndex': lambda data: buildInteractionIndex(data['movies'], data['spans']),
+              'findCharacterAverages': lambda data: findCharacterAverages(data['script']),
+              'joinSentimentSeries': lambda data: joinSentimentSeries(data['expressed'], data['received']),
+              'balanceScript': lambda data: balanceScript(data['classified'], seed=0),
+              'fitRegression': lambda data: fitRegression(data['X'], data['y'], 3)}
+
+# ************************************************************************************************
+# Function: prepareData()
+# Description: This function generates a synthetic script and everything the benchmarks take as
+#              input
+# Input Parameters: The number of lines and characters and the random seed
+# Returns: A dict with the script, the list of movies, the dialogue spans, the expressed and received
+#          averages, the script with classifications, and the regression's X and y arrays
+# Pre: N/A
+# Post: The inputs are built once per size so that only the function under test is timed
+# ************************************************************************************************
+def prepareData(numLines, numCharacters, seed=0):
+    script = makeSyntheticScript(numLines, numCharacters, seed)
+    classifications = makeSyntheticClassifications(script, seed)
+    labels = classifications['classification'].to_numpy()
+    spans = spliceDialogueSpans([script])
+    return {'script': script,
+            'movies': [script],
+            'spans': spans,
+            'expressed': findCharacterAverages(script),
+            'received': findAverageReceived([script], spans),
+            'classified': script.assign(classification=labels[script['character'].cat.codes.to_numpy()]),
+            'X': script[['line']].to_numpy(dtype=float),
+            'y': script[['sentiment']].to_numpy(dtype=float)}
+
+# ************************************************************************************************
+# Function: timeCall()
+# Description: This function times a benchmark on one set of inputs
+# Input Parameters: The benchmark function, its data, and the most repeats to run
+# Returns: The fastest time in seconds
+# Pre: N/A
+# Post: A call that takes over a second is only run once, since its noise is small next to its
+#       length and the big sizes would otherwise take too long
+# ************************************************************************************************
+def timeCall(benchmark, data, repeats=3):
+    bestSeconds = float('inf')
+    for i in range(repeats):
+        start = time.perf_counter()
+        benchmark(data)
+        bestSeconds = min(bestSeconds, time.perf_counter() - start)
+        if bestSeconds > 1:
+            break
+    return bestSeconds
+
+# ************************************************************************************************
+# Function: scalingExponent()
+# Description: This function estimates how a benchmark's time grows with the number of lines
+# Input Parameters: The line counts and the matching times
+# Returns: The slope of log(time) against log(lines) (1 for linear, 2 for quadratic), or None if
+#          there are fewer than two sizes long enough to measure
+# Pre: N/A
+# Post: Times under a millisecond are left out because fixed overhead dominates them
+# ************************************************************************************************
+def scalingExponent(lineCounts, seconds):
+    lineCounts = np.asarray(lineCounts, dtype=float)
+    seconds = np.asarray(seconds, dtype=float)
+    measurable = seconds >= 1e-3
+    if measurable.sum() < 2 or len(np.unique(lineCounts[measurable])) < 2:
+        return None
+    return float(np.polyfit(np.log(lineCounts[measurable]), np.log(seconds[measurable]), 1)[0])
+
+# ************************************************************************************************
+# Function: runBenchmarks()
+# Description: This function times every selected benchmark at every script size
+# Input Parameters: The list of line counts, the list of character counts, the benchmark names, the
+#                   most repeats per measurement, the time after which a benchmark isn't run at any
+#                   larger size, and the random seed
+# Returns: A list of result dicts with 'function', 'lines', 'characters', 'seconds', and
+#          'lines_per_second' ('seconds' is None for skipped sizes)
+# Pre: The benchmark names are keys of BENCHMARKS
+# Post: Sizes are run from smallest to largest. Once a benchmark takes longer than maxSeconds, it is
+#       skipped for the remaining line counts with the same number of characters, so a quadratic
+#       function shows up in the results without stalling the whole run
+# ************************************************************************************************
+def runBenchmarks(lineCounts, characterCounts, names, repeats=3, maxSeconds=30, seed=0):
+    results = []
+    for numCharacters in sorted(characterCounts):
+        tooSlow = set()
+        for numLines in sorted(lineCounts):
+            if all(name in tooSlow for name in names):
+                break
+            data = prepareData(numLines, numCharacters, seed)
+            for name in names:
+                seconds = None if name in tooSlow else timeCall(BENCHMARKS[name], data, repeats)
+                if seconds is not None and seconds > maxSeconds:
+                    tooSlow.add(name)
+                results.append({'function': name,
+                                'lines': numLines,
+                                'characters': numCharacters,
+                                'seconds': seconds,
+                                'lines_per_second': numLines / seconds if seconds else None})
+                print(name, numLines, numCharacters, 'skipped' if seconds is None else '%.4fs' % seconds, flush=True)
+            del data
+    return results
+
+# ************************************************************************************************
+# Function: summarizeScaling()
+# Description: This function estimates each benchmark's scaling exponent at every character count
+# Input Parameters: The results from runBenchmarks()
+# Returns: A dataframe with the columns 'function', 'characters', and 'exponent'
+# Pre: N/A
+# Post: Skipped sizes are left out
+# ************************************************************************************************
+def summarizeScaling(results):
+    table = pd.DataFrame(results).dropna(subset=['seconds'])
+    rows = [{'function': function, 'characters': characters,
+             'exponent': scalingExponent(group['lines'], group['seconds'])}
+            for (function, characters), group in table.groupby(['function', 'characters'], sort=False)]
+    return pd.DataFrame(rows, columns=['function', 'characters', 'exponent'])
+
+# ************************************************************************************************
+# Function: compareWithHistory()
+# Description: This function compares a run's times with the last run recorded in the history file
+# Input Parameters: The results from runBenchmarks() and the path to the history file
+# Returns: A dataframe with the function, lines, characters, previous and current seconds, and
+#          their ratio for every size both runs measured
+# Pre: The history file is in the JSON lines format appendHistory() writes, or doesn't exist
+# Post: N/A
+# ************************************************************************************************
+def compareWithHistory(results, historyPath):
+    try:
+        with open(historyPath) as historyFile:
+            history = [json.loads(line) for line in historyFile if line.strip()]
+    except FileNotFoundError:
+        history = []
+    if not history:
+        return pd.DataFrame(columns=['function', 'lines', 'characters', 'previous_seconds', 'seconds', 'ratio'])
+
+    lastRun = history[-1]['run']
+    previous = pd.DataFrame([record for record in history if record['run'] == lastRun])
+    previous = previous.rename(columns={'seconds': 'previous_seconds'})
+    current = pd.DataFrame(results)
+    table = current.merge(previous[['function', 'lines', 'characters', 'previous_seconds']],
+                          on=['function', 'lines', 'characters']).dropna(subset=['seconds', 'previous_seconds'])
+    table['ratio'] = table['seconds'] / table['previous_seconds']
+    return table[['function', 'lines', 'characters', 'previous_seconds', 'seconds', 'ratio']]
+
+# ************************************************************************************************
+# Function: appendHistory()
+# Description: This function adds a run's results to the history file
+# Input Parameters: The results from runBenchmarks() and the path to the history file
+# Returns: N/A
+# Pre: N/A
+# Post: One JSON object per measurement is appended, each tagged with the run's time, the git commit
+#       (if there is one), the peak RSS of the run, and the Python, numpy, pandas, and scikit-learn
+#       versions, so scaling curves can be followed across commits and upgrades
+# ************************************************************************************************
+def appendHistory(results, historyPath):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    run = {'run': time.strftime('%Y-%m-%dT%H:%M:%S'),
+           'commit': commit,
+           'python': platform.python_version(),
+           'numpy': np.__version__,
+           'pandas': pd.__version__,
+           'sklearn': sklearn.__version__,
+           'peak_rss_mb': peakRssMegabytes()}
+    with open(historyPath, 'a') as historyFile:
+        for result in results:
+            historyFile.write(json.dumps(dict(run, **result)) + '\n')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the utils.py analytics on synthetic scripts')
+    parser.add_argument('--lines', type=int, nargs='+', default=[1000, 10000, 100000, 1000000],
+                        help='script sizes in lines (up to 10000000)')
+    parser.add_argument('--characters', type=int, nargs='+', default=[10, 100, 1000],
+                        help='numbers of characters (up to 10000)')
+    parser.add_argument('--functions', nargs='+', default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--max-seconds', type=float, default=30,
+                        help='stop running a function at larger sizes once one call takes this long')
+    parser.add_argument('--history', default='benchmark_results.jsonl',
+                        help='JSON lines file every run is appended to')
+    parser.add_argument('--no-history', action='store_true', help="don't record this run")
+    parser.add_argument('--max-exponent', type=float, default=1.5,
+                        help='scaling exponent above which a function is reported as superlinear')
+    parser.add_argument('--max-slowdown', type=float, default=1.5,
+                        help='ratio to the last recorded run above which a time is reported as a regression')
+    parser.add_argument('--strict', action='store_true',
+                        help='exit with status 1 if anything is superlinear or slower than the last run')
+    args = parser.parse_args()
+
+    benchmarkResults = runBenchmarks(args.lines, args.characters, args.functions, args.repeats, args.max_seconds)
+
+    pd.set_option('display.width', 200)
+    scaling = summarizeScaling(benchmarkResults)
+    print()
+    print(scaling.to_string(index=False))
+    superlinear = scaling[scaling['exponent'] > args.max_exponent]
+
+    comparison = compareWithHistory(benchmarkResults, args.history)
+    slower = comparison[comparison['ratio'] > args.max_slowdown]
+    if not args.no_history:
+        appendHistory(benchmarkResults, args.history)
+
+    if len(superlinear.index):
+        print('\nSuperlinear scaling (exponent > ' + str(args.max_exponent) + '):')
+        print(superlinear.to_string(index=False))
+    if len(slower.index):
+        print('\nSlower than the last recorded run (more than ' + str(args.max_slowdown) + 'x):')
+        print(slower.to_string(index=False))
+    if args.strict and (len(superlinear.index) or len(slower.index)):
+        raise SystemExit(1)
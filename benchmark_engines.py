@@ -0,0 +1,94 @@
+import argparse
+import json
+import pickle
+import time
+import numpy as np
+from light_engine import trainLightModel, scoreLinesLight
+from script_store import loadScoredScript
+
+# The scored scripts whose Rasa sentiments the light engine is compared against
+SCORED_SCRIPTS = ['scripts/EpisodeIV_Sentiments.csv',
+                  'scripts/EpisodeV_Sentiments.csv',
+                  'scripts/EpisodeVI_Sentiments.csv']
+
+# ************************************************************************************************
+# Function: timeThroughput()
+# Description: This function measures how many lines per second a scoring function handles
+# Input Parameters: A function that scores a list of lines, the lines, and how many times to repeat
+#                   the measurement
+# Returns: The scores from the last repeat and the best lines-per-second rate over all repeats
+# Pre: N/A
+# Post: The fastest repeat is reported so one-off hiccups don't hide the engine's real speed
+# ************************************************************************************************
+def timeThroughput(scoreFunction, lines, repeats=3):
+    bestSeconds = float('inf')
+    for i in range(repeats):
+        start = time.perf_counter()
+        scores = scoreFunction(lines)
+        bestSeconds = min(bestSeconds, time.perf_counter() - start)
+    return scores, len(lines) / bestSeconds
+
+# ************************************************************************************************
+# Function: compareSentiments()
+# Description: This function measures how closely two engines' sentiments agree
+# Input Parameters: Two arrays of sentiment values for the same lines
+# Returns: A dict with the share of lines given the same intent (sign), the Pearson correlation, and
+#          the mean absolute difference
+# Pre: Both arrays have the same length
+# Post: Nothing is modified
+# ************************************************************************************************
+def compareSentiments(sentiments, reference):
+    sentiments = np.asarray(sentiments, dtype=float)
+    reference = np.asarray(reference, dtype=float)
+    return {'intent_agreement': float(np.mean((sentiments >= 0) == (reference >= 0))),
+            'correlation': float(np.corrcoef(sentiments, reference)[0, 1]),
+            'mean_absolute_difference': float(np.mean(np.abs(sentiments - reference)))}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the light sentiment engine with the Rasa engine')
+    parser.add_argument('--training-data', default='sentiments.json')
+    parser.add_argument('--rasa-model', default=None,
+                        help='persisted Rasa model directory to time as well (needs rasa_nlu and spaCy)')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--output', default=None, help='also write the report to this JSON file')
+    args = parser.parse_args()
+
+    scripts = [loadScoredScript(path, ['dialogue', 'sentiment']) for path in SCORED_SCRIPTS]
+    lines = [line for script in scripts for line in script['dialogue']]
+    storedSentiments = np.concatenate([script['sentiment'].to_numpy(dtype=float) for script in scripts])
+
+    # The light engine's startup is timed both from scratch and from its pickled model
+    start = time.perf_counter()
+    lightModel = trainLightModel(args.training_data)
+    trainSeconds = time.perf_counter() - start
+    pickled = pickle.dumps(lightModel)
+    start = time.perf_counter()
+    lightModel = pickle.loads(pickled)
+    loadSeconds = time.perf_counter() - start
+
+    lightScores, lightRate = timeThroughput(lambda batch: scoreLinesLight(batch, lightModel), lines, args.repeats)
+    report = {'lines': len(lines),
+              'light': {'train_seconds': trainSeconds,
+                        'load_seconds': loadSeconds,
+                        'model_megabytes': len(pickled) / 2 ** 20,
+                        'lines_per_second': lightRate,
+                        'vs_stored_rasa_scores': compareSentiments(lightScores['sentiment'], storedSentiments)}}
+
+    if args.rasa_model:
+        from rasa_nlu.model import Interpreter
+        from scoring import scoreLines
+
+        start = time.perf_counter()
+        interpreter = Interpreter.load(args.rasa_model)
+        rasaLoadSeconds = time.perf_counter() - start
+
+        rasaScores, rasaRate = timeThroughput(lambda batch: scoreLines(batch, interpreter), lines, args.repeats)
+        report['rasa'] = {'load_seconds': rasaLoadSeconds,
+                          'lines_per_second': rasaRate,
+                          'vs_stored_rasa_scores': compareSentiments(rasaScores['sentiment'], storedSentiments)}
+        report['light']['vs_rasa'] = compareSentiments(lightScores['sentiment'], rasaScores['sentiment'])
+
+    print(json.dumps(report, indent=4))
+    if args.output:
+        with open(args.output, 'w') as outputFile:
+            json.dump(report, outputFile, indent=4)
@@ -0,0 +1,195 @@
+import json
+import numpy as np
+import pandas as pd
+
+# The files the default registry is built from
+CHARACTER_LIST = 'Character_List.txt'
+TRAINING_DATA = 'sentiments.json'
+CLASSIFICATIONS = 'scripts/Protagonist_or_Antagonist.csv'
+
+# The registry shared by every module in this process, built the first time getRegistry() is called
+_registry = None
+
+# ************************************************************************************************
+# Function: registerName()
+# Description: This function adds a canonical character name to a registry
+# Input Parameters: The registry and the name
+# Returns: The name's id
+# Pre: N/A
+# Post: A name that is already registered keeps its id. A new one gets the next id and is its own
+#       alias (in lowercase). Names registered after the registry is built have no label (see
+#       characterLabels())
+# ************************************************************************************************
+def registerName(registry, name):
+    if name in registry['ids']:
+        return registry['ids'][name]
+    characterId = len(registry['names'])
+    registry['names'].append(name)
+    registry['ids'][name] = characterId
+    registry['aliases'].setdefault(name.strip().lower(), characterId)
+    return characterId
+
+# ************************************************************************************************
+# Function: buildRegistry()
+# Description: This function interns every known character name to a dense integer id
+# Input Parameters: The path to the character list, the path to the Rasa training data with the
+#                   entity synonyms, and the path to the protagonist and antagonist classifications
+# Returns: A registry dict with 'names' (the canonical name of every id), 'ids' (canonical name to id),
+#          'aliases' (every lowercase name or synonym to its id), and 'labels' (an object array with
+#          each id's classification, or None)
+# Pre: Any of the files may be missing, in which case it is skipped
+# Post: The character list's names get the first ids, in file order, then any synonym values and
+#       classified characters it doesn't have. Synonyms resolve to the first value that lists them,
+#       like dataset_builder.loadEntityNames(), so OBI-WAN is BEN and C-3PO is THREEPIO. Canonical
+#       names keep the spelling the scripts use. The labels are collected first and made into the
+#       array once every classified character has its id
+# ************************************************************************************************
+def buildRegistry(characterListPath=CHARACTER_LIST, trainingDataPath=TRAINING_DATA, classificationsPath=CLASSIFICATIONS):
+    registry = {'names': [], 'ids': {}, 'aliases': {}, 'labels': np.empty(0, dtype=object)}
+    try:
+        with open(characterListPath) as characterList:
+            for character in characterList:
+                if character.strip():
+                    registerName(registry, character.strip())
+    except FileNotFoundError:
+        pass
+
+    try:
+        with open(trainingDataPath) as trainingFile:
+            synonyms = json.load(trainingFile)['rasa_nlu_data'].get('entity_synonyms', [])
+    except FileNotFoundError:
+        synonyms = []
+    for synonym in synonyms:
+        registerName(registry, synonym['value'])
+    for synonym in synonyms:
+        for name in synonym['synonyms']:
+            registry['aliases'].setdefault(name.strip().lower(), registry['ids'][synonym['value']])
+
+    try:
+        classifications = pd.read_csv(classificationsPath)
+    except FileNotFoundError:
+        classifications = pd.DataFrame(columns=['character', 'classification'])
+    labeled = []
+    for character, classification in zip(classifications['character'], classifications['classification']):
+        characterId = resolveName(registry, character)
+        labeled.append((characterId, classification))
+    labels = [None] * len(registry['names'])
+    for characterId, classification in labeled:
+        labels[characterId] = classification
+    registry['labels'] = np.array(labels, dtype=object)
+    return registry
+
+# ************************************************************************************************
+# Function: getRegistry()
+# Description: This function gives the registry shared across modules
+# Input Parameters: N/A
+# Returns: The registry built from the default files
+# Pre: N/A
+# Post: The registry is only built once per process
+# ************************************************************************************************
+def getRegistry():
+    global _registry
+    if _registry is None:
+        _registry = buildRegistry()
+    return _registry
+
+# ************************************************************************************************
+# Function: copyRegistry()
+# Description: This function copies a registry so names can be registered without changing the original
+# Input Parameters: The registry
+# Returns: A new registry with the same names, ids, aliases, and labels
+# Pre: N/A
+# Post: The names, ids, aliases, and labels are copied, so the copy can grow on its own. Ids already in
+#       the original mean the same character in the copy
+# ************************************************************************************************
+def copyRegistry(registry):
+    return {'names': list(registry['names']),
+            'ids': dict(registry['ids']),
+            'aliases': dict(registry['aliases']),
+            'labels': registry['labels'].copy()}
+
+# ************************************************************************************************
+# Function: resolveName()
+# Description: This function finds the id of a character name or alias
+# Input Parameters: The registry, the name, and whether to register names that aren't known yet
+# Returns: The id, or -1 for an unknown name that wasn't registered
+# Pre: N/A
+# Post: Case and surrounding whitespace are ignored
+# ************************************************************************************************
+def resolveName(registry, name, register=True):
+    characterId = registry['aliases'].get(str(name).strip().lower())
+    if characterId is not None:
+        return characterId
+    return registerName(registry, str(name).strip()) if register else -1
+
+# ************************************************************************************************
+# Function: internCharacters()
+# Description: This function turns a column of character names into registry ids
+# Input Parameters: The registry, the names (a Series, Categorical, or array), and whether to register
+#                   names that aren't known yet
+# Returns: An int32 array of ids (-1 for missing names and unknown ones that weren't registered)
+# Pre: N/A
+# Post: The column is factorized first (a categorical column just hands over its codes), so each
+#       distinct name is resolved once and the rest is one array lookup
+# ************************************************************************************************
+def internCharacters(registry, characters, register=True):
+    codes, uniques = pd.factorize(characters)
+    uniqueIds = np.array([resolveName(registry, name, register) for name in uniques] + [-1], dtype=np.int32)
+    return uniqueIds[codes]
+
+# ************************************************************************************************
+# Function: characterColumn()
+# Description: This function turns registry ids back into a column of canonical names
+# Input Parameters: The registry and the ids
+# Returns: A pandas Categorical whose codes are the ids themselves and whose categories are every
+#          registered name
+# Pre: Every id is registered or -1
+# Post: Because the codes are the ids, columns from any script share one set of categories and can be
+#       concatenated, compared, and grouped without touching a string
+# ************************************************************************************************
+def characterColumn(registry, ids):
+    return pd.Categorical.from_codes(np.asarray(ids, dtype=np.int32), categories=list(registry['names']))
+
+# ************************************************************************************************
+# Function: characterNames()
+# Description: This function looks up the canonical name of each character id
+# Input Parameters: The registry and the ids
+# Returns: An object array with each id's canonical name, or None for -1
+# Pre: Every id is registered or -1
+# Post: A None is put on the end of the names so that -1 lands on it instead of wrapping around to
+#       the last registered name
+# ************************************************************************************************
+def characterNames(registry, ids):
+    return np.array(registry['names'] + [None], dtype=object)[np.asarray(ids)]
+
+# ************************************************************************************************
+# Function: canonicalizeScripts()
+# Description: This function replaces the scripts' character names with the registry's canonical ones
+# Input Parameters: The registry and the list of script dataframes
+# Returns: A list of copies of the scripts whose 'character' columns are registry Categoricals (see
+#          characterColumn())
+# Pre: The scripts have a 'character' column
+# Post: Aliases are merged into their canonical character. Every script is interned before any
+#       column is built, so names first seen in a later script are registered in time and all of the
+#       columns share exactly the same categories
+# ************************************************************************************************
+def canonicalizeScripts(registry, scripts):
+    ids = [internCharacters(registry, script['character']) for script in scripts]
+    return [script.assign(character=characterColumn(registry, scriptIds)) for script, scriptIds in zip(scripts, ids)]
+
+# ************************************************************************************************
+# Function: characterLabels()
+# Description: This function looks up the classification of each character id
+# Input Parameters: The registry and the ids
+# Returns: An object array with each id's classification, or None for unlabeled characters and -1
+# Pre: N/A
+# Post: This is a single array index, replacing a merge on the character names. The labels are padded
+#       with None up to one past the largest id, so ids registered after the registry was built (even
+#       in a copy of it, see copyRegistry()) and -1 land on a None
+# ************************************************************************************************
+def characterLabels(registry, ids):
+    ids = np.asarray(ids)
+    size = max(len(registry['labels']), int(ids.max()) + 1 if ids.size else 0)
+    labels = np.full(size + 1, None, dtype=object)
+    labels[:len(registry['labels'])] = registry['labels']
+    return labels[ids]
@@ -7,45 +7,42 @@ from sklearn.model_selection import train_test_split
 from sklearn.tree import DecisionTreeClassifier, export_text
 from sklearn import metrics
 from utils import *
+from analysis_pipeline import buildArtifact
 
 # %%
 # Description: This cell reads in the dataframes from the CSV files and cuts them to only the columns we
 #              need
 # Input: The CSV files for the scripts of the three movies with sentiments as well as the file with
 #        classifications of characters as protagonists, antagonists, or neither
-# Output: The files are all read into separate dataframes. The episode dataframes have all columns removed
-#         except for 'character' and 'sentiment'
+# Output: The files are all read into separate dataframes. Only the 'line', 'character', and 'sentiment'
+#         columns are loaded for the episodes, straight from the columnar stores if they exist
 # Notes: - The Protagonist_or_Antagonist.csv file is only used in this part of the project. It was not
 #          from the original Kaggle dataset. In fact, I made it by hand using an auto-generated list of
 #          of all characters in the three movies and Google. Here, it gives us something nice to try to
 #          classify with different models
+#        - Both come from the artifact cache in analysis_pipeline.py, so the movies stored by a run of
+#          data_analysis.py are reused here instead of being loaded again
 
-ep1 = pd.read_csv('scripts/EpisodeIV_Sentiments.csv')
-ep2 = pd.read_csv('scripts/EpisodeV_Sentiments.csv')
-ep3 = pd.read_csv('scripts/EpisodeVI_Sentiments.csv')
+ep1, ep2, ep3 = buildArtifact('movies')
 
-ep1 = ep1[['character', 'sentiment']]
-ep2 = ep2[['character', 'sentiment']]
-ep3 = ep3[['character', 'sentiment']]
-
-classifications = pd.read_csv('scripts/Protagonist_or_Antagonist.csv')
+classifications = buildArtifact('classifications')
 
 # %%
 # Description: This cell merges the episode dataframes with the character classification dataframe and
 #              equalizes protagonists and antagonists
 # Input: The individul movie dataframes (ep1, ep2, ep3) and the classifications dataframe
-# Output: The episode dataframes with an added 'classification' column classifying the character who speaks
-#         each line as well as a full_script dataframe with all of these movie dataframes put together
+# Output: A full_script dataframe with every line of the three movies and an added 'classification' column
+#         classifying the character who speaks each line (each movie is merged on its own and then they are
+#         put together)
 # Notes: - Because the protagonists speak so much more than the antagonists in these movies, balanceScript()
 #          samples the protagonist lines randomly so that there is an equal number of protagonist and
 #          antagonist lines and none from character classified as "Neither"
+#        - The sample is seeded (the 'seed' setting of the balanced_script stage), and so are the train/test
+#          split and the tree below, so that the accuracy scores come out the same every run. Passing
+#          strata= to balanceScript() would balance each movie separately instead
 
-ep1 = ep1.merge(classifications, on='character')
-ep2 = ep2.merge(classifications, on='character')
-ep3 = ep3.merge(classifications, on='character')
-
-full_script = pd.concat([ep1, ep2, ep3])
-modified_script = balanceScript(full_script)
+full_script = buildArtifact('classified_script')
+modified_script = buildArtifact('balanced_script', {'balanced_script': {'seed': 0}})
 
 # %%
 # Description: This cell initializes a KNN classifier and tests it on the data
@@ -66,7 +63,7 @@ modified_script = balanceScript(full_script)
 knnClassifier = KNeighborsClassifier(n_neighbors=2)
 X = modified_script[['sentiment']]
 y = modified_script[['classification']]
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2)
+X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=0, stratify=y)
 
 knnClassifier.fit(X_train, np.ravel(y_train))
 y_pred = knnClassifier.predict(X_test)
@@ -99,7 +96,7 @@ plt.show()
 #          sentiment so that the data can be used to see if received sentiment is more predictive of
 #          protaginist vs. antagonist classification. That may be more helpful
 
-classTreeModel = DecisionTreeClassifier(max_depth=2)
+classTreeModel = DecisionTreeClassifier(max_depth=2, random_state=0)
 classTreeModel.fit(X_train, np.ravel(y_train))
 print(export_text(classTreeModel, feature_names=X_train.columns.to_list()))
 print('DT Accuracy Score:', metrics.accuracy_score(y_test, classTreeModel.predict(X_test)))
@@ -0,0 +1,300 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.model_selection import RepeatedStratifiedKFold
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.tree import DecisionTreeClassifier
+from script_store import loadScoredScript
+from utils import spliceDialogueSpans, findLineReceived, balanceIndex
+from character_registry import getRegistry, internCharacters, characterNames, characterLabels
+from profiling import profiled, countEvent
+
+# The columns each named feature set trains on
+FEATURE_SETS = {'expressed': ['sentiment'],
+                'received': ['received'],
+                'both': ['sentiment', 'received']}
+
+# The fold data each worker process evaluates configurations on, set by initSweepWorker()
+_workerFeatures = None
+_workerLabels = None
+_workerSplits = None
+_workerSeed = None
+
+# ************************************************************************************************
+# Function: buildSweepData()
+# Description: This function builds the table of lines the classifiers are evaluated on
+# Input Parameters: The list of scored script dataframes, the character registry with the
+#                   classifications, and the minimum dialogue length used to find received sentiments
+# Returns: A dataframe with one row per protagonist or antagonist line and the columns 'character',
+#          'sentiment', 'received', and 'classification'
+# Pre: The scripts have the columns 'character' and 'sentiment'
+# Post: 'received' is the sentiment of the line each line answers in dialogue (from
+#       findLineReceived()), or 0 (neutral) for lines that aren't answering anyone. Each line's
+#       speaker is interned once and labeled by indexing the registry's label array, so aliases share
+#       their character's label. Lines by unclassified characters and characters classified as
+#       'Neither' are dropped. Nothing is balanced here, since that is done inside each training fold
+#       so no test line is ever left out
+# ************************************************************************************************
+def buildSweepData(movies, registry, minLength=4):
+    script = pd.concat([movie[['character', 'sentiment']] for movie in movies], ignore_index=True)
+    script['sentiment'] = script['sentiment'].astype(float)
+    script['received'] = np.nan_to_num(findLineReceived(movies, spliceDialogueSpans(movies, minLength)))
+    ids = internCharacters(registry, script['character'])
+    script['character'] = characterNames(registry, ids)
+    script['classification'] = characterLabels(registry, ids)
+    keep = pd.notna(script['classification']) & (script['classification'] != 'Neither')
+    return script[keep].reset_index(drop=True)
+
+# ************************************************************************************************
+# Function: makeSweepConfigs()
+# Description: This function lists every model configuration in a sweep
+# Input Parameters: The values of k to try for KNN, the depths to try for the decision tree (None
+#                   for unlimited), and the names of the feature sets to try them on
+# Returns: A list of configuration dicts, each with 'model', 'features', and the model's parameters
+# Pre: The feature set names are keys of FEATURE_SETS
+# Post: KNN is tried with both uniform and distance weights
+# ************************************************************************************************
+def makeSweepConfigs(neighbors, depths, featureSets):
+    configs = []
+    for featureSet in featureSets:
+        for k in neighbors:
+            for weights in ['uniform', 'distance']:
+                configs.append({'model': 'knn', 'features': featureSet, 'n_neighbors': int(k), 'weights': weights})
+        for depth in depths:
+            configs.append({'model': 'tree', 'features': featureSet, 'max_depth': depth})
+    return configs
+
+# ************************************************************************************************
+# Function: makeClassifier()
+# Description: This function creates the unfitted classifier for a configuration
+# Input Parameters: The configuration dict and the random seed for models that use one
+# Returns: The scikit-learn classifier
+# Pre: The configuration came from makeSweepConfigs()
+# Post: N/A
+# ************************************************************************************************
+def makeClassifier(config, seed):
+    if config['model'] == 'knn':
+        return KNeighborsClassifier(n_neighbors=config['n_neighbors'], weights=config['weights'])
+    if config['model'] == 'tree':
+        return DecisionTreeClassifier(max_depth=config['max_depth'], random_state=seed)
+    raise ValueError('UNKNOWN MODEL: ' + str(config['model']))
+
+# ************************************************************************************************
+# Function: sweepDataKey()
+# Description: This function fingerprints everything besides the configuration that a fold's
+#              results depend on
+# Input Parameters: The sweep data, the number of folds, the number of repeats, and the random seed
+# Returns: A hex string used to key cached fold results
+# Pre: N/A
+# Post: The features, labels, fold layout, seed, and scikit-learn version are hashed together, so
+#       cached results are only reused when they would come out the same
+# ************************************************************************************************
+def sweepDataKey(script, folds, repeats, seed):
+    digest = hashlib.sha256()
+    for featureName in ['sentiment', 'received']:
+        digest.update(script[featureName].to_numpy(dtype=np.float64).tobytes())
+    digest.update('\n'.join(script['classification']).encode('utf-8'))
+    digest.update(json.dumps([folds, repeats, seed, sklearn.__version__]).encode('utf-8'))
+    return digest.hexdigest()
+
+# ************************************************************************************************
+# Function: openSweepCache()
+# Description: This function opens the on-disk cache of fold results, creating it if needed
+# Input Parameters: The path to the SQLite database file
+# Returns: An open sqlite3 connection
+# Pre: The folder holding the database file exists
+# Post: The 'folds' table is created if it doesn't exist yet, keyed by the data key, the
+#       configuration (as sorted JSON), and the split number
+# ************************************************************************************************
+def openSweepCache(path='scripts/sweep_cache.sqlite'):
+    connection = sqlite3.connect(str(path))
+    connection.execute('CREATE TABLE IF NOT EXISTS folds ('
+                       'data_key TEXT NOT NULL, '
+                       'config TEXT NOT NULL, '
+                       'split INTEGER NOT NULL, '
+                       'accuracy REAL NOT NULL, '
+                       'balanced_accuracy REAL NOT NULL, '
+                       'f1 REAL NOT NULL, '
+                       'PRIMARY KEY (data_key, config, split))')
+    connection.commit()
+    return connection
+
+# ************************************************************************************************
+# Function: initSweepWorker()
+# Description: This function gives a pool worker the data every fold is evaluated on
+# Input Parameters: The sweep data, the list of (train, test) index arrays, and the random seed
+# Returns: N/A
+# Pre: This function is run once by multiprocessing.Pool as each worker process starts
+# Post: Each feature set is turned into a numpy array and kept in module globals with the labels,
+#       so the data is only sent to each worker once rather than with every task
+# ************************************************************************************************
+def initSweepWorker(script, splits, seed):
+    global _workerFeatures, _workerLabels, _workerSplits, _workerSeed
+    _workerFeatures = {name: script[columns].to_numpy(dtype=float) for name, columns in FEATURE_SETS.items()}
+    _workerLabels = pd.factorize(script['classification'], sort=True)[0]
+    _workerSplits = splits
+    _workerSeed = seed
+
+# ************************************************************************************************
+# Function: foldScores()
+# Description: This function scores a fold's predictions
+# Input Parameters: The true and predicted class codes and the number of classes
+# Returns: A tuple of the accuracy, balanced accuracy (mean recall), and macro F1 score
+# Pre: The classes are coded 0 to numClasses - 1
+# Post: The scores come from one confusion matrix built with np.bincount(), which gives the same
+#       values as sklearn.metrics without its input checks, which took most of each fold's time
+# ************************************************************************************************
+def foldScores(truth, predictions, numClasses):
+    confusion = np.bincount(truth * numClasses + predictions, minlength=numClasses ** 2).reshape(numClasses, numClasses)
+    hits = np.diag(confusion).astype(float)
+    actual = confusion.sum(axis=1)
+    predicted = confusion.sum(axis=0)
+    recall = np.divide(hits, actual, out=np.zeros(numClasses), where=actual > 0)
+    f1 = np.divide(2 * hits, actual + predicted, out=np.zeros(numClasses), where=actual + predicted > 0)
+    return float(hits.sum() / len(truth)), float(recall[actual > 0].mean()), float(f1.mean())
+
+# ************************************************************************************************
+# Function: evaluateFold()
+# Description: This function fits one configuration on one training fold and scores it on the
+#              matching test fold
+# Input Parameters: A (configuration JSON, split number) tuple
+# Returns: A (configuration JSON, split number, accuracy, balanced accuracy, macro F1) tuple
+# Pre: initSweepWorker() has already been run in this process
+# Post: The protagonist lines of the training fold are sampled down to the number of antagonist
+#       lines (or the other way around) with balanceIndex(). The sample depends only on the seed
+#       and the split, so every configuration is trained on exactly the same lines. The test fold is
+#       left unbalanced, which is why balanced accuracy is reported alongside accuracy
+# ************************************************************************************************
+def evaluateFold(task):
+    configJson, split = task
+    config = json.loads(configJson)
+    train, test = _workerSplits[split]
+    labels = _workerLabels
+
+    train = train[balanceIndex(labels[train], seed=[_workerSeed, split])]
+
+    features = _workerFeatures[config['features']]
+    classifier = makeClassifier(config, _workerSeed)
+    classifier.fit(features[train], labels[train])
+    predictions = classifier.predict(features[test])
+    return (configJson, split) + foldScores(labels[test], predictions, labels.max() + 1)
+
+# ************************************************************************************************
+# Function: runSweep()
+# Description: This function evaluates every configuration with repeated stratified K-fold
+#              cross-validation, reusing cached fold results
+# Input Parameters: The sweep data, the list of configurations, the number of folds and repeats, the
+#                   random seed, the number of worker processes, and an optional open sweep cache
+# Returns: A dataframe of fold results with the columns 'config', 'split', 'accuracy',
+#          'balanced_accuracy', and 'f1'
+# Pre: The data came from buildSweepData() and the configurations from makeSweepConfigs()
+# Post: Only the (configuration, split) pairs missing from the cache are evaluated. With more than
+#       one worker they are spread over a process pool in chunks, since each fold only takes
+#       milliseconds. New results are stored in the cache as they arrive, so an interrupted sweep
+#       picks up where it left off
+# ************************************************************************************************
+@profiled('sweep', lambda script, configs, *args, **kwargs: len(script.index) * len(configs))
+def runSweep(script, configs, folds=5, repeats=10, seed=0, workers=1, connection=None):
+    configJsons = [json.dumps(config, sort_keys=True) for config in configs]
+    dataKey = sweepDataKey(script, folds, repeats, seed)
+    splits = list(RepeatedStratifiedKFold(n_splits=folds, n_repeats=repeats, random_state=seed)
+                  .split(script[['sentiment']], script['classification']))
+
+    results = []
+    if connection is not None:
+        query = 'SELECT config, split, accuracy, balanced_accuracy, f1 FROM folds WHERE data_key = ? AND config = ?'
+        for configJson in configJsons:
+            results.extend(connection.execute(query, (dataKey, configJson)).fetchall())
+    done = set((configJson, split) for configJson, split, *scores in results)
+    tasks = [(configJson, split) for configJson in configJsons for split in range(len(splits))
+             if (configJson, split) not in done]
+    countEvent('sweep_cache_hits', len(done))
+    countEvent('sweep_folds_evaluated', len(tasks))
+
+    def storeResults(newResults):
+        results.extend(newResults)
+        if connection is not None:
+            with connection:
+                connection.executemany('INSERT OR REPLACE INTO folds VALUES (?, ?, ?, ?, ?, ?)',
+                                       [(dataKey,) + result for result in newResults])
+
+    if workers <= 1:
+        initSweepWorker(script, splits, seed)
+        for i in range(0, len(tasks), 500):
+            storeResults([evaluateFold(task) for task in tasks[i:i + 500]])
+    elif tasks:
+        chunkSize = max(1, min(64, len(tasks) // (workers * 4)))
+        with multiprocessing.Pool(workers, initializer=initSweepWorker, initargs=(script, splits, seed)) as pool:
+            pending = []
+            for result in pool.imap_unordered(evaluateFold, tasks, chunksize=chunkSize):
+                pending.append(result)
+                if len(pending) >= 500:
+                    storeResults(pending)
+                    pending = []
+            storeResults(pending)
+
+    return pd.DataFrame(results, columns=['config', 'split', 'accuracy', 'balanced_accuracy', 'f1'])
+
+# ************************************************************************************************
+# Function: rankSweep()
+# Description: This function ranks the configurations of a sweep by their cross-validated scores
+# Input Parameters: The fold results from runSweep()
+# Returns: A dataframe with one row per configuration, its parameters as columns, the mean and
+#          standard deviation of each score across folds, and its rank
+# Pre: N/A
+# Post: Configurations are ranked by mean balanced accuracy, then mean macro F1, best first
+# ************************************************************************************************
+def rankSweep(results):
+    summary = results.groupby('config')[['accuracy', 'balanced_accuracy', 'f1']].agg(['mean', 'std'])
+    summary.columns = [score + '_' + statistic for score, statistic in summary.columns]
+    summary['folds'] = results.groupby('config').size()
+    summary = summary.sort_values(['balanced_accuracy_mean', 'f1_mean'], ascending=False)
+
+    parameters = pd.DataFrame([json.loads(configJson) for configJson in summary.index], index=summary.index)
+    parameters = parameters[['model', 'features'] + [column for column in ['n_neighbors', 'weights', 'max_depth']
+                                                     if column in parameters.columns]]
+    for column in ['n_neighbors', 'max_depth']:
+        if column in parameters.columns:
+            parameters[column] = parameters[column].astype('Int64')
+    table = pd.concat([parameters, summary], axis=1).reset_index(drop=True)
+    table.insert(0, 'rank', np.arange(1, len(table.index) + 1))
+    return table
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cross-validated sweep of the protagonist/antagonist classifiers')
+    parser.add_argument('--neighbors', type=int, nargs='+', default=list(range(1, 51)), help='values of k for KNN')
+    parser.add_argument('--depths', nargs='+', default=[str(depth) for depth in range(1, 13)] + ['none'],
+                        help='decision tree depths ("none" for unlimited)')
+    parser.add_argument('--features', nargs='+', default=list(FEATURE_SETS), choices=list(FEATURE_SETS))
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--cache', default='scripts/sweep_cache.sqlite', help='SQLite file fold results are cached in')
+    parser.add_argument('--no-cache', action='store_true', help='evaluate every fold without reading or writing the cache')
+    parser.add_argument('--output', default=None, help='also write the ranked table to this CSV file')
+    parser.add_argument('--top', type=int, default=20, help='how many of the best configurations to print')
+    args = parser.parse_args()
+
+    movies = [loadScoredScript('scripts/EpisodeIV_Sentiments.csv', ['character', 'sentiment']),
+              loadScoredScript('scripts/EpisodeV_Sentiments.csv', ['character', 'sentiment']),
+              loadScoredScript('scripts/EpisodeVI_Sentiments.csv', ['character', 'sentiment'])]
+    sweepData = buildSweepData(movies, getRegistry())
+
+    depths = [None if depth.lower() == 'none' else int(depth) for depth in args.depths]
+    configs = makeSweepConfigs(args.neighbors, depths, args.features)
+    connection = None if args.no_cache else openSweepCache(args.cache)
+
+    foldResults = runSweep(sweepData, configs, args.folds, args.repeats, args.seed, args.workers, connection)
+    ranking = rankSweep(foldResults)
+
+    pd.set_option('display.width', 200)
+    print(ranking.head(args.top).to_string(index=False))
+    if args.output:
+        ranking.to_csv(args.output, index=False)
@@ -2,12 +2,16 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 from utils import *
+from regression_engine import fitArcRegressions, plotPolynomial, formatEquation, writeEquations
+from arc_engine import newArcState, updateArc
+from interaction_index import pairStats, pairTable
+from analysis_pipeline import buildArtifact
 
 # %%
 # Description: This cell reads the CSV's for the three movies into separate dataframes and makes an
 # 			   additional dataframe for all three movies combined
-# Input: The CSV files containing all of the lines in the movies as well as their adjusted sentiment
-# 		  values
+# Input: The scored scripts containing all of the lines in the movies as well as their adjusted sentiment
+# 		  values. Only the columns used in the analysis are loaded, from the columnar stores if they exist
 # Output: Three dataframes (ep1, ep2, & ep3) are created for the individual movie scripts. A list is
 # 		  also created containing all three dataframes as well as a single dataframe with all three
 # 		  movies concatenated together
@@ -17,129 +21,92 @@ from utils import *
 # 		 - You may notice that the use of ep1, ep2, and ep3 doesn't match the names of the CSV files.
 # 		   This may be confusing for those unfamiliar with the film franchise, but this naming was in
 # 		   keeping with the ordering prior to the creation of the prequels
-
-ep1 = pd.read_csv('scripts/EpisodeIV_Sentiments.csv')
-ep2 = pd.read_csv('scripts/EpisodeV_Sentiments.csv')
-ep3 = pd.read_csv('scripts/EpisodeVI_Sentiments.csv')
-
-movies = [ep1, ep2, ep3]
-
-full_script = pd.concat(movies)
-
-# %%
-# Description: This cell separates the X and Y variables for regression and fits a regression model to the
-# 			   first movie
-# Input: The inputs for this cell are the 'line' and 'sentiment' columns from the ep1 dataframe
-# Output: A cubic (degree 3) polynomial regression is made and fit to the data
-# Notes: - In this case, a degree three polynomial regression was made for the data, but this changes
-# 		   for subsequent movies. The parameter deg in the fitRegression() function allows me to set the
-# 		   degree of the polynomial regression. If I choose to change this in the future, however, I
-# 		   should be careful to change it in the call to the plotRegression() function as well.
-# 		   Otherwise, the plot will not accurately reflect the model
-
-X1 = ep1[['line']].values.reshape(-1, 1)
-y1 = ep1[['sentiment']].values.reshape(-1, 1)
-
-polyModel = fitRegression(X1, y1, deg=3)
-
-# %%
-# Description: This cell plots the regression for the first movie
-# Input: This cell needs the X and y variables used in the regression as numpy arrays as well as the
-# 		 fitted regression model
-# Output: The regression is plotted and axis labels and a title are added
-# Notes: - I refrained from hard coding the axis titles and main title into the plotRegression() function
-# 		   because I wanted to be able to generalize the function to different data, which may need
-# 		   different titles
-
-plotRegression(X1, y1, polyModel, deg=3)
-plt.xlabel('Line Number', fontsize=14)
-plt.ylabel('Adjusted Sentiment Value', fontsize=14)
-plt.title('Episode IV', loc='center')
-plt.show()
-
-# %%
-# Description: This cell prints the first movie's regression equation
-# Input: This cell only needs the fitted polynomial regression model
-# Output: The coef_ and intercept_ methods are used to find the regression equation, which is then
-# 		  printed to the terminal
+# 		 - The movies and everything computed from them below come from analysis_pipeline.py, which
+# 		   stores each result on disk under a fingerprint of its inputs and parameters. Changing one of
+# 		   the settings only recomputes the results that depend on it, and classification.py reuses
+# 		   the same stored movies
+
+settings = {'character_averages': {'minLines': 20},
+            'dialogues': {'minLength': 4},
+            'average_received': {'minLines': 20}}
+
+movies = buildArtifact('movies', settings)
+ep1, ep2, ep3 = movies
+
+full_script = buildArtifact('full_script', settings)
+
+# %%
+# Description: This cell fits a polynomial regression to the sentiment arc of every movie at once, choosing
+# 			   each movie's degree by cross-validation
+# Input: The inputs for this cell are the 'line' and 'sentiment' columns from each dataframe in movies
+# Output: A list with the chosen degree, cross-validated error, and coefficients of each movie's regression
+# Notes: - I originally picked the degrees by eye (3 for Episode IV, 2 for Episode V, and 3 for Episode VI).
+# 		   fitArcRegressions() tries degrees 1 through 6 with 5-fold cross-validation instead and keeps the one
+# 		   with the lowest error on the held-out lines, so the choice no longer has to be hard coded
+# 		 - All of the movies are fitted together with one least-squares solve per degree. For any given degree
+# 		   the fit is the same as fitRegression()'s, but the chosen degrees can differ from the hand-picked ones
+# 		   (Episode IV comes out as 4 instead of 3), so the degrees in equations.json can differ from the
+# 		   ones in equations.txt
+
+titles = ['Episode IV', 'Episode V', 'Episode VI']
+lineNumbers = [movie['line'].to_numpy(dtype=float) for movie in movies]
+sentiments = [movie['sentiment'].to_numpy(dtype=float) for movie in movies]
+
+arcRegressions = fitArcRegressions(lineNumbers, sentiments, degrees=range(1, 7), folds=5, seed=0)
+
+# %%
+# Description: This cell plots the regression for each movie
+# Input: This cell needs the line numbers and sentiments used in the regressions as well as the fitted
+# 		 coefficients
+# Output: Each regression is plotted and axis labels and a title are added
+# Notes: - I refrained from hard coding the axis titles and main title into plotPolynomial() because I
+# 		   wanted to be able to generalize the function to different data, which may need different titles
+
+for title, X, y, regression in zip(titles, lineNumbers, sentiments, arcRegressions):
+    plotPolynomial(X, y, regression['coefficients'])
+    plt.xlabel('Line Number', fontsize=14)
+    plt.ylabel('Adjusted Sentiment Value', fontsize=14)
+    plt.title(title + ' (degree ' + str(regression['degree']) + ')', loc='center')
+    plt.show()
+
+# %%
+# Description: This cell prints each movie's regression equation and saves them all to equations.json
+# Input: This cell only needs the fitted regressions
+# Output: The equations are printed to the terminal in the same format as equations.txt and written, along
+# 		  with their degrees, coefficients, and cross-validation errors, to equations.json
 # Notes: - This regression line doesn't serve much practical purpose, other than outlining a literal
 # 		   "plot curve" on the sentiment graph. As such, this equation is not of much use. I simply
 # 		   calculated it because I thought the equation might be of interest
 
-print("Predicted Avg Sentiment =", polyModel.intercept_[0], "+",
-      polyModel.coef_[0][0], "* (Line #) +", polyModel.coef_[0][1], "* (Line #)^2 +",
-      polyModel.coef_[0][2], "* (Line #)^3")
-
-# %%
-# Description: This cell fits a regression model to the data from the second movie
-# Input: The inputs for this cell are the 'line' and 'sentiment' columns from the ep2 dataframe
-# Output: A quadratic (degree 2) polynomial regression is made and fit to the data
-# Notes: - As explained earlier, the degree of the polynomial regression depends on the movie. We see
-# 		   here that the degree of the ep2 regression is 2, whereas ep1 used a degree 3 regression
-# 		 - Because the purpose of these regressions was purely visual, I didn't use any numerical
-# 		   methods to verify my polynomial regression choices. If these regressions were to be used
-# 		   in more robust models, it would be important to numerically verify that the correct regressions
-# 		   were used
-
-X2 = ep2[['line']].values.reshape(-1, 1)
-y2 = ep2[['sentiment']].values.reshape(-1, 1)
-
-polyModel = fitRegression(X2, y2, deg=2)
-
-# %%
-# Description: This cell plots the regression for the second movie
-# Input: This cell needs the X and y variables used in the regression as numpy arrays as well as the
-# 		 fitted regression model
-# Output: The regression is plotted and axis labels and a title are added
-# Notes: - Here we see why th title and axis labels weren't hard coded in the plotRegression() function.
-# 		   The previous plot had the title "Episode IV", but this one is titled "Episode V"
-
-plotRegression(X2, y2, polyModel, deg=2)
-plt.xlabel('Line Number', fontsize=14)
-plt.ylabel('Adjusted Sentiment Value', fontsize=14)
-plt.title('Episode V', loc='center')
-plt.show()
-
-# %%
-# Description: This cell prints the second movie's regression equation
-# Input: This cell only needs the fitted polynomial regression model
-# Output: The coef_ and intercept_ methods are used to find the regression equation, which is then
-# 		  printed to the terminal
-
-print("Predicted Avg Sentiment =", polyModel.intercept_[0], "+",
-      polyModel.coef_[0][0], "* (Line #) +", polyModel.coef_[0][1], "* (Line #)^2")
-
-# %%
-# Description: This cell fits a regression model to the third movie
-# Input: The inputs for this cell are the 'line' and 'sentiment' columns from the ep3 dataframe
-# Output: A cubic (degree 3) polynomial regression is made and fit to the data
-
-X3 = ep3[['line']].values.reshape(-1, 1)
-y3 = ep3[['sentiment']].values.reshape(-1, 1)
-
-polyModel = fitRegression(X3, y3, deg=3)
-
-# %%
-# Description: This cell plots the regression for the third movie
-# Input: This cell needs the X and y variables used in the regression as numpy arrays as well as the
-# 		 fitted regression model
-# Output: The regression is plotted and axis labels and a title are added
-
-plotRegression(X3, y3, polyModel, deg=3)
-plt.xlabel('Line Number', fontsize=14)
-plt.ylabel('Adjusted Sentiment Value', fontsize=14)
-plt.title('Episode VI', loc='center')
-plt.show()
-
-# %%
-# Description: This cell prints the regression equation for the third movie
-# Input: This cell only needs the fitted polynomial regression model
-# Output: The coef_ and intercept_ methods are used to find the regression equation, which is then
-# 		  printed to the terminal
-
-print("Predicted Avg Sentiment =", polyModel.intercept_[0], "+",
-      polyModel.coef_[0][0], "* (Line #) +", polyModel.coef_[0][1], "* (Line #)^2 +",
-      polyModel.coef_[0][2], "* (Line #)^3")
+for title, regression in zip(titles, arcRegressions):
+    print(title, 'Sentiment Regression:')
+    print(formatEquation(regression['coefficients']))
+    print()
+
+writeEquations('equations.json', titles, arcRegressions)
+
+# %%
+# Description: This cell traces each movie's scene-level sentiment arc and marks where it shifts
+# Input: The list of individual movie dataframes and their titles
+# Output: Each movie's lines are run through the arc engine, which gives the 25-line rolling average, an
+# 		  exponentially weighted average (half-life of 10 lines), and the lines where the sentiment level
+# 		  shifts up (green) or down (red). Each arc is plotted over the individual lines
+# Notes: - The polynomial regressions above only show the overall shape of each movie. The arc engine
+# 		   works one line at a time with a fixed amount of memory, so it is able to follow the swings
+# 		   between scenes, and would run the same way on a much longer collection of scripts
+
+for title, movie in zip(titles, movies):
+    arc = updateArc(newArcState(window=25, halfLife=10), movie)
+    plt.scatter(arc['line'], arc['sentiment'], color='lightgray', s=4)
+    plt.plot(arc['line'], arc['rolling'], color='blue', label='25-line average')
+    plt.plot(arc['line'], arc['ewma'], color='black', linewidth=1, label='Weighted average')
+    for line, change in zip(arc['line'][arc['change'] != 0], arc['change'][arc['change'] != 0]):
+        plt.axvline(line, color='green' if change > 0 else 'red', linestyle='--', linewidth=0.8)
+    plt.xlabel('Line #', fontsize=14)
+    plt.ylabel('Adjusted Sentiment Value', fontsize=14)
+    plt.title(title + ' Sentiment Arc', loc='center')
+    plt.legend()
+    plt.show()
 
 # %%
 # Description: This cell calculates the average sentiment for every character w/ more than 20 lines across
@@ -151,7 +118,7 @@ print("Predicted Avg Sentiment =", polyModel.intercept_[0], "+",
 # 		   by each character in dialogue. This Series stores the average sentiment EXPRESSED by each
 # 		   character
 
-relevantCharacterAverages = findCharacterAverages(full_script, minLines=20)
+relevantCharacterAverages = buildArtifact('character_averages', settings)
 
 # %%
 # Description: This cell plots a bar graph for the average sentiments of the characters
@@ -171,8 +138,10 @@ plt.show()
 # %%
 # Description: This cell splices the movies into dialogues (back-and-forths of length >= 4)
 # Input: The list of individual movie dataframes called movies
-# Output: The movies are spliced into different dialogues, which are stored as individual dataframes in
-# 		  the dialogues list
+# Output: The movies are spliced into different dialogues, which are stored as rows of line spans (movie,
+# 		  start, stop, and the two characters) in the dialogues dataframe. The spans are then indexed
+# 		  once into interactions, which holds the line counts and sentiment totals for every speaker and
+# 		  listener, so the cells below look their numbers up instead of walking the dialogues again
 # Notes: - In testing this function, I noticed a strange flaw where sometimes a third character is
 # 		   involved in dialogue yet doesn't sleep. One example is when Luke gave Threepio an instruction
 # 		   and left the room. Threepio then proceeds to berate Artoo, but Artoo responds only in beeps,
@@ -181,12 +150,13 @@ plt.show()
 # 		   Because I don't have the data to teach my computer to fix this issue, I have to write it off as
 # 		   an inherent flaw in the analysis I'm conducting
 
-dialogues = spliceDialogues(movies, minLength=4)
+dialogues = buildArtifact('dialogues', settings)
+interactions = buildArtifact('interactions', settings)
 
 # %%
 # Description: This cell calculates the average received sentiment for every character
-# Input: This cell needs the list of dialogues generated in the previous cell
-# Output: The list of dialogues is used to calculate the average sentiment received by each major character
+# Input: This cell needs the interaction index generated in the previous cell
+# Output: The dialogue spans are used to calculate the average sentiment received by each major character
 # 		  in dialogue. These received sentiments are stored in the pandas Series characterAverageReceived.
 # 		  Any character who has less than 20 lines directed at them in dialogue is removed from this Series
 # Notes: - I was conflicted in coding this process between restricting the Series to characters who have
@@ -195,8 +165,18 @@ dialogues = spliceDialogues(movies, minLength=4)
 # 		   the two series are combined into a single dataframe, this ensures that all characters have a
 # 		   significant number of sentiments expressed and received
 
-characters = [*set(full_script['character'].values.tolist())]
-characterAverageReceived = findAverageReceived(dialogues, characters, minLines=20)
+characterAverageReceived = buildArtifact('average_received', settings)
+
+# %%
+# Description: This cell looks at who talks to whom in dialogue
+# Input: This cell uses the interaction index generated with the dialogues
+# Output: The pairs of characters with at least 20 lines from one to the other are printed with the
+# 		  average and variance of those lines' sentiments, followed by Luke and Vader's exchanges
+# Notes: - Each pair is directional, so Han's lines to Leia and Leia's lines to Han are separate rows
+
+print(pairTable(interactions, minLines=20).to_string(index=False))
+print('LUKE to VADER:', pairStats(interactions, 'LUKE', 'VADER'))
+print('VADER to LUKE:', pairStats(interactions, 'VADER', 'LUKE'))
 
 # %%
 # Description: This cell plots a bar graph for the average received sentiments of the characters
@@ -222,7 +202,7 @@ plt.show()
 # 		   but not both. This limit in characters, however, turns out to be advantageous in making a graph
 # 		   that can be understood visually
 
-sentimentTable = joinSentimentSeries(relevantCharacterAverages, characterAverageReceived)
+sentimentTable = buildArtifact('sentiment_table', settings)
 
 # %%
 # Description: This cell graphs the expressed vs. received sentiments
@@ -0,0 +1,242 @@
+import argparse
+import csv
+import json
+import os
+import re
+from collections import deque
+
+# ************************************************************************************************
+# Function: loadEntityNames()
+# Description: This function collects every name that refers to a character, mapped to the
+#              character's canonical name
+# Input Parameters: The parsed rasa_nlu_data dict and an optional path to a character list file
+# Returns: A dict mapping each lowercase name or synonym to its uppercase canonical value
+# Pre: The data has an 'entity_synonyms' list in the rasa_nlu_data format. The character list, if
+#      given, has one character name per line like Character_List.txt
+# Post: Every canonical value maps to itself, and every synonym maps to the first value that lists
+#       it, so a shared synonym like "aunt" always resolves the same way
+# ************************************************************************************************
+def loadEntityNames(data, characterListPath=None):
+    names = {}
+    for synonym in data.get('entity_synonyms', []):
+        names.setdefault(synonym['value'].lower(), synonym['value'].upper())
+    for synonym in data.get('entity_synonyms', []):
+        for name in synonym['synonyms']:
+            names.setdefault(name.lower(), synonym['value'].upper())
+
+    if characterListPath is not None:
+        with open(characterListPath) as characterList:
+            for character in characterList:
+                if character.strip():
+                    names.setdefault(character.strip().lower(), character.strip().upper())
+    return names
+
+# ************************************************************************************************
+# Function: buildAutomaton()
+# Description: This function builds an Aho-Corasick automaton that finds every name in a text in a
+#              single pass
+# Input Parameters: A dict mapping each name to the value it stands for
+# Returns: A tuple of the goto table (a list of dicts from character to state), the failure links
+#          (a list of states), and the outputs (a list of (length, value) lists for each state)
+# Pre: The names are lowercase and non-empty
+# Post: The names are added to a trie, then the failure links are filled in breadth first so that a
+#       mismatch falls back to the longest suffix that is also a prefix of some name. Each state's
+#       outputs include those of its failure state, so overlapping names are all reported
+# ************************************************************************************************
+def buildAutomaton(names):
+    goto = [{}]
+    fail = [0]
+    outputs = [[]]
+    for name, value in names.items():
+        state = 0
+        for character in name:
+            if character not in goto[state]:
+                goto.append({})
+                fail.append(0)
+                outputs.append([])
+                goto[state][character] = len(goto) - 1
+            state = goto[state][character]
+        outputs[state].append((len(name), value))
+
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        for character, child in goto[state].items():
+            queue.append(child)
+            fallback = fail[state]
+            while fallback and character not in goto[fallback]:
+                fallback = fail[fallback]
+            fail[child] = goto[fallback].get(character, 0)
+            outputs[child] = outputs[child] + outputs[fail[child]]
+    return goto, fail, outputs
+
+# ************************************************************************************************
+# Function: findEntities()
+# Description: This function finds the character names in a phrase with the automaton
+# Input Parameters: The automaton from buildAutomaton() and the lowercase phrase
+# Returns: A list of entity dicts with 'start', 'end', 'value', and 'entity' keys, in the order they
+#          appear in the phrase
+# Pre: The phrase is lowercase, as the names in the automaton are
+# Post: The phrase is scanned once. Only matches that start and end on word boundaries are kept
+#       (so "ben" doesn't match inside "bench"), and when matches overlap the leftmost, then
+#       longest, one wins
+# ************************************************************************************************
+def findEntities(automaton, phrase):
+    goto, fail, outputs = automaton
+    matches = []
+    state = 0
+    for i, character in enumerate(phrase):
+        while state and character not in goto[state]:
+            state = fail[state]
+        state = goto[state].get(character, 0)
+        for length, value in outputs[state]:
+            start = i - length + 1
+            if ((start == 0 or not phrase[start - 1].isalnum()) and
+                    (i + 1 == len(phrase) or not phrase[i + 1].isalnum())):
+                matches.append((start, i + 1, value))
+
+    entities = []
+    lastEnd = 0
+    for start, end, value in sorted(matches, key=lambda match: (match[0], match[0] - match[1])):
+        if start >= lastEnd:
+            entities.append({'start': start, 'end': end, 'value': value, 'entity': 'character'})
+            lastEnd = end
+    return entities
+
+# ************************************************************************************************
+# Function: makeExample()
+# Description: This function makes one training example in the rasa_nlu_data format
+# Input Parameters: The phrase, whether its sentiment is positive, the automaton, and an optional
+#                   list of (value, trigger) pairs for entities that aren't synonyms (e.g. "kid"
+#                   for LUKE)
+# Returns: The example dict with 'text', 'intent', and 'entities' keys
+# Pre: N/A
+# Post: The phrase is lowercased, like NlpDatasetMaker.cpp did. Explicit triggers are found with
+#       str.find() and raise a ValueError if they aren't in the phrase. Every name found by the
+#       automaton that doesn't overlap an explicit trigger is added as well
+# ************************************************************************************************
+def makeExample(phrase, isPositive, automaton, triggers=()):
+    phrase = phrase.lower()
+    entities = []
+    for value, trigger in triggers:
+        start = phrase.find(trigger.lower())
+        if start == -1:
+            raise ValueError('ENTITY TRIGGER NOT FOUND: "' + trigger + '" in "' + phrase + '"')
+        entities.append({'start': start, 'end': start + len(trigger), 'value': value.upper(), 'entity': 'character'})
+
+    for entity in findEntities(automaton, phrase):
+        if all(entity['end'] <= other['start'] or entity['start'] >= other['end'] for other in entities):
+            entities.append(entity)
+
+    entities.sort(key=lambda entity: entity['start'])
+    return {'text': phrase, 'intent': 'positive' if isPositive else 'negative', 'entities': entities}
+
+# ************************************************************************************************
+# Function: validateTrainingData()
+# Description: This function checks that a training data dict follows the rasa_nlu_data schema
+# Input Parameters: The parsed training data dict
+# Returns: N/A
+# Pre: N/A
+# Post: A ValueError listing the problems found (up to ten) is raised if the data has the wrong
+#       shape, an example has no text or intent, or an entity's span is outside its text
+# ************************************************************************************************
+def validateTrainingData(data):
+    problems = []
+    nluData = data.get('rasa_nlu_data') if isinstance(data, dict) else None
+    if not isinstance(nluData, dict):
+        raise ValueError('missing "rasa_nlu_data" object')
+
+    for i, synonym in enumerate(nluData.get('entity_synonyms', [])):
+        if not isinstance(synonym.get('value'), str) or not isinstance(synonym.get('synonyms'), list):
+            problems.append('entity_synonyms[' + str(i) + '] needs a string "value" and a "synonyms" list')
+        elif not all(isinstance(name, str) for name in synonym['synonyms']):
+            problems.append('entity_synonyms[' + str(i) + '] has a synonym that is not a string')
+
+    for i, example in enumerate(nluData.get('common_examples', [])):
+        where = 'common_examples[' + str(i) + ']'
+        text = example.get('text')
+        if not isinstance(text, str) or not text:
+            problems.append(where + ' needs a non-empty "text"')
+            continue
+        if not isinstance(example.get('intent'), str) or not example['intent']:
+            problems.append(where + ' needs a non-empty "intent"')
+        for entity in example.get('entities', []):
+            start, end = entity.get('start'), entity.get('end')
+            if not isinstance(start, int) or not isinstance(end, int) or not 0 <= start < end <= len(text):
+                problems.append(where + ' has an entity span outside its text: ' + json.dumps(entity))
+            elif not isinstance(entity.get('value'), str) or not isinstance(entity.get('entity'), str):
+                problems.append(where + ' has an entity without a string "value" and "entity"')
+
+    if problems:
+        raise ValueError(str(len(problems)) + ' problem(s) in training data:\n' + '\n'.join(problems[:10]))
+
+# ************************************************************************************************
+# Function: appendExamples()
+# Description: This function adds a batch of training examples to a training data file
+# Input Parameters: The path to the training data JSON file, the list of new examples, and an
+#                   optional different path to write the result to
+# Returns: The total number of examples in the file afterward
+# Pre: The file is in the rasa_nlu_data format
+# Post: The file is read once, all of the examples are added, the result is validated, and it is
+#       written once through a temporary file. Nothing is written if validation fails. Lists of
+#       synonyms are kept on one line, like the hand-written sentiments.json
+# ************************************************************************************************
+def appendExamples(path, examples, outputPath=None):
+    with open(path) as dataFile:
+        data = json.load(dataFile)
+    data['rasa_nlu_data'].setdefault('common_examples', []).extend(examples)
+    validateTrainingData(data)
+
+    outputPath = outputPath or path
+    text = json.dumps(data, indent=4)
+    text = re.sub(r'\[\s*("(?:[^"\\]|\\.)*"(?:,\s*"(?:[^"\\]|\\.)*")*)\s*\]',
+                  lambda match: json.dumps(json.loads(match.group(0))), text)
+    with open(str(outputPath) + '.tmp', 'w') as dataFile:
+        dataFile.write(text)
+    os.replace(str(outputPath) + '.tmp', outputPath)
+    return len(data['rasa_nlu_data']['common_examples'])
+
+# ************************************************************************************************
+# Function: readPhrases()
+# Description: This function reads labeled phrases from a CSV file
+# Input Parameters: The path to the CSV file
+# Returns: A generator of (phrase, isPositive, triggers) tuples
+# Pre: The CSV has a header with the columns 'text' and 'intent' ('positive'/'negative' or 1/0), and
+#      optionally 'entities', written as VALUE=trigger pairs separated by semicolons
+# Post: Rows are read one at a time, so very large phrase files aren't held in memory twice. A
+#       ValueError naming the line is raised for any other intent, so a typo or blank never goes into
+#       the training data with the wrong label
+# ************************************************************************************************
+def readPhrases(path):
+    with open(path, newline='', encoding='utf-8') as phraseFile:
+        reader = csv.DictReader(phraseFile)
+        for row in reader:
+            triggers = [pair.split('=', 1) for pair in (row.get('entities') or '').split(';') if '=' in pair]
+            intent = (row['intent'] or '').strip().lower()
+            if intent not in ('positive', 'negative', '1', '0'):
+                raise ValueError('UNKNOWN INTENT: "' + (row['intent'] or '') + '" on line ' + str(reader.line_num) +
+                                 ' of ' + str(path) + ' ("' + str(row['text']) + '")')
+            isPositive = intent in ('positive', '1')
+            yield row['text'], isPositive, [(value.strip(), trigger.strip()) for value, trigger in triggers]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Add labeled phrases to a Rasa NLU training data file')
+    parser.add_argument('--data', default='sentiments.json', help='training data JSON file')
+    parser.add_argument('--add', default=None, help='CSV of phrases to add (columns text, intent, entities)')
+    parser.add_argument('--characters', default=None, help='character list to match names from as well')
+    parser.add_argument('--output', default=None, help='write the result here instead of over --data')
+    parser.add_argument('--validate', action='store_true', help='only check the training data file')
+    args = parser.parse_args()
+
+    with open(args.data) as dataFile:
+        trainingData = json.load(dataFile)
+
+    if args.validate or args.add is None:
+        validateTrainingData(trainingData)
+        print(args.data + ' is valid (' + str(len(trainingData['rasa_nlu_data'].get('common_examples', []))) + ' examples)')
+    else:
+        automaton = buildAutomaton(loadEntityNames(trainingData['rasa_nlu_data'], args.characters))
+        newExamples = [makeExample(phrase, isPositive, automaton, triggers)
+                       for phrase, isPositive, triggers in readPhrases(args.add)]
+        total = appendExamples(args.data, newExamples, args.output)
+        print('Added ' + str(len(newExamples)) + ' examples (' + str(total) + ' total)')
@@ -0,0 +1,258 @@
+import argparse
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+from dataset_builder import loadEntityNames
+from interaction_index import describeTotals
+from script_store import loadScoredScript
+from profiling import profiled
+
+# ************************************************************************************************
+# Function: loadSynonyms()
+# Description: This function reads the entity synonym table out of the Rasa training data
+# Input Parameters: The path to the training data JSON file (sentiments.json)
+# Returns: A dict mapping each lowercase name or synonym to its uppercase canonical value
+# Pre: The file is in the rasa_nlu_data format
+# Post: The table is built by loadEntityNames(), so the index resolves names exactly the way
+#       dataset_builder.py tags them
+# ************************************************************************************************
+def loadSynonyms(trainingDataPath='sentiments.json'):
+    with open(trainingDataPath) as trainingFile:
+        return loadEntityNames(json.load(trainingFile)['rasa_nlu_data'])
+
+# ************************************************************************************************
+# Function: normalizeEntity()
+# Description: This function turns an entity's text into its canonical name
+# Input Parameters: The entity text and the synonym table from loadSynonyms()
+# Returns: The canonical name, e.g. 'VADER' for 'Lord Vader'
+# Pre: N/A
+# Post: Case, runs of whitespace, and surrounding punctuation are ignored (spaCy keeps the double
+#       space in "Jabba the  Hut"). Entities that aren't in the table are uppercased as they are, so
+#       they still line up with the character names
+# ************************************************************************************************
+def normalizeEntity(text, synonyms):
+    key = re.sub(r'\s+', ' ', str(text)).strip(' .,;:!?\'"').lower()
+    return synonyms.get(key, key.upper())
+
+# ************************************************************************************************
+# Function: buildEntityIndex()
+# Description: This function builds the inverted index from canonical entities to the lines that
+#              mention them
+# Input Parameters: The list of script names, the list of scored script dataframes in the same order,
+#                   and the synonym table from loadSynonyms()
+# Returns: A dict with the 'scripts' names, the sorted 'entities' (a pandas Index), the 'codes' dict
+#          from entity to position, and the posting lists stored end to end: 'offsets' (where each
+#          entity's postings start, plus one extra entry for the end), and 'script', 'row', 'line',
+#          and 'sentiment' arrays with one entry per posting
+# Pre: The scripts have the columns 'line', 'sentiment', and 'entities', with 'entities' holding
+#      lists of strings (as loadScoredScript() returns them)
+# Post: Every distinct entity text is normalized once. A line that names an entity more than once
+#       (e.g. "Artoo" and "Artoo-Detoo") is posted once. Each posting list is sorted by script and
+#       row, so two lists can be intersected without sorting
+# ************************************************************************************************
+@profiled('aggregate', lambda names, scripts, *args, **kwargs: sum(len(script.index) for script in scripts))
+def buildEntityIndex(names, scripts, synonyms):
+    canonical = {}
+    entityOf, scriptOf, rowOf = [], [], []
+    for scriptNumber, script in enumerate(scripts):
+        for row, entities in enumerate(script['entities']):
+            for text in entities:
+                if text not in canonical:
+                    canonical[text] = normalizeEntity(text, synonyms)
+                entityOf.append(canonical[text])
+                scriptOf.append(scriptNumber)
+                rowOf.append(row)
+
+    entities = pd.Index(sorted(set(entityOf)))
+    codes = entities.get_indexer(entityOf).astype(np.int64)
+    scriptOf = np.asarray(scriptOf, dtype=np.int16)
+    rowOf = np.asarray(rowOf, dtype=np.int32)
+
+    # Sorting by (entity, script, row) groups each posting list and orders it, and dropping adjacent
+    # repeats removes lines that name the same entity twice
+    order = np.lexsort((rowOf, scriptOf, codes))
+    codes, scriptOf, rowOf = codes[order], scriptOf[order], rowOf[order]
+    keep = np.ones(len(codes), dtype=bool)
+    keep[1:] = (codes[1:] != codes[:-1]) | (scriptOf[1:] != scriptOf[:-1]) | (rowOf[1:] != rowOf[:-1])
+    codes, scriptOf, rowOf = codes[keep], scriptOf[keep], rowOf[keep]
+
+    lines = [script['line'].to_numpy(dtype=np.int32) for script in scripts]
+    sentiments = [script['sentiment'].to_numpy(dtype=np.float32) for script in scripts]
+    lineOf = np.zeros(len(rowOf), dtype=np.int32)
+    sentimentOf = np.zeros(len(rowOf), dtype=np.float32)
+    for scriptNumber in range(len(scripts)):
+        inScript = scriptOf == scriptNumber
+        lineOf[inScript] = lines[scriptNumber][rowOf[inScript]]
+        sentimentOf[inScript] = sentiments[scriptNumber][rowOf[inScript]]
+
+    return {'scripts': list(names),
+            'entities': entities,
+            'codes': {entity: code for code, entity in enumerate(entities)},
+            'synonyms': synonyms,
+            'offsets': np.r_[0, np.cumsum(np.bincount(codes, minlength=len(entities)))].astype(np.int64),
+            'script': scriptOf,
+            'row': rowOf,
+            'line': lineOf,
+            'sentiment': sentimentOf}
+
+# ************************************************************************************************
+# Function: postings()
+# Description: This function finds the slice of the posting arrays that belongs to an entity
+# Input Parameters: The entity index and the entity, under any of its names
+# Returns: A slice into the 'script', 'row', 'line', and 'sentiment' arrays (empty if the entity is
+#          never mentioned)
+# Pre: N/A
+# Post: N/A
+# ************************************************************************************************
+def postings(index, entity):
+    code = index['codes'].get(normalizeEntity(entity, index['synonyms']))
+    if code is None:
+        return slice(0, 0)
+    return slice(int(index['offsets'][code]), int(index['offsets'][code + 1]))
+
+# ************************************************************************************************
+# Function: mentionLines()
+# Description: This function lists the lines that mention an entity
+# Input Parameters: The entity index and the entity, under any of its names
+# Returns: A dataframe with the columns 'script', 'row', 'line', and 'sentiment', in script order
+# Pre: N/A
+# Post: 'row' is the line's position in its scored script and 'line' is its number in the script
+# ************************************************************************************************
+def mentionLines(index, entity):
+    found = postings(index, entity)
+    return pd.DataFrame({'script': [index['scripts'][number] for number in index['script'][found]],
+                         'row': index['row'][found],
+                         'line': index['line'][found],
+                         'sentiment': index['sentiment'][found]})
+
+# ************************************************************************************************
+# Function: mentionStats()
+# Description: This function summarizes the sentiment of the lines that mention an entity
+# Input Parameters: The entity index and the entity, under any of its names
+# Returns: A dict with the 'count', 'mean', and 'variance' of the lines' sentiments
+# Pre: N/A
+# Post: N/A
+# ************************************************************************************************
+def mentionStats(index, entity):
+    sentiments = index['sentiment'][postings(index, entity)].astype(float)
+    return describeTotals(len(sentiments), sentiments.sum(), (sentiments ** 2).sum())
+
+# ************************************************************************************************
+# Function: coMentions()
+# Description: This function finds the lines that mention two entities together
+# Input Parameters: The entity index and the two entities, under any of their names
+# Returns: A dataframe like mentionLines() of the lines that mention both
+# Pre: N/A
+# Post: The two sorted posting lists are intersected on their (script, row) keys with
+#       np.intersect1d(), so only the two lists are touched
+# ************************************************************************************************
+def coMentions(index, entityA, entityB):
+    foundA = postings(index, entityA)
+    foundB = postings(index, entityB)
+    keysA = index['script'][foundA].astype(np.int64) << 32 | index['row'][foundA]
+    keysB = index['script'][foundB].astype(np.int64) << 32 | index['row'][foundB]
+    shared = foundA.start + np.intersect1d(keysA, keysB, assume_unique=True, return_indices=True)[1]
+    return pd.DataFrame({'script': [index['scripts'][number] for number in index['script'][shared]],
+                         'row': index['row'][shared],
+                         'line': index['line'][shared],
+                         'sentiment': index['sentiment'][shared]})
+
+# ************************************************************************************************
+# Function: entityTable()
+# Description: This function summarizes every entity in the index
+# Input Parameters: The entity index and the minimum number of lines mentioning an entity
+# Returns: A dataframe with the columns 'entity', 'count', and 'mean', sorted by count, highest first
+# Pre: N/A
+# Post: Every entity's sums are taken at once with np.add.reduceat() over the posting arrays
+# ************************************************************************************************
+def entityTable(index, minLines=1):
+    counts = np.diff(index['offsets'])
+    sums = np.add.reduceat(index['sentiment'].astype(float), index['offsets'][:-1]) if len(counts) else np.zeros(0)
+    table = pd.DataFrame({'entity': index['entities'], 'count': counts, 'mean': sums / np.maximum(counts, 1)})
+    table = table[table['count'] >= minLines]
+    return table.sort_values(['count', 'entity'], ascending=[False, True]).reset_index(drop=True)
+
+# ************************************************************************************************
+# Function: saveEntityIndex()
+# Description: This function saves an entity index to a file
+# Input Parameters: The entity index and the path to write to (an .npz file)
+# Returns: N/A
+# Pre: N/A
+# Post: The script names, entities, and synonym table are stored as JSON next to the posting arrays.
+#       The file is written under a temporary name and moved into place
+# ************************************************************************************************
+def saveEntityIndex(index, path):
+    tempPath = str(path) + '.tmp.npz'
+    np.savez_compressed(tempPath,
+                        names=np.array(json.dumps({'scripts': index['scripts'],
+                                                   'entities': list(index['entities']),
+                                                   'synonyms': index['synonyms']})),
+                        offsets=index['offsets'],
+                        script=index['script'],
+                        row=index['row'],
+                        line=index['line'],
+                        sentiment=index['sentiment'])
+    os.replace(tempPath, path)
+
+# ************************************************************************************************
+# Function: loadEntityIndex()
+# Description: This function loads an entity index saved by saveEntityIndex()
+# Input Parameters: The path to the .npz file
+# Returns: The entity index dict
+# Pre: N/A
+# Post: N/A
+# ************************************************************************************************
+def loadEntityIndex(path):
+    with np.load(path) as data:
+        names = json.loads(str(data['names']))
+        entities = pd.Index(names['entities'], dtype=object)
+        index = {'scripts': names['scripts'],
+                 'entities': entities,
+                 'codes': {entity: code for code, entity in enumerate(entities)},
+                 'synonyms': names['synonyms']}
+        for name in ['offsets', 'script', 'row', 'line', 'sentiment']:
+            index[name] = data[name]
+    return index
+
+# ************************************************************************************************
+# Function: indexScoredScripts()
+# Description: This function builds and saves the entity index for a set of scored scripts
+# Input Parameters: The list of scored script CSV paths, the path to write the index to, and the path
+#                   to the training data with the synonym table
+# Returns: The entity index dict
+# Pre: Every scored script (or its columnar store) exists
+# Post: Only the 'line', 'sentiment', and 'entities' columns are loaded
+# ************************************************************************************************
+def indexScoredScripts(csvPaths, indexPath, trainingDataPath='sentiments.json'):
+    scripts = [loadScoredScript(csvPath, ['line', 'sentiment', 'entities']) for csvPath in csvPaths]
+    index = buildEntityIndex([os.path.basename(csvPath) for csvPath in csvPaths], scripts,
+                             loadSynonyms(trainingDataPath))
+    saveEntityIndex(index, indexPath)
+    return index
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Look up the lines that mention an entity')
+    parser.add_argument('entities', nargs='*', help='one entity for its lines, or two for their co-mentions')
+    parser.add_argument('--index', default='scripts/entity_index.npz')
+    parser.add_argument('--rebuild', nargs='+', metavar='CSV', default=None,
+                        help='rebuild the index from these scored scripts first')
+    parser.add_argument('--min-lines', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.rebuild:
+        entity_index = indexScoredScripts(args.rebuild, args.index)
+    else:
+        entity_index = loadEntityIndex(args.index)
+
+    pd.set_option('display.width', 200)
+    if not args.entities:
+        print(entityTable(entity_index, args.min_lines).to_string(index=False))
+    elif len(args.entities) == 1:
+        print(mentionStats(entity_index, args.entities[0]))
+        print(mentionLines(entity_index, args.entities[0]).to_string(index=False))
+    else:
+        lines = coMentions(entity_index, args.entities[0], args.entities[1])
+        print(len(lines.index), 'lines mention both')
+        print(lines.to_string(index=False))
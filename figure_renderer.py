@@ -0,0 +1,392 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import pathlib
+import time
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+from utils import downsampleSeries
+from regression_engine import fitArcRegressions, plotPolynomial
+from arc_engine import newArcState, updateArc
+from manifest import fileDigest, loadManifest, saveManifest
+from profiling import enableProfiling, stage, countEvent
+
+# Remembers the fingerprint of the inputs each figure was last rendered from
+RENDER_MANIFEST = 'scripts/render_manifest.json'
+# Code whose changes change what the figures look like
+RENDER_CODE = ['figure_renderer.py', 'utils.py', 'regression_engine.py', 'arc_engine.py']
+
+# Where the labels in the expressed vs. received scatter plot are moved so they don't overlap (the
+# hand-placed offsets from data_analysis.py). Every other label sits just up and to the right of its point
+LABEL_OFFSETS = {'LUKE': (-0.025, -0.005),
+                 'JABBA': (-0.01, 0.01),
+                 'VADER': (-0.013, -0.016),
+                 'OWEN': (-0.012, -0.016),
+                 'WEDGE': (-0.033, 0)}
+
+# Settings each render worker needs, set once per process by initRenderWorker()
+_outputDir = None
+_maxPoints = None
+
+# ************************************************************************************************
+# Function: drawRegression()
+# Description: This function draws a script's sentiment with its polynomial regression
+# Input Parameters: The figure spec, whose data has 'x', 'y', and 'coefficients', and the most points
+#                   to scatter
+# Returns: N/A
+# Pre: N/A
+# Post: N/A
+# ************************************************************************************************
+def drawRegression(spec, maxPoints):
+    data = spec['data']
+    plotPolynomial(data['x'], data['y'], data['coefficients'], maxPoints)
+
+# ************************************************************************************************
+# Function: drawArc()
+# Description: This function draws a script's sentiment arc with its change points
+# Input Parameters: The figure spec, whose data has the arc engine's 'line', 'sentiment', 'rolling',
+#                   'ewma', and 'change' columns as arrays, and the most points per series
+# Returns: N/A
+# Pre: N/A
+# Post: The lines and the averages are each downsampled on their own, since LTTB keeps different
+#       points for a jagged series than for a smooth one. The change points are drawn as one collection
+#       and the legend has a fixed corner, since placing it 'best' means testing it against every point
+# ************************************************************************************************
+def drawArc(spec, maxPoints):
+    data = spec['data']
+    kept = downsampleSeries(data['line'], data['sentiment'], maxPoints)
+    plt.scatter(data['line'][kept], data['sentiment'][kept], color='lightgray', s=4)
+    for column, color, width, label in [('rolling', 'blue', 1.5, 'Rolling average'),
+                                        ('ewma', 'black', 1, 'Weighted average')]:
+        kept = downsampleSeries(data['line'], data[column], maxPoints)
+        plt.plot(data['line'][kept], data[column][kept], color=color, linewidth=width, label=label)
+    changed = data['change'] != 0
+    plt.vlines(data['line'][changed], 0, 1, transform=plt.gca().get_xaxis_transform(),
+               colors=np.where(data['change'][changed] > 0, 'green', 'red'), linestyles='--', linewidth=0.8)
+    plt.legend(loc='upper left')
+
+# ************************************************************************************************
+# Function: drawBar()
+# Description: This function draws a bar chart of per-character values
+# Input Parameters: The figure spec, whose data has 'labels' and 'values', and the most points (unused,
+#                   bars are never downsampled)
+# Returns: N/A
+# Pre: N/A
+# Post: The bars look the same as a pandas Series' plot(kind='bar')
+# ************************************************************************************************
+def drawBar(spec, maxPoints):
+    data = spec['data']
+    positions = np.arange(len(data['labels']))
+    plt.bar(positions, data['values'], width=0.5)
+    plt.xticks(positions, data['labels'], rotation=90)
+
+# ************************************************************************************************
+# Function: drawLabeledScatter()
+# Description: This function draws a scatter plot with a name next to every point
+# Input Parameters: The figure spec, whose data has 'labels', 'x', and 'y', and the most points (unused,
+#                   every labeled point is drawn)
+# Returns: N/A
+# Pre: N/A
+# Post: Labels in LABEL_OFFSETS are moved by their offsets
+# ************************************************************************************************
+def drawLabeledScatter(spec, maxPoints):
+    data = spec['data']
+    plt.scatter(data['x'], data['y'])
+    for label, x, y in zip(data['labels'], data['x'], data['y']):
+        offsetX, offsetY = LABEL_OFFSETS.get(label, (0.003, 0.003))
+        plt.text(x + offsetX, y + offsetY, label)
+
+# How each kind of figure is drawn
+DRAWERS = {'regression': drawRegression,
+           'arc': drawArc,
+           'bar': drawBar,
+           'labeled_scatter': drawLabeledScatter}
+
+# ************************************************************************************************
+# Function: fingerprintPlan()
+# Description: This function hashes everything that decides what a plan's figures look like
+# Input Parameters: The figure plan, the most points per series, and the digest of the rendering code
+# Returns: The fingerprint as a hex string
+# Pre: The plan's 'inputs' can be written as JSON
+# Post: The plan's figure names and inputs, maxPoints, the matplotlib version, and the code digest are
+#       hashed together with SHA-256. The figures' data is never needed, so nothing is computed to
+#       find out a figure is unchanged
+# ************************************************************************************************
+def fingerprintPlan(plan, maxPoints, codeDigest):
+    return hashlib.sha256(json.dumps([plan['names'], plan['inputs'], maxPoints, matplotlib.__version__, codeDigest],
+                                     sort_keys=True).encode('utf-8')).hexdigest()
+
+# ************************************************************************************************
+# Function: renderFigure()
+# Description: This function draws one figure and saves it as a PNG
+# Input Parameters: The figure spec, the folder to write to, and the most points per series
+# Returns: The path of the PNG
+# Pre: The spec has 'name', 'kind', 'title', 'xlabel', and 'ylabel' keys and the data its drawer needs
+# Post: The figure is drawn with the Agg backend at the default size, labeled in the graphs/ style,
+#       written to a temporary file, and moved into place. It is always closed, so long runs don't
+#       pile up open figures
+# ************************************************************************************************
+def renderFigure(spec, outputDir, maxPoints=2000):
+    path = pathlib.Path(outputDir) / (spec['name'] + '.png')
+    figure = plt.figure()
+    try:
+        DRAWERS[spec['kind']](spec, maxPoints)
+        plt.xlabel(spec['xlabel'], fontsize=spec.get('labelSize', 14))
+        plt.ylabel(spec['ylabel'], fontsize=spec.get('labelSize', 14))
+        plt.title(spec['title'], loc='center')
+        tempPath = path.with_name(path.name + '.tmp')
+        figure.savefig(tempPath, format='png', bbox_inches='tight' if spec['kind'] == 'bar' else None)
+        os.replace(tempPath, path)
+    finally:
+        plt.close(figure)
+    return str(path)
+
+# ************************************************************************************************
+# Function: initRenderWorker()
+# Description: This function sets up a render worker process
+# Input Parameters: The folder to write to and the most points per series
+# Returns: N/A
+# Pre: This function is run once by multiprocessing.Pool as each worker process starts
+# Post: The settings are kept in module globals so they aren't sent with every figure
+# ************************************************************************************************
+def initRenderWorker(outputDir, maxPoints):
+    global _outputDir, _maxPoints
+    _outputDir = outputDir
+    _maxPoints = maxPoints
+
+# ************************************************************************************************
+# Function: renderJob()
+# Description: This function renders one figure in a worker process
+# Input Parameters: A (spec, fingerprint) pair
+# Returns: A (path, fingerprint, seconds) tuple
+# Pre: initRenderWorker() has run in this process
+# Post: N/A
+# ************************************************************************************************
+def renderJob(job):
+    spec, fingerprint = job
+    start = time.perf_counter()
+    path = renderFigure(spec, _outputDir, _maxPoints)
+    return path, fingerprint, time.perf_counter() - start
+
+# ************************************************************************************************
+# Function: renderFigures()
+# Description: This function renders every figure whose inputs have changed, across a process pool
+# Input Parameters: The list of figure plans, the folder to write to, the number of worker processes,
+#                   the most points per series, the path to the render manifest, and whether to render
+#                   every figure regardless
+# Returns: A dict with the lists of 'rendered' and 'skipped' paths
+# Pre: Each plan has 'names' (the figures it makes), 'inputs' (a JSON-able description of what they
+#      are made from, like the digests of their scripts and their settings), and 'build' (a function
+#      that returns their specs). maxPoints is None or at least 3
+# Post: A plan is skipped when all of its PNGs exist and the manifest has its fingerprint for each of
+#       them, without its specs ever being built. The stale plans' figures are handed out to the
+#       workers a few at a time and the manifest is saved after every figure, so an interrupted run
+#       only redoes the figures it hadn't finished. With one worker (or one figure) everything is
+#       rendered in this process
+# ************************************************************************************************
+def renderFigures(plans, outputDir='graphs', workers=None, maxPoints=2000, manifestPath=RENDER_MANIFEST, force=False):
+    if maxPoints is not None and maxPoints < 3:
+        raise ValueError('maxPoints must be at least 3, got ' + str(maxPoints))
+    workers = workers or os.cpu_count() or 1
+    pathlib.Path(outputDir).mkdir(parents=True, exist_ok=True)
+    codeDigest = hashlib.sha256(''.join(fileDigest(path) for path in RENDER_CODE if os.path.isfile(path)).encode('utf-8')).hexdigest()
+    manifest = loadManifest(manifestPath)
+
+    jobs, skipped = [], []
+    for plan in plans:
+        fingerprint = fingerprintPlan(plan, maxPoints, codeDigest)
+        paths = [str(pathlib.Path(outputDir) / (name + '.png')) for name in plan['names']]
+        if not force and all(manifest.get(path) == fingerprint and os.path.isfile(path) for path in paths):
+            skipped.extend(paths)
+        else:
+            with stage('build'):
+                jobs.extend((spec, fingerprint) for spec in plan['build']())
+    countEvent('figures_skipped', len(skipped))
+
+    rendered = []
+    with stage('render', len(jobs)):
+        if workers == 1 or len(jobs) <= 1:
+            initRenderWorker(outputDir, maxPoints)
+            finished = map(renderJob, jobs)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(min(workers, len(jobs)), initializer=initRenderWorker,
+                                        initargs=(outputDir, maxPoints))
+            finished = pool.imap_unordered(renderJob, jobs, chunksize=max(1, len(jobs) // (workers * 8)))
+        try:
+            for path, fingerprint, seconds in finished:
+                manifest[path] = fingerprint
+                saveManifest(manifest, manifestPath)
+                rendered.append(path)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+    countEvent('figures_rendered', len(rendered))
+    return {'rendered': rendered, 'skipped': skipped}
+
+# ************************************************************************************************
+# Function: regressionSpecs()
+# Description: This function makes the regression figure specs for a collection of scripts
+# Input Parameters: The list of script names and the list of script dataframes
+# Returns: A list of figure specs, one per script
+# Pre: The scripts have the columns 'line' and 'sentiment'
+# Post: Every script's regression is fitted in one batch by fitArcRegressions(), which picks each
+#       degree by cross-validation
+# ************************************************************************************************
+def regressionSpecs(names, scripts):
+    lineNumbers = [script['line'].to_numpy(dtype=float) for script in scripts]
+    sentiments = [script['sentiment'].to_numpy(dtype=float) for script in scripts]
+    regressions = fitArcRegressions(lineNumbers, sentiments, degrees=range(1, 7), folds=5, seed=0)
+    return [{'name': name.replace(' ', '_') + '_Sentiment',
+             'kind': 'regression',
+             'title': name + ' (degree ' + str(regression['degree']) + ')',
+             'xlabel': 'Line Number',
+             'ylabel': 'Adjusted Sentiment Value',
+             'data': {'x': X, 'y': y, 'coefficients': np.array(regression['coefficients'])}}
+            for name, X, y, regression in zip(names, lineNumbers, sentiments, regressions)]
+
+# ************************************************************************************************
+# Function: arcSpec()
+# Description: This function makes the arc figure spec for one script
+# Input Parameters: The script's name, the script dataframe, and the settings for newArcState()
+# Returns: A figure spec
+# Pre: The script has the columns 'line', 'character', and 'sentiment'
+# Post: N/A
+# ************************************************************************************************
+def arcSpec(name, script, arcSettings):
+    arc = updateArc(newArcState(**arcSettings), script)
+    return {'name': name.replace(' ', '_') + '_Arc',
+            'kind': 'arc',
+            'title': name + ' Sentiment Arc',
+            'xlabel': 'Line #',
+            'ylabel': 'Adjusted Sentiment Value',
+            'data': {column: arc[column].to_numpy() for column in ['line', 'sentiment', 'rolling', 'ewma', 'change']}}
+
+# ************************************************************************************************
+# Function: scriptFigures()
+# Description: This function plans the regression and arc figures of a collection of scripts
+# Input Parameters: The list of script names (used in titles and file names), a fingerprint of each
+#                   script's contents, a function that loads a script by its position in the list,
+#                   and the settings for newArcState()
+# Returns: A list of figure plans (see renderFigures()): one for every regression and one per arc
+# Pre: The loaded scripts have the columns 'line', 'character', and 'sentiment'
+# Post: Nothing is loaded or computed until a plan is built, and each script is loaded at most once.
+#       The regressions share one plan because fitArcRegressions() deals every script's lines out to
+#       folds from one random stream, so a script's degree can depend on the scripts before it. File
+#       names replace spaces with underscores, like graphs/
+# ************************************************************************************************
+def scriptFigures(names, inputs, loadScript, **arcSettings):
+    loaded = {}
+
+    def script(number):
+        if number not in loaded:
+            loaded[number] = loadScript(number)
+        return loaded[number]
+
+    plans = [{'names': [name.replace(' ', '_') + '_Sentiment' for name in names],
+              'inputs': {'kind': 'regression', 'scripts': list(inputs)},
+              'build': lambda: regressionSpecs(names, [script(number) for number in range(len(names))])}]
+    for number, (name, scriptInputs) in enumerate(zip(names, inputs)):
+        plans.append({'names': [name.replace(' ', '_') + '_Arc'],
+                      'inputs': {'kind': 'arc', 'script': scriptInputs, 'settings': arcSettings},
+                      'build': lambda number=number, name=name: [arcSpec(name, script(number), arcSettings)]})
+    return plans
+
+# ************************************************************************************************
+# Function: barSpec()
+# Description: This function makes the bar figure spec for a series of per-character averages
+# Input Parameters: The figure's name, title, and y label, and the averages indexed by character
+# Returns: A figure spec
+# Pre: N/A
+# Post: N/A
+# ************************************************************************************************
+def barSpec(name, title, ylabel, average):
+    return {'name': name, 'kind': 'bar', 'title': title, 'xlabel': 'Character', 'ylabel': ylabel,
+            'labelSize': 12,
+            'data': {'labels': [str(label) for label in average.index], 'values': average.to_numpy(dtype=float)}}
+
+# ************************************************************************************************
+# Function: scatterSpec()
+# Description: This function makes the expressed vs. received scatter figure spec
+# Input Parameters: The sentiment table (see utils.joinSentimentSeries())
+# Returns: A figure spec
+# Pre: N/A
+# Post: N/A
+# ************************************************************************************************
+def scatterSpec(sentimentTable):
+    return {'name': 'Sentiments_Expressed_vs_Received',
+            'kind': 'labeled_scatter',
+            'title': 'Sentiments Expressed vs Sentiments Received',
+            'xlabel': 'Avg Expressed Sentiment Value',
+            'ylabel': 'Avg Received Sentiment Value',
+            'labelSize': 10,
+            'data': {'labels': [str(label) for label in sentimentTable['character']],
+                     'x': sentimentTable['expressed'].to_numpy(dtype=float),
+                     'y': sentimentTable['received'].to_numpy(dtype=float)}}
+
+# ************************************************************************************************
+# Function: analysisFigures()
+# Description: This function plans the figures for every graph data_analysis.py draws
+# Input Parameters: The settings dict for the analysis pipeline (see analysis_pipeline.buildArtifact())
+# Returns: A list of figure plans (see renderFigures())
+# Pre: N/A
+# Post: Each plan's inputs are the fingerprints of the pipeline stages it draws, which only hash the
+#       data files and code. The stages themselves come from the artifact cache, and only when a plan
+#       is built, so nothing the notebook has already computed is computed again
+# ************************************************************************************************
+def analysisFigures(settings=None):
+    from analysis_pipeline import buildArtifact, artifactFingerprint
+    fingerprints = {}
+    names = ['Episode IV', 'Episode V', 'Episode VI']
+    movies = artifactFingerprint('movies', settings, fingerprints)
+    plans = scriptFigures(names, [movies + ':' + str(number) for number in range(len(names))],
+                          lambda number: buildArtifact('movies', settings)[number])
+
+    for name, title, ylabel, stageName in [('Sentiments_Expressed', 'Sentiments Expressed',
+                                            'Avg Expressed Sentiment Value', 'character_averages'),
+                                           ('Sentiments_Received', 'Sentiments Received in Dialogue',
+                                            'Avg Received Sentiment Value', 'average_received')]:
+        plans.append({'names': [name],
+                      'inputs': {'kind': 'bar', 'stage': artifactFingerprint(stageName, settings, fingerprints)},
+                      'build': lambda name=name, title=title, ylabel=ylabel, stageName=stageName:
+                               [barSpec(name, title, ylabel, buildArtifact(stageName, settings))]})
+
+    plans.append({'names': ['Sentiments_Expressed_vs_Received'],
+                  'inputs': {'kind': 'labeled_scatter',
+                             'stage': artifactFingerprint('sentiment_table', settings, fingerprints)},
+                  'build': lambda: [scatterSpec(buildArtifact('sentiment_table', settings))]})
+    return plans
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render the analysis graphs headlessly across a process pool')
+    parser.add_argument('--scripts', nargs='+', default=None, metavar='CSV',
+                        help="render the regression and arc figures of these scored scripts instead of the "
+                             "data_analysis.py graphs")
+    parser.add_argument('--output-dir', default='graphs')
+    parser.add_argument('--workers', type=int, default=None, help='number of render processes (default: all cores)')
+    parser.add_argument('--max-points', type=int, default=2000,
+                        help='most points drawn per series (at least 3), larger ones are downsampled with LTTB')
+    parser.add_argument('--manifest', default=RENDER_MANIFEST)
+    parser.add_argument('--force', action='store_true', help="render every figure even if its inputs haven't changed")
+    parser.add_argument('--profile', default=None, help='write per-stage timings to this .json or .csv file')
+    args = parser.parse_args()
+    if args.max_points < 3:
+        parser.error('--max-points must be at least 3')
+    if args.profile:
+        enableProfiling(args.profile)
+
+    if args.scripts:
+        from script_store import loadScoredScript, scriptDigest
+        figure_plans = scriptFigures([pathlib.Path(path).stem for path in args.scripts],
+                                     [scriptDigest(path) for path in args.scripts],
+                                     lambda number: loadScoredScript(args.scripts[number], ['line', 'character', 'sentiment']))
+    else:
+        figure_plans = analysisFigures()
+
+    results = renderFigures(figure_plans, args.output_dir, args.workers, args.max_points, args.manifest, args.force)
+    print('Rendered', len(results['rendered']), 'figures and skipped', len(results['skipped']), 'unchanged ones')
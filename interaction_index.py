@@ -0,0 +1,218 @@
+import json
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from utils import findDialogueListeners
+from profiling import profiled
+
+# ************************************************************************************************
+# Function: buildInteractionIndex()
+# Description: This function builds the index of who says what to whom in a list of scripts
+# Input Parameters: The list of script dataframes and the table of dialogue spans found in them by
+#                   spliceDialogueSpans()
+# Returns: A dict with the character 'names' (a pandas Index), the sparse speaker x listener matrices
+#          'counts', 'sums', and 'squares' (line counts, sentiment sums, and sums of squared
+#          sentiments), the per-character 'received' and 'expressed' totals (arrays with columns
+#          count, sum, and sum of squares), and 'codes', a dict from name to row
+# Pre: The spans were found in the same list of scripts, in the same order, and the scripts have the
+#      columns 'character' and 'sentiment'
+# Post: Dialogue lines are attributed exactly like findAverageReceived() does, so received stats
+#       match it. Expressed totals cover every line of the scripts, like findCharacterAverages().
+#       Each (speaker, listener) pair is reduced with one np.unique() and three np.bincount() calls,
+#       so the matrices only ever hold the pairs that actually talk
+# ************************************************************************************************
+@profiled('aggregate', lambda movies, *args, **kwargs: sum(len(movie.index) for movie in movies))
+def buildInteractionIndex(movies, spans):
+    names, sentiments, lineIndex, speakers, listeners = findDialogueListeners(movies, spans)
+    numCharacters = len(names)
+    lineSentiments = sentiments[lineIndex]
+
+    pairs, pairOf = np.unique(speakers.astype(np.int64) * numCharacters + listeners, return_inverse=True)
+    pairOf = pairOf.ravel()
+    rows = pairs // numCharacters
+    columns = pairs % numCharacters
+    shape = (numCharacters, numCharacters)
+    matrices = {}
+    for name, weights in [('counts', None), ('sums', lineSentiments), ('squares', lineSentiments ** 2)]:
+        values = np.bincount(pairOf, weights=weights, minlength=len(pairs))
+        matrices[name] = sparse.csr_matrix((values, (rows, columns)), shape=shape)
+
+    allCodes = names.get_indexer(pd.concat([movie['character'] for movie in movies], ignore_index=True))
+    expressed = np.stack([np.bincount(allCodes, minlength=numCharacters),
+                          np.bincount(allCodes, weights=sentiments, minlength=numCharacters),
+                          np.bincount(allCodes, weights=sentiments ** 2, minlength=numCharacters)], axis=1)
+    received = np.stack([np.asarray(matrices[name].sum(axis=0)).ravel()
+                         for name in ['counts', 'sums', 'squares']], axis=1)
+
+    return {'names': names,
+            'codes': {name: code for code, name in enumerate(names)},
+            'counts': matrices['counts'],
+            'sums': matrices['sums'],
+            'squares': matrices['squares'],
+            'received': received,
+            'expressed': expressed.astype(float)}
+
+# ************************************************************************************************
+# Function: describeTotals()
+# Description: This function turns a count, sum, and sum of squares into summary statistics
+# Input Parameters: The number of lines, the sum of their sentiments, and the sum of the squared
+#                   sentiments
+# Returns: A dict with the 'count', 'mean', and sample 'variance' (NaN where undefined)
+# Pre: N/A
+# Post: N/A
+# ************************************************************************************************
+def describeTotals(count, total, squares):
+    count = int(count)
+    mean = float(total) / count if count else float('nan')
+    variance = (float(squares) - count * mean * mean) / (count - 1) if count > 1 else float('nan')
+    return {'count': count, 'mean': mean, 'variance': max(variance, 0.0) if count > 1 else variance}
+
+# ************************************************************************************************
+# Function: pairStats()
+# Description: This function looks up the lines one character said to another in dialogue
+# Input Parameters: The interaction index, the speaker's name, the listener's name, and whether to
+#                   include the lines the listener said back
+# Returns: A dict with the 'count', 'mean', and 'variance' of the lines' sentiments
+# Pre: N/A
+# Post: Characters who never appear, or never talk, get a count of 0
+# ************************************************************************************************
+def pairStats(index, speaker, listener, bothWays=False):
+    speakerCode = index['codes'].get(speaker)
+    listenerCode = index['codes'].get(listener)
+    if speakerCode is None or listenerCode is None:
+        return describeTotals(0, 0.0, 0.0)
+
+    totals = np.array([index[name][speakerCode, listenerCode] for name in ['counts', 'sums', 'squares']])
+    if bothWays:
+        totals += np.array([index[name][listenerCode, speakerCode] for name in ['counts', 'sums', 'squares']])
+    return describeTotals(*totals)
+
+# ************************************************************************************************
+# Function: receivedStats()
+# Description: This function looks up the lines spoken to a character in dialogue
+# Input Parameters: The interaction index and the character's name
+# Returns: A dict with the 'count', 'mean', and 'variance' of the lines' sentiments
+# Pre: N/A
+# Post: N/A
+# ************************************************************************************************
+def receivedStats(index, character):
+    code = index['codes'].get(character)
+    return describeTotals(*(index['received'][code] if code is not None else (0, 0.0, 0.0)))
+
+# ************************************************************************************************
+# Function: expressedStats()
+# Description: This function looks up every line a character speaks
+# Input Parameters: The interaction index and the character's name
+# Returns: A dict with the 'count', 'mean', and 'variance' of the lines' sentiments
+# Pre: N/A
+# Post: N/A
+# ************************************************************************************************
+def expressedStats(index, character):
+    code = index['codes'].get(character)
+    return describeTotals(*(index['expressed'][code] if code is not None else (0, 0.0, 0.0)))
+
+# ************************************************************************************************
+# Function: averagesFromTotals()
+# Description: This function turns per-character totals into a Series of average sentiments
+# Input Parameters: The interaction index, the totals array ('received' or 'expressed'), an optional
+#                   list of characters to limit the results to, and the minimum number of lines
+# Returns: A pandas Series named 'sentiment' of the characters' averages, highest first
+# Pre: N/A
+# Post: N/A
+# ************************************************************************************************
+def averagesFromTotals(index, totals, characters=None, minLines=20):
+    keep = totals[:, 0] >= max(minLines, 1)
+    if characters is not None:
+        keep &= index['names'].isin(characters)
+    averages = pd.Series(totals[keep, 1] / totals[keep, 0], index=index['names'][keep], name='sentiment')
+    return averages.sort_values(ascending=False)
+
+# ************************************************************************************************
+# Function: receivedAverages()
+# Description: This function finds the average received sentiment of every character spoken to at
+#              least a set number of times, like findAverageReceived()
+# Input Parameters: The interaction index, an optional list of characters to limit the results to,
+#                   and the minimum number of lines spoken to a character
+# Returns: A pandas Series with each major character's average received sentiment
+# Pre: N/A
+# Post: No script is touched, so any threshold can be tried without another pass
+# ************************************************************************************************
+def receivedAverages(index, characters=None, minLines=20):
+    return averagesFromTotals(index, index['received'], characters, minLines)
+
+# ************************************************************************************************
+# Function: expressedAverages()
+# Description: This function finds the average expressed sentiment of every character with at least a
+#              set number of lines, like findCharacterAverages()
+# Input Parameters: The interaction index, an optional list of characters to limit the results to,
+#                   and the minimum number of lines
+# Returns: A pandas Series with each major character's average expressed sentiment
+# Pre: N/A
+# Post: N/A
+# ************************************************************************************************
+def expressedAverages(index, characters=None, minLines=20):
+    return averagesFromTotals(index, index['expressed'], characters, minLines)
+
+# ************************************************************************************************
+# Function: pairTable()
+# Description: This function lists every pair of characters who talk in dialogue
+# Input Parameters: The interaction index and the minimum number of lines from speaker to listener
+# Returns: A dataframe with the columns 'speaker', 'listener', 'count', 'mean', and 'variance',
+#          sorted by count, highest first
+# Pre: N/A
+# Post: The table is read straight from the nonzero entries of the sparse matrices
+# ************************************************************************************************
+def pairTable(index, minLines=1):
+    counts = index['counts'].tocoo()
+    sums = index['sums'].tocoo()
+    squares = index['squares'].tocoo()
+    table = pd.DataFrame({'speaker': index['names'][counts.row],
+                          'listener': index['names'][counts.col],
+                          'count': counts.data.astype(np.int64),
+                          'mean': sums.data / counts.data})
+    table['variance'] = np.where(counts.data > 1,
+                                 np.maximum(squares.data - counts.data * table['mean'] ** 2, 0) /
+                                 np.maximum(counts.data - 1, 1), np.nan)
+    table = table[table['count'] >= minLines]
+    return table.sort_values('count', ascending=False).reset_index(drop=True)
+
+# ************************************************************************************************
+# Function: saveInteractionIndex()
+# Description: This function saves an interaction index to a file
+# Input Parameters: The interaction index and the path to write to (an .npz file)
+# Returns: N/A
+# Pre: N/A
+# Post: The matrices are stored as their shared coordinates plus three value arrays, since all three
+#       have the same nonzero pattern, and the names are stored as JSON
+# ************************************************************************************************
+def saveInteractionIndex(index, path):
+    counts = index['counts'].tocoo()
+    np.savez_compressed(path,
+                        names=np.array(json.dumps([str(name) for name in index['names']])),
+                        rows=counts.row.astype(np.int32),
+                        columns=counts.col.astype(np.int32),
+                        counts=counts.data,
+                        sums=index['sums'].tocoo().data,
+                        squares=index['squares'].tocoo().data,
+                        received=index['received'],
+                        expressed=index['expressed'])
+
+# ************************************************************************************************
+# Function: loadInteractionIndex()
+# Description: This function loads an interaction index saved by saveInteractionIndex()
+# Input Parameters: The path to the .npz file
+# Returns: The interaction index dict
+# Pre: N/A
+# Post: N/A
+# ************************************************************************************************
+def loadInteractionIndex(path):
+    with np.load(path) as data:
+        names = pd.Index(json.loads(str(data['names'])))
+        shape = (len(names), len(names))
+        index = {'names': names,
+                 'codes': {name: code for code, name in enumerate(names)},
+                 'received': data['received'],
+                 'expressed': data['expressed']}
+        for name in ['counts', 'sums', 'squares']:
+            index[name] = sparse.csr_matrix((data[name], (data['rows'], data['columns'])), shape=shape)
+    return index
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import pathlib
+import pickle
+import re
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline, make_union
+from scoring import intentsToSentiments
+from profiling import profiled, stage, countEvent
+
+# Bump this whenever the features or classifier below change, so cached light models and cached line
+# scores from the old version stop being used
+LIGHT_ENGINE_VERSION = '1'
+
+# ************************************************************************************************
+# Function: lightModelKey()
+# Description: This function fingerprints the inputs of a light model
+# Input Parameters: The path to the training data JSON file
+# Returns: A hex string that identifies the light model the training data would produce
+# Pre: The file exists
+# Post: The training data, the scikit-learn version, and LIGHT_ENGINE_VERSION are hashed together.
+#       The key is prefixed with 'light-' so it can never match a Rasa model's key in the line cache
+#       or the build manifest
+# ************************************************************************************************
+def lightModelKey(trainingFile):
+    digest = hashlib.sha256()
+    with open(trainingFile, 'rb') as inputFile:
+        digest.update(inputFile.read())
+    digest.update(('scikit-learn==' + sklearn.__version__ + '\nlight==' + LIGHT_ENGINE_VERSION).encode('utf-8'))
+    return 'light-' + digest.hexdigest()
+
+# ************************************************************************************************
+# Function: trainLightModel()
+# Description: This function trains the light sentiment engine on the Rasa training data
+# Input Parameters: The path to the training data JSON file and the number of hashed features for
+#                   each of the word and character n-gram vectorizers
+# Returns: A dict with the fitted scikit-learn pipeline ('classifier') and the compiled entity
+#          pattern ('entities')
+# Pre: The file is in the rasa_nlu_data format used by sentiments.json
+# Post: The examples' text is lowercased and turned into hashed word 1-2 grams and character 2-4
+#       grams, which are stateless, so the only thing learned is a logistic regression over them.
+#       The entity pattern matches every character name and synonym from entity_synonyms
+# ************************************************************************************************
+@profiled('train')
+def trainLightModel(trainingFile, numFeatures=2 ** 16):
+    with open(trainingFile) as dataFile:
+        data = json.load(dataFile)['rasa_nlu_data']
+
+    texts = [example['text'].lower() for example in data['common_examples']]
+    intents = [example['intent'] for example in data['common_examples']]
+
+    features = make_union(HashingVectorizer(ngram_range=(1, 2), n_features=numFeatures, alternate_sign=False),
+                          HashingVectorizer(analyzer='char_wb', ngram_range=(2, 4), n_features=numFeatures,
+                                            alternate_sign=False))
+    classifier = make_pipeline(features, LogisticRegression(C=10, max_iter=1000))
+    classifier.fit(texts, intents)
+
+    names = set()
+    for synonym in data.get('entity_synonyms', []):
+        names.add(synonym['value'].lower())
+        names.update(name.lower() for name in synonym['synonyms'])
+    names = sorted(names, key=len, reverse=True)
+    entities = re.compile(r'\b(?:' + '|'.join(re.escape(name) for name in names) + r')\b', re.IGNORECASE)
+
+    return {'classifier': classifier, 'entities': entities}
+
+# ************************************************************************************************
+# Function: loadOrTrainLightModel()
+# Description: This function returns the light model for the given training data, training and
+#              saving it only if it hasn't been saved before
+# Input Parameters: The training data JSON file and the directory models are persisted to
+# Returns: The light model dict and its key
+# Pre: The training data file exists
+# Post: The model is pickled to default/light_<key>.pkl, which is only a few MB because the hashed
+#       features keep no vocabulary
+# ************************************************************************************************
+def loadOrTrainLightModel(trainingFile, projectDir='./', projectName='default'):
+    modelKey = lightModelKey(trainingFile)
+    modelPath = pathlib.Path(projectDir) / projectName / ('light_' + modelKey.split('-', 1)[1][:16] + '.pkl')
+
+    if modelPath.is_file():
+        countEvent('model_cache_hits')
+        with open(modelPath, 'rb') as modelFile:
+            return pickle.load(modelFile), modelKey
+
+    model = trainLightModel(trainingFile)
+    modelPath.parent.mkdir(parents=True, exist_ok=True)
+    with open(modelPath, 'wb') as modelFile:
+        pickle.dump(model, modelFile)
+    return model, modelKey
+
+# ************************************************************************************************
+# Function: scoreLinesLight()
+# Description: This function scores lines of dialogue with the light engine
+# Input Parameters: An iterable of dialogue lines and the light model dict
+# Returns: A dataframe with one row per line and the columns 'intent', 'confidence', 'sentiment',
+#          and 'entities', like scoring.scoreLines()
+# Pre: The model came from trainLightModel() or loadOrTrainLightModel()
+# Post: Every line is classified with one predict_proba() call and mapped to the same sentiment
+#       range as the Rasa engine. Entities are the character names and synonyms found in the line,
+#       as written, rather than spaCy's named entities
+# ************************************************************************************************
+@profiled('score', lambda lines, *args, **kwargs: len(lines))
+def scoreLinesLight(lines, model):
+    lines = [str(line) for line in lines]
+    if not lines:
+        return pd.DataFrame(columns=['intent', 'confidence', 'sentiment', 'entities'])
+
+    classifier = model['classifier']
+    with stage('classify', len(lines)):
+        probabilities = classifier.predict_proba([line.lower() for line in lines])
+    best = np.argmax(probabilities, axis=1)
+    intents = classifier.classes_[best]
+    confidences = probabilities[np.arange(len(best)), best]
+
+    with stage('entities', len(lines)):
+        entities = [model['entities'].findall(line) for line in lines]
+
+    return pd.DataFrame({'intent': intents,
+                         'confidence': confidences,
+                         'sentiment': intentsToSentiments(intents, confidences),
+                         'entities': entities})
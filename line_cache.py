@@ -0,0 +1,80 @@
+import json
+import sqlite3
+import unicodedata
+
+# SQLite limits how many values can be bound in one query, so lookups are split into chunks
+LOOKUP_CHUNK_SIZE = 500
+
+# ************************************************************************************************
+# Function: normalizeLine()
+# Description: This function normalizes a line of dialogue before it is used as a cache key
+# Input Parameters: The line of dialogue as a string
+# Returns: The normalized line
+# Pre: N/A
+# Post: The line is converted to Unicode NFC form and stripped of leading and trailing whitespace.
+#       Case and inner spacing are left alone because both change what the model sees
+# ************************************************************************************************
+def normalizeLine(line):
+    return unicodedata.normalize('NFC', str(line)).strip()
+
+# ************************************************************************************************
+# Function: openLineCache()
+# Description: This function opens the on-disk cache of scored lines, creating it if needed
+# Input Parameters: The path to the SQLite database file
+# Returns: An open sqlite3 connection
+# Pre: The folder holding the database file exists
+# Post: The 'scores' table is created if it doesn't exist yet. Each row is keyed by the model's
+#       input fingerprint and the normalized line, so lines scored by an older model are never
+#       returned for a newer one
+# ************************************************************************************************
+def openLineCache(path='scripts/line_cache.sqlite'):
+    connection = sqlite3.connect(str(path))
+    connection.execute('CREATE TABLE IF NOT EXISTS scores ('
+                       'model_key TEXT NOT NULL, '
+                       'line TEXT NOT NULL, '
+                       'intent TEXT NOT NULL, '
+                       'confidence REAL NOT NULL, '
+                       'sentiment REAL NOT NULL, '
+                       'entities TEXT NOT NULL, '
+                       'PRIMARY KEY (model_key, line))')
+    connection.commit()
+    return connection
+
+# ************************************************************************************************
+# Function: lookupLines()
+# Description: This function looks up the cached scores for a collection of lines
+# Input Parameters: The open cache connection, the model's input fingerprint, and an iterable of
+#                   normalized lines
+# Returns: A dict mapping each line that was found to an (intent, confidence, sentiment, entities)
+#          tuple, where entities is a list of strings
+# Pre: The lines have already been passed through normalizeLine()
+# Post: The cache is queried in chunks of LOOKUP_CHUNK_SIZE lines. Lines that aren't cached are left
+#       out of the returned dict
+# ************************************************************************************************
+def lookupLines(connection, modelKey, lines):
+    lines = list(set(lines))
+    found = {}
+    for i in range(0, len(lines), LOOKUP_CHUNK_SIZE):
+        chunk = lines[i:i + LOOKUP_CHUNK_SIZE]
+        query = ('SELECT line, intent, confidence, sentiment, entities FROM scores '
+                 'WHERE model_key = ? AND line IN (' + ', '.join('?' * len(chunk)) + ')')
+        for line, intent, confidence, sentiment, entities in connection.execute(query, [modelKey] + chunk):
+            found[line] = (intent, confidence, sentiment, json.loads(entities))
+    return found
+
+# ************************************************************************************************
+# Function: storeLines()
+# Description: This function saves newly scored lines to the cache
+# Input Parameters: The open cache connection, the model's input fingerprint, a list of normalized
+#                   lines, and a dataframe of their scores in the same order
+# Returns: N/A
+# Pre: The scores dataframe has the columns 'intent', 'confidence', 'sentiment', and 'entities'
+# Post: The scores are written in a single transaction, replacing any existing rows for the same
+#       model and line
+# ************************************************************************************************
+def storeLines(connection, modelKey, lines, scores):
+    rows = zip(lines, scores['intent'], scores['confidence'], scores['sentiment'], scores['entities'])
+    with connection:
+        connection.executemany('INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?)',
+                               [(modelKey, line, str(intent), float(confidence), float(sentiment),
+                                 json.dumps(list(entities))) for line, intent, confidence, sentiment, entities in rows])
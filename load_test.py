@@ -0,0 +1,120 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+import numpy as np
+from script_store import readScriptBatches
+
+# ************************************************************************************************
+# Function: postLines()
+# Description: This function sends one POST /score request on an open connection and waits for the
+#              response
+# Input Parameters: The asyncio stream reader and writer for the connection and the lines to score
+# Returns: The HTTP status code and the decoded JSON response
+# Pre: The connection is to a scoring_server.py server and no other request is in flight on it
+# Post: The request is sent with keep-alive so the connection can be reused for the next request
+# ************************************************************************************************
+async def postLines(reader, writer, lines):
+    body = json.dumps({'lines': lines}).encode('utf-8')
+    writer.write(('POST /score HTTP/1.1\r\n'
+                  'Host: localhost\r\n'
+                  'Content-Type: application/json\r\n'
+                  'Content-Length: ' + str(len(body)) + '\r\n\r\n').encode('latin-1') + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        headerLine = await reader.readline()
+        if headerLine in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = headerLine.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    data = await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, json.loads(data.decode('utf-8'))
+
+# ************************************************************************************************
+# Function: runClient()
+# Description: This function runs one simulated client that sends requests back to back (or at a set
+#              rate) over a single connection
+# Input Parameters: A function that opens a connection, the pool of lines to sample from, the number
+#                   of requests to send, the lines per request, the seconds between request starts
+#                   (0 for back to back), and the list to append latencies to
+# Returns: The number of requests that didn't come back with a 200 status
+# Pre: The server is up
+# Post: The latency of every request is appended to the list in seconds
+# ************************************************************************************************
+async def runClient(connect, linePool, numRequests, linesPerRequest, interval, latencies):
+    reader, writer = await connect()
+    failures = 0
+    nextStart = time.perf_counter()
+    for i in range(numRequests):
+        if interval:
+            await asyncio.sleep(max(nextStart - time.perf_counter(), 0))
+            nextStart += interval
+
+        lines = random.sample(linePool, linesPerRequest)
+        start = time.perf_counter()
+        status, response = await postLines(reader, writer, lines)
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            failures += 1
+    writer.close()
+    return failures
+
+# ************************************************************************************************
+# Function: runLoadTest()
+# Description: This function load tests the scoring server with many concurrent clients
+# Input Parameters: A function that opens a connection, the pool of lines to sample from, the number
+#                   of concurrent clients, the total number of requests, the lines per request, and
+#                   the total target request rate (None to send as fast as the server answers)
+# Returns: A dict with the request count, failures, elapsed time, throughput, and latency
+#          percentiles in milliseconds
+# Pre: The server is up
+# Post: The requests are split evenly between the clients, which all run at the same time
+# ************************************************************************************************
+async def runLoadTest(connect, linePool, concurrency=32, numRequests=5000, linesPerRequest=1, rate=None):
+    latencies = []
+    interval = concurrency / rate if rate else 0
+    perClient = [numRequests // concurrency + (1 if i < numRequests % concurrency else 0)
+                 for i in range(concurrency)]
+
+    start = time.perf_counter()
+    failures = await asyncio.gather(*[runClient(connect, linePool, count, linesPerRequest, interval, latencies)
+                                      for count in perClient if count])
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array(latencies) * 1000
+    return {'requests': len(latencies),
+            'failures': sum(failures),
+            'seconds': elapsed,
+            'requests_per_second': len(latencies) / elapsed,
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p90_ms': float(np.percentile(latencies, 90)),
+            'p99_ms': float(np.percentile(latencies, 99)),
+            'max_ms': float(latencies.max())}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test scoring_server.py with lines from a script')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--unix-socket', default=None, help='connect to this Unix socket instead of TCP')
+    parser.add_argument('--script', default='scripts/SW_EpisodeIV.txt', help='script to sample lines from')
+    parser.add_argument('--concurrency', type=int, default=32, help='number of simultaneous clients')
+    parser.add_argument('--requests', type=int, default=5000, help='total number of requests to send')
+    parser.add_argument('--lines-per-request', type=int, default=1)
+    parser.add_argument('--rate', type=float, default=None,
+                        help='target requests per second across all clients (default: as fast as possible)')
+    args = parser.parse_args()
+
+    linePool = [line for batch in readScriptBatches(args.script) for line in batch['dialogue']]
+
+    def connect():
+        if args.unix_socket:
+            return asyncio.open_unix_connection(args.unix_socket)
+        return asyncio.open_connection(args.host, args.port)
+
+    report = asyncio.run(runLoadTest(connect, linePool, args.concurrency, args.requests,
+                                     args.lines_per_request, args.rate))
+    print(json.dumps(report, indent=4))
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import pathlib
+
+# ************************************************************************************************
+# Function: fileDigest()
+# Description: This function hashes the contents of a file
+# Input Parameters: The path to the file
+# Returns: The SHA-256 hex digest of the file
+# Pre: The file exists
+# Post: The file is read in 1 MB blocks so large scripts are never held in memory all at once
+# ************************************************************************************************
+def fileDigest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as inputFile:
+        for block in iter(lambda: inputFile.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# ************************************************************************************************
+# Function: loadManifest()
+# Description: This function reads the build manifest that records what each output was made from
+# Input Parameters: The path to the manifest JSON file
+# Returns: A dict mapping each output path to a dict with its 'source' digest and 'model' key
+# Pre: N/A
+# Post: An empty manifest is returned if the file doesn't exist yet
+# ************************************************************************************************
+def loadManifest(path):
+    path = pathlib.Path(path)
+    if not path.is_file():
+        return {}
+    with open(path) as manifestFile:
+        return json.load(manifestFile)
+
+# ************************************************************************************************
+# Function: saveManifest()
+# Description: This function writes the build manifest to disk
+# Input Parameters: The manifest dict and the path to the manifest JSON file
+# Returns: N/A
+# Pre: N/A
+# Post: The manifest is written to a temporary file which then replaces the old manifest, so a
+#       crash part way through never leaves a half-written manifest behind
+# ************************************************************************************************
+def saveManifest(manifest, path):
+    tempPath = str(path) + '.tmp'
+    with open(tempPath, 'w') as manifestFile:
+        json.dump(manifest, manifestFile, indent=4, sort_keys=True)
+    os.replace(tempPath, path)
+
+# ************************************************************************************************
+# Function: isStale()
+# Description: This function checks whether an output needs to be rebuilt
+# Input Parameters: The manifest dict, the source file path, the output file path, and the key of
+#                   the model that would build it
+# Returns: True if the output has to be rebuilt and False if it is up to date
+# Pre: The source file exists
+# Post: The output is stale if it doesn't exist, if it isn't in the manifest, or if the source
+#       contents or the model have changed since it was last built
+# ************************************************************************************************
+def isStale(manifest, source, output, modelKey):
+    entry = manifest.get(str(output))
+    if entry is None or not pathlib.Path(output).is_file():
+        return True
+    return entry.get('source') != fileDigest(source) or entry.get('model') != modelKey
+
+# ************************************************************************************************
+# Function: recordBuild()
+# Description: This function records that an output was just built from a source and a model
+# Input Parameters: The manifest dict, the source file path, the output file path, and the key of
+#                   the model that built it
+# Returns: N/A
+# Pre: The output has been completely written
+# Post: The manifest entry for the output is replaced. The manifest still has to be saved with
+#       saveManifest()
+# ************************************************************************************************
+def recordBuild(manifest, source, output, modelKey):
+    manifest[str(output)] = {'source': fileDigest(source), 'model': modelKey}
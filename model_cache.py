@@ -0,0 +1,151 @@
+import hashlib
+import os
+import pathlib
+import shutil
+import pkg_resources
+from profiling import stage, countEvent
+
+# Every model trained through loadOrTrainModel() gets this file, holding the fingerprint of the
+# inputs it was trained from
+MODEL_KEY_FILE = 'model_key.txt'
+
+# Packages whose versions change what a trained model looks like
+MODEL_PACKAGES = ['rasa_nlu', 'spacy', 'scikit-learn', 'en_core_web_lg']
+
+# ************************************************************************************************
+# Function: packageVersions()
+# Description: This function looks up the installed versions of the packages the model depends on
+# Input Parameters: N/A
+# Returns: A list of 'package==version' strings
+# Pre: N/A
+# Post: Each package in MODEL_PACKAGES is looked up. Packages that aren't installed are listed with
+#       the version 'missing' so the fingerprint still changes if they are installed later
+# ************************************************************************************************
+def packageVersions():
+    versions = []
+    for package in MODEL_PACKAGES:
+        try:
+            versions.append(package + '==' + pkg_resources.get_distribution(package).version)
+        except pkg_resources.DistributionNotFound:
+            versions.append(package + '==missing')
+    return versions
+
+# ************************************************************************************************
+# Function: fingerprintModelInputs()
+# Description: This function hashes everything that goes into training a model
+# Input Parameters: The path to the training data JSON file and the path to the pipeline config
+# Returns: A hex string that identifies the model these inputs would produce
+# Pre: Both files exist
+# Post: The contents of both files and the versions of the packages in MODEL_PACKAGES are hashed
+#       together with SHA-256. Identical inputs always give the same fingerprint
+# ************************************************************************************************
+def fingerprintModelInputs(trainingFile, configFile):
+    digest = hashlib.sha256()
+    for path in [trainingFile, configFile]:
+        with open(path, 'rb') as inputFile:
+            digest.update(inputFile.read())
+        digest.update(b'\0')
+    digest.update('\n'.join(packageVersions()).encode('utf-8'))
+    return digest.hexdigest()
+
+# ************************************************************************************************
+# Function: readModelKey()
+# Description: This function reads the input fingerprint stored with a persisted model
+# Input Parameters: The path to the persisted model directory
+# Returns: The stored fingerprint, or None if the model was not trained through the cache
+# Pre: N/A
+# Post: The key file is read if it exists. Nothing is modified
+# ************************************************************************************************
+def readModelKey(modelPath):
+    keyPath = pathlib.Path(modelPath) / MODEL_KEY_FILE
+    if not keyPath.is_file():
+        return None
+    return keyPath.read_text().strip()
+
+# ************************************************************************************************
+# Function: listModels()
+# Description: This function lists the persisted models in a project directory, most recently used
+#              first
+# Input Parameters: The directory the models were persisted to and the Rasa project name
+# Returns: A list of pathlib.Path objects for every model_* directory
+# Pre: N/A
+# Post: Models are ordered by the modification time of their key file, which is touched every time
+#       the model is reused. Models without a key file fall back to the directory's own time
+# ************************************************************************************************
+def listModels(projectDir='./', projectName='default'):
+    modelsDir = pathlib.Path(projectDir) / projectName
+    if not modelsDir.is_dir():
+        return []
+
+    def lastUsed(modelPath):
+        keyPath = modelPath / MODEL_KEY_FILE
+        return (keyPath if keyPath.is_file() else modelPath).stat().st_mtime
+
+    models = [path for path in modelsDir.glob('model_*') if path.is_dir()]
+    return sorted(models, key=lastUsed, reverse=True)
+
+# ************************************************************************************************
+# Function: evictModels()
+# Description: This function deletes old persisted models so that only a set number are kept
+# Input Parameters: The project directory, the number of models to keep, the model that must be
+#                   kept no matter what, and the Rasa project name
+# Returns: A list of the model directories that were deleted
+# Pre: N/A
+# Post: All but the maxModels most recently used models with a key file are deleted. Models
+#       without one (like the ones committed to default/) were not trained through the cache and are
+#       never touched, and neither is the model passed as keep. A maxModels of None or less than 1
+#       turns eviction off
+# ************************************************************************************************
+def evictModels(projectDir='./', maxModels=5, keep=None, projectName='default'):
+    if maxModels is None or maxModels < 1:
+        return []
+
+    models = [model for model in listModels(projectDir, projectName) if readModelKey(model) is not None]
+    if keep is not None:
+        keep = pathlib.Path(keep).resolve()
+        models = [model for model in models if model.resolve() != keep]
+        maxModels -= 1
+
+    evicted = models[max(maxModels, 0):]
+    for model in evicted:
+        shutil.rmtree(model)
+    return evicted
+
+# ************************************************************************************************
+# Function: loadOrTrainModel()
+# Description: This function returns a persisted model for the given training inputs, training one
+#              only if no model for those exact inputs has been persisted yet
+# Input Parameters: The training data JSON file, the pipeline config file, the directory models
+#                   are persisted to, the number of models to keep, and whether to retrain anyway
+# Returns: The path to the model directory and the fingerprint of its inputs
+# Pre: Both input files exist and rasa_nlu is installed if a model has to be trained
+# Post: If a model with a matching key file exists it is reused and its key file is touched.
+#       Otherwise a new model is trained, persisted, and given a key file. Old models trained through
+#       the cache are then evicted down to maxModels
+# ************************************************************************************************
+def loadOrTrainModel(trainingFile, configFile, projectDir='./', maxModels=5, retrain=False):
+    modelKey = fingerprintModelInputs(trainingFile, configFile)
+
+    modelPath = None
+    if not retrain:
+        for model in listModels(projectDir):
+            if readModelKey(model) == modelKey:
+                modelPath = model
+                os.utime(model / MODEL_KEY_FILE)
+                countEvent('model_cache_hits')
+                break
+
+    if modelPath is None:
+        # Rasa is only imported when a model actually has to be trained, so a cache hit stays cheap
+        from rasa_nlu.training_data import load_data
+        from rasa_nlu.model import Trainer
+        from rasa_nlu import config
+
+        with stage('train'):
+            trainer = Trainer(config.load(configFile))
+            trainer.train(load_data(trainingFile))
+            modelPath = pathlib.Path(trainer.persist(projectDir))
+        (modelPath / MODEL_KEY_FILE).write_text(modelKey + '\n')
+
+    evictModels(projectDir, maxModels, keep=modelPath)
+    return modelPath, modelKey
@@ -0,0 +1,208 @@
+import atexit
+import contextlib
+import csv
+import functools
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Setting this environment variable to a .json or .csv path turns profiling on for any of the
+# scripts and writes the report there when the script exits
+PROFILE_ENV = 'SW_PROFILE'
+
+# The report being collected: None while profiling is off, otherwise a dict holding the stage totals
+# keyed by name, the counters, and the stack of stages that are running
+_report = None
+
+# ************************************************************************************************
+# Function: peakRssMegabytes()
+# Description: This function reads the highest resident memory this process (or its finished child
+#              processes) has used so far
+# Input Parameters: Whether to read the children's peak instead of this process's
+# Returns: The peak resident set size in megabytes, or None where the resource module is missing
+#          (Windows)
+# Pre: N/A
+# Post: ru_maxrss is in kilobytes on Linux and bytes on macOS, so it is converted accordingly
+# ************************************************************************************************
+def peakRssMegabytes(children=False):
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    return usage.ru_maxrss / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10)
+
+# ************************************************************************************************
+# Function: enableProfiling()
+# Description: This function turns profiling on for the rest of the run
+# Input Parameters: The path to write the report to when the process exits (None to only collect it)
+# Returns: N/A
+# Pre: N/A
+# Post: Stages and counters are recorded from now on. Calling this again only changes the report path.
+#       The report is only written by the process that turned profiling on, never by a forked worker
+# ************************************************************************************************
+def enableProfiling(reportPath=None):
+    global _report
+    if _report is None:
+        _report = {'script': os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else None,
+                   'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'startTime': time.perf_counter(),
+                   'stages': {},
+                   'counters': {},
+                   'running': [],
+                   'path': None,
+                   'pid': os.getpid()}
+        atexit.register(lambda: (_report is not None and _report['path'] and _report['pid'] == os.getpid()
+                                 and writeReport(_report['path'])))
+    if reportPath:
+        _report['path'] = str(reportPath)
+
+# ************************************************************************************************
+# Function: profilingEnabled()
+# Description: This function reports whether profiling is on
+# Input Parameters: N/A
+# Returns: True if stages and counters are being recorded
+# Pre: N/A
+# Post: N/A
+# ************************************************************************************************
+def profilingEnabled():
+    return _report is not None
+
+# ************************************************************************************************
+# Function: stage()
+# Description: This context manager times a stage of the pipeline
+# Input Parameters: The stage's name and, optionally, the number of rows it handles
+# Returns: A dict the caller can set 'rows' in once the number of rows is known
+# Pre: N/A
+# Post: With profiling off nothing is measured. Otherwise the wall time, row count, and the process's
+#       peak RSS (and how much it grew) are added to the stage's totals, even if the stage raises.
+#       Stages can be nested, and each one remembers the stage it ran inside of
+# ************************************************************************************************
+@contextlib.contextmanager
+def stage(name, rows=None):
+    record = {'rows': rows}
+    if _report is None:
+        yield record
+        return
+
+    parent = _report['running'][-1] if _report['running'] else None
+    _report['running'].append(name)
+    rssBefore = peakRssMegabytes()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        seconds = time.perf_counter() - start
+        _report['running'].pop()
+        rssAfter = peakRssMegabytes()
+
+        totals = _report['stages'].setdefault(name, {'name': name, 'parent': parent, 'calls': 0, 'seconds': 0.0,
+                                                     'rows': None, 'peak_rss_mb': None, 'rss_growth_mb': None})
+        totals['calls'] += 1
+        totals['seconds'] += seconds
+        if record['rows'] is not None:
+            totals['rows'] = (totals['rows'] or 0) + int(record['rows'])
+        if rssAfter is not None:
+            totals['peak_rss_mb'] = rssAfter
+            totals['rss_growth_mb'] = (totals['rss_growth_mb'] or 0) + rssAfter - rssBefore
+
+# ************************************************************************************************
+# Function: profiled()
+# Description: This function makes a decorator that runs a function as a profiled stage
+# Input Parameters: The stage's name, an optional function that takes the same arguments as the
+#                   decorated function and returns the number of rows the call handles, and whether
+#                   to count the rows of the result instead
+# Returns: The decorator
+# Pre: If countResult is set, the decorated function returns something with a len()
+# Post: With profiling off the decorated function only pays for one check. Counting the inputs
+#       makes rows/sec reflect the work done (e.g. lines spliced rather than dialogues found), while
+#       counting the result suits loaders, whose input is just a path
+# ************************************************************************************************
+def profiled(name, countRows=None, countResult=False):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _report is None:
+                return function(*args, **kwargs)
+            with stage(name, countRows(*args, **kwargs) if countRows is not None else None) as record:
+                result = function(*args, **kwargs)
+                if countResult:
+                    record['rows'] = len(result)
+                return result
+        return wrapper
+    return decorator
+
+# ************************************************************************************************
+# Function: countEvent()
+# Description: This function adds to one of the run's counters
+# Input Parameters: The counter's name and the amount to add
+# Returns: N/A
+# Pre: N/A
+# Post: Nothing happens while profiling is off
+# ************************************************************************************************
+def countEvent(name, amount=1):
+    if _report is not None:
+        _report['counters'][name] = _report['counters'].get(name, 0) + amount
+
+# ************************************************************************************************
+# Function: profileReport()
+# Description: This function builds the report of the run so far
+# Input Parameters: N/A
+# Returns: A dict with the script name, start time, total seconds, peak RSS of the process and its
+#          finished children, the list of stages (with rows/sec where rows were counted), and the
+#          counters. None if profiling is off
+# Pre: N/A
+# Post: Stages are listed in the order they first finished
+# ************************************************************************************************
+def profileReport():
+    if _report is None:
+        return None
+    stages = []
+    for totals in _report['stages'].values():
+        totals = dict(totals)
+        totals['rows_per_second'] = (totals['rows'] / totals['seconds']
+                                     if totals['rows'] is not None and totals['seconds'] > 0 else None)
+        stages.append(totals)
+    return {'script': _report['script'],
+            'started': _report['started'],
+            'total_seconds': time.perf_counter() - _report['startTime'],
+            'peak_rss_mb': peakRssMegabytes(),
+            'children_peak_rss_mb': peakRssMegabytes(children=True),
+            'stages': stages,
+            'counters': dict(_report['counters'])}
+
+# ************************************************************************************************
+# Function: writeReport()
+# Description: This function saves the report of the run so far
+# Input Parameters: The path to write to, ending in .csv for a table or anything else for JSON
+# Returns: N/A
+# Pre: Profiling is on
+# Post: The CSV has one row per stage and one per counter (with the counter's total in 'value'),
+#       plus a 'run' row with the totals, so reports from many runs can be concatenated
+# ************************************************************************************************
+def writeReport(path):
+    report = profileReport()
+    if str(path).endswith('.csv'):
+        columns = ['kind', 'name', 'parent', 'calls', 'seconds', 'rows', 'rows_per_second', 'peak_rss_mb',
+                   'rss_growth_mb', 'value']
+        with open(path, 'w', newline='') as outputFile:
+            writer = csv.DictWriter(outputFile, fieldnames=columns, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerow({'kind': 'run', 'name': report['script'], 'seconds': report['total_seconds'],
+                             'peak_rss_mb': report['peak_rss_mb'], 'value': report['started']})
+            for totals in report['stages']:
+                writer.writerow(dict(totals, kind='stage'))
+            for name, value in report['counters'].items():
+                writer.writerow({'kind': 'counter', 'name': name, 'value': value})
+    else:
+        with open(path, 'w') as outputFile:
+            json.dump(report, outputFile, indent=4)
+
+# Pool workers started with spawn inherit the environment, but only the main process reports
+if os.environ.get(PROFILE_ENV) and multiprocessing.current_process().name == 'MainProcess':
+    enableProfiling(os.environ[PROFILE_ENV])
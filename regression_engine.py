@@ -0,0 +1,228 @@
+import json
+import numpy as np
+import matplotlib.pyplot as plt
+from utils import downsampleSeries
+from profiling import profiled
+
+# ************************************************************************************************
+# Function: stackScripts()
+# Description: This function puts the x and y values of many scripts end to end so they can all be
+#              fitted at once
+# Input Parameters: A list of x arrays and a list of y arrays, one of each per script
+# Returns: The scaled x values, the y values, the script number of every value, and the center and
+#          half-width used to scale each script's x values
+# Pre: Each script's x and y arrays have the same length and hold at least one value
+# Post: Every script's x values are mapped onto [-1, 1] before any powers are taken. Line numbers run
+#       into the thousands, so their raw powers would make the least-squares systems hopelessly
+#       ill-conditioned, while the scaled ones stay well behaved. toRawCoefficients() undoes this
+# ************************************************************************************************
+def stackScripts(xs, ys):
+    xs = [np.asarray(x, dtype=float).ravel() for x in xs]
+    ys = [np.asarray(y, dtype=float).ravel() for y in ys]
+    centers = np.array([(x.min() + x.max()) / 2 for x in xs])
+    halfWidths = np.array([(x.max() - x.min()) / 2 for x in xs])
+    halfWidths[halfWidths == 0] = 1
+
+    scripts = np.repeat(np.arange(len(xs)), [len(x) for x in xs])
+    x = (np.concatenate(xs) - centers[scripts]) / halfWidths[scripts]
+    return x, np.concatenate(ys), scripts, centers, halfWidths
+
+# ************************************************************************************************
+# Function: momentSums()
+# Description: This function sums the powers of x, and of x times y, within each group of values
+# Input Parameters: The x and y values, the group number of every value, the number of groups, and
+#                   the highest degree that will be fitted
+# Returns: The sums of x^0 through x^(2 * maxDegree), the sums of x^0 * y through x^maxDegree * y,
+#          and the sums of y^2, each with one row per group
+# Pre: Group numbers run from 0 to numGroups - 1
+# Post: These sums are all the normal equations of every degree up to maxDegree need, so the data
+#       is only passed over once no matter how many degrees or groups there are
+# ************************************************************************************************
+def momentSums(x, y, groups, numGroups, maxDegree):
+    powers = x[:, None] ** np.arange(2 * maxDegree + 1)
+    xSums = np.stack([np.bincount(groups, weights=powers[:, k], minlength=numGroups)
+                      for k in range(2 * maxDegree + 1)], axis=1)
+    xySums = np.stack([np.bincount(groups, weights=powers[:, k] * y, minlength=numGroups)
+                       for k in range(maxDegree + 1)], axis=1)
+    yySums = np.bincount(groups, weights=y * y, minlength=numGroups)
+    return xSums, xySums, yySums
+
+# ************************************************************************************************
+# Function: solveNormalEquations()
+# Description: This function solves a stack of least-squares problems of the same degree at once
+# Input Parameters: The x power sums and x * y sums from momentSums() (for any number of problems)
+#                   and the degree to fit
+# Returns: The fitted coefficients, one row per problem, lowest power first
+# Pre: N/A
+# Post: Each problem's Vandermonde normal matrix is read straight out of the power sums (entry i, j
+#       is the sum of x^(i + j)) and every matrix is solved in one np.linalg.solve() call. If any
+#       matrix is singular (e.g. a script with fewer distinct lines than coefficients), the whole
+#       stack is solved with the pseudo-inverse instead, which gives the minimum-norm fit
+# ************************************************************************************************
+def solveNormalEquations(xSums, xySums, degree):
+    indices = np.arange(degree + 1)
+    normalMatrices = xSums[..., indices[:, None] + indices[None, :]]
+    rightSides = xySums[..., :degree + 1]
+    try:
+        return np.linalg.solve(normalMatrices, rightSides[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        return np.einsum('...ij,...j->...i', np.linalg.pinv(normalMatrices), rightSides)
+
+# ************************************************************************************************
+# Function: toRawCoefficients()
+# Description: This function turns coefficients fitted on scaled x values back into coefficients on
+#              the original x values
+# Input Parameters: The coefficients from solveNormalEquations(), one row per script, and each
+#                   script's center and half-width from stackScripts()
+# Returns: The coefficients on the original x values, lowest power first
+# Pre: N/A
+# Post: Each scaled power ((x - center) / halfWidth)^k is expanded with one polynomial multiplication
+#       per degree for every script at once
+# ************************************************************************************************
+def toRawCoefficients(coefficients, centers, halfWidths):
+    numScripts, numCoefficients = coefficients.shape
+    raw = np.zeros((numScripts, numCoefficients))
+    term = np.zeros((numScripts, numCoefficients))
+    term[:, 0] = 1
+    for k in range(numCoefficients):
+        raw += coefficients[:, k:k + 1] * term
+        term[:, 1:] = (term[:, :-1] - centers[:, None] * term[:, 1:]) / halfWidths[:, None]
+        term[:, 0] = -centers * term[:, 0] / halfWidths
+    return raw
+
+# ************************************************************************************************
+# Function: fitPolynomials()
+# Description: This function fits a polynomial regression of one degree to every script at once
+# Input Parameters: A list of x arrays and a list of y arrays, one of each per script, and the degree
+# Returns: An array of coefficients with one row per script, intercept first, giving the same
+#          regression as fitRegression() on each script
+# Pre: Each script's x and y arrays have the same length
+# Post: One pass over the data builds every script's normal equations, and they are all solved
+#       together
+# ************************************************************************************************
+def fitPolynomials(xs, ys, degree):
+    x, y, scripts, centers, halfWidths = stackScripts(xs, ys)
+    xSums, xySums, yySums = momentSums(x, y, scripts, len(centers), degree)
+    return toRawCoefficients(solveNormalEquations(xSums, xySums, degree), centers, halfWidths)
+
+# ************************************************************************************************
+# Function: crossValidateDegrees()
+# Description: This function finds the cross-validated error of every candidate degree for every
+#              script
+# Input Parameters: A list of x arrays and a list of y arrays, one of each per script, the candidate
+#                   degrees, the number of folds, and the random seed for assigning lines to folds
+# Returns: An array of mean squared errors on the held-out lines with one row per script and one
+#          column per degree
+# Pre: Every script has at least as many lines as folds
+# Post: The power sums are found once for every (script, fold) pair. A fold's training sums are the
+#       script's totals minus the fold's own, and its held-out squared error is
+#       sum(y^2) - 2 b . sum(x^k y) + b' M b using the fold's own sums, so no model is ever
+#       evaluated line by line. Every fold of every script is solved in one call per degree
+# ************************************************************************************************
+def crossValidateDegrees(xs, ys, degrees=range(1, 7), folds=5, seed=0):
+    degrees = list(degrees)
+    x, y, scripts, centers, halfWidths = stackScripts(xs, ys)
+    numScripts = len(centers)
+
+    # Lines are dealt out to folds in a random order within each script so each fold covers the
+    # whole movie rather than one stretch of it
+    rng = np.random.default_rng(seed)
+    foldOf = np.empty(len(x), dtype=np.int64)
+    scriptStarts = np.r_[0, np.cumsum(np.bincount(scripts, minlength=numScripts))]
+    for start, stop in zip(scriptStarts[:-1], scriptStarts[1:]):
+        foldOf[start:stop] = rng.permutation(stop - start) % folds
+
+    groups = scripts * folds + foldOf
+    xSums, xySums, yySums = momentSums(x, y, groups, numScripts * folds, max(degrees))
+    xSums = xSums.reshape(numScripts, folds, -1)
+    xySums = xySums.reshape(numScripts, folds, -1)
+    yySums = yySums.reshape(numScripts, folds)
+    trainX = xSums.sum(axis=1, keepdims=True) - xSums
+    trainXY = xySums.sum(axis=1, keepdims=True) - xySums
+
+    errors = np.empty((numScripts, len(degrees)))
+    for column, degree in enumerate(degrees):
+        coefficients = solveNormalEquations(trainX, trainXY, degree)
+        indices = np.arange(degree + 1)
+        heldOutMatrices = xSums[..., indices[:, None] + indices[None, :]]
+        squaredErrors = (yySums - 2 * np.einsum('sfi,sfi->sf', coefficients, xySums[..., :degree + 1]) +
+                         np.einsum('sfi,sfij,sfj->sf', coefficients, heldOutMatrices, coefficients))
+        errors[:, column] = squaredErrors.sum(axis=1) / np.bincount(scripts, minlength=numScripts)
+    return errors
+
+# ************************************************************************************************
+# Function: fitArcRegressions()
+# Description: This function picks a regression degree for every script by cross-validation and fits
+#              it
+# Input Parameters: A list of x arrays and a list of y arrays, one of each per script, the candidate
+#                   degrees, the number of folds, and the random seed
+# Returns: A list of dicts, one per script, with the chosen 'degree', its 'cv_mse', the 'cv_errors'
+#          of every candidate degree, and the 'coefficients' (intercept first)
+# Pre: Every script has at least as many lines as folds
+# Post: The degree with the lowest held-out error wins. Scripts are then grouped by their chosen
+#       degree and each group is fitted in one batch
+# ************************************************************************************************
+@profiled('fit', lambda xs, *args, **kwargs: sum(len(x) for x in xs))
+def fitArcRegressions(xs, ys, degrees=range(1, 7), folds=5, seed=0):
+    degrees = list(degrees)
+    errors = crossValidateDegrees(xs, ys, degrees, folds, seed)
+    chosen = np.argmin(errors, axis=1)
+
+    results = [None] * len(xs)
+    for column in np.unique(chosen):
+        members = np.flatnonzero(chosen == column)
+        coefficients = fitPolynomials([xs[i] for i in members], [ys[i] for i in members], degrees[column])
+        for i, row in zip(members, coefficients):
+            results[i] = {'degree': degrees[column],
+                          'cv_mse': float(errors[i, column]),
+                          'cv_errors': {str(degree): float(error) for degree, error in zip(degrees, errors[i])},
+                          'coefficients': [float(coefficient) for coefficient in row]}
+    return results
+
+# ************************************************************************************************
+# Function: formatEquation()
+# Description: This function writes out a regression equation the way equations.txt does
+# Input Parameters: The coefficients, intercept first
+# Returns: The equation as a string
+# Pre: N/A
+# Post: N/A
+# ************************************************************************************************
+def formatEquation(coefficients):
+    terms = [repr(float(coefficients[0]))]
+    for power, coefficient in enumerate(coefficients[1:], start=1):
+        terms.append(repr(float(coefficient)) + ' * (Line #)' + ('^' + str(power) if power > 1 else ''))
+    return 'Predicted Avg Sentiment = ' + ' + '.join(terms)
+
+# ************************************************************************************************
+# Function: writeEquations()
+# Description: This function saves fitted regressions to a JSON file
+# Input Parameters: The path to write to, the list of script names, and the list of results from
+#                   fitArcRegressions() in the same order
+# Returns: N/A
+# Pre: N/A
+# Post: Each script's entry holds its name, degree, coefficients, cross-validation errors, and the
+#       equation in the format of equations.txt
+# ************************************************************************************************
+def writeEquations(path, names, results):
+    entries = [dict({'name': name, 'equation': formatEquation(result['coefficients'])}, **result)
+               for name, result in zip(names, results)]
+    with open(path, 'w') as outputFile:
+        json.dump(entries, outputFile, indent=4)
+
+# ************************************************************************************************
+# Function: plotPolynomial()
+# Description: This function plots data with a fitted polynomial regression using pyplot
+# Input Parameters: X and y, the independent and dependent variables, the coefficients, intercept
+#                   first, and the most points to scatter (None scatters them all)
+# Returns: N/A
+# Pre: N/A
+# Post: Like plotRegression(), the data and regression line are plotted and labeling is left to the
+#       user. The line is evaluated straight from the coefficients with np.polynomial
+# ************************************************************************************************
+def plotPolynomial(X, y, coefficients, maxPoints=None):
+    X = np.asarray(X, dtype=float).ravel()
+    y = np.asarray(y, dtype=float).ravel()
+    kept = downsampleSeries(X, y, maxPoints)
+    plt.scatter(X[kept], y[kept], color='black')
+    xDelta = np.linspace(X.min(), X.max(), 1000)
+    plt.plot(xDelta, np.polynomial.polynomial.polyval(xDelta, coefficients), color='blue', linewidth=2)
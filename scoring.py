@@ -0,0 +1,380 @@
+import json
+import multiprocessing
+import os
+import pathlib
+import numpy as np
+import pandas as pd
+from line_cache import normalizeLine, lookupLines, storeLines
+from manifest import fileDigest
+from model_cache import readModelKey
+from script_store import readScriptBatches
+from profiling import profiled, countEvent
+
+# Rasa is imported inside the functions that use it, so the light engine and the line cache can be
+# used without the Rasa stack installed
+
+# Each pool worker loads its own interpreter once in initWorker() and keeps it here between shards
+_workerInterpreter = None
+_workerBatchSize = 256
+
+# ************************************************************************************************
+# Function: translationLayer()
+# Description: This function runs a single line of text through the full Rasa interpreter and
+#              returns the predicted intent and its confidence
+# Input Parameters: The loaded Rasa Interpreter and the line of text to be classified
+# Returns: The name of the predicted intent and the confidence of the prediction
+# Pre: The interpreter has been loaded from a persisted model directory
+# Post: The line is parsed by every component in the pipeline and the top intent is returned. This
+#       is the slow path, kept for scoring one-off lines. Whole scripts should use scoreLines()
+# ************************************************************************************************
+def translationLayer(interpreter, inputText):
+    result = interpreter.parse(inputText)
+    intent = result['intent']['name']
+    confidence = result['intent']['confidence']
+    return intent, confidence
+
+# ************************************************************************************************
+# Function: intentsToSentiments()
+# Description: This function converts arrays of intents and confidences into adjusted sentiment
+#              values in the range [-1, 1]
+# Input Parameters: A numpy array of intent names and a numpy array of their confidences
+# Returns: A numpy array of adjusted sentiment values
+# Pre: Every intent is either 'positive' or 'negative'
+# Post: Positive intents map to 2 * (confidence - 0.5) and negative intents map to
+#       -2 * (confidence - 0.5). A ValueError is raised if any other intent is found
+# ************************************************************************************************
+def intentsToSentiments(intents, confidences):
+    intents = np.asarray(intents)
+    confidences = np.asarray(confidences, dtype=float)
+
+    positive = intents == 'positive'
+    negative = intents == 'negative'
+    if not np.all(positive | negative):
+        raise ValueError('INVALID INTENT: ' + str(intents[~(positive | negative)][0]))
+
+    return np.where(positive, 2.0, -2.0) * (confidences - 0.5)
+
+# ************************************************************************************************
+# Function: findComponent()
+# Description: This function finds a component in a loaded Rasa pipeline by its class name
+# Input Parameters: The loaded Rasa Interpreter and the class name of the component to find
+# Returns: The first matching pipeline component, or None if there isn't one
+# Pre: The interpreter has been loaded from a persisted model directory
+# Post: The pipeline is searched in order and the first component of the given class is returned
+# ************************************************************************************************
+def findComponent(interpreter, className):
+    for component in interpreter.pipeline:
+        if type(component).__name__ == className:
+            return component
+    return None
+
+# ************************************************************************************************
+# Function: featurizeDoc()
+# Description: This function computes the same text features for a parsed spaCy Doc that the
+#              SpacyFeaturizer would compute inside the Rasa pipeline
+# Input Parameters: The parsed spaCy Doc and whether the pipeline's SpacyNLP is case sensitive
+# Returns: A numpy array with the averaged word vector for the line
+# Pre: The Doc was parsed from the original (cased) line by the interpreter's spaCy model
+# Post: If the model is not case sensitive, the lowercased token vectors are averaged, which matches
+#       what SpacyNLP does when it lowercases the text before parsing it. This lets the same Doc be
+#       used for both the intent features and the named entities
+# ************************************************************************************************
+def featurizeDoc(doc, caseSensitive=False):
+    if caseSensitive or len(doc) == 0:
+        return doc.vector
+    vocab = doc.vocab
+    return np.mean([vocab.get_vector(token.lower) for token in doc], axis=0)
+
+# ************************************************************************************************
+# Function: scoreBatches()
+# Description: This function streams lines of dialogue through spaCy in batches and classifies
+#              each batch with a single call to the trained intent classifier
+# Input Parameters: An iterable of dialogue lines, the loaded Rasa Interpreter, and the number of
+#                   lines to parse and classify at a time
+# Returns: A generator of dataframes, one per batch, with the columns 'intent', 'confidence',
+#          'sentiment', and 'entities'
+# Pre: The interpreter's pipeline contains SpacyNLP, SpacyFeaturizer, and SklearnIntentClassifier
+# Post: Each line is parsed by spaCy exactly once. The Doc's vector is used as the classifier
+#       feature and its named entities are stored in the 'entities' column. The featurizer and
+#       classifier are run on a whole batch matrix instead of one line at a time
+# ************************************************************************************************
+def scoreBatches(lines, interpreter, batchSize=256):
+    spacyComponent = findComponent(interpreter, 'SpacyNLP')
+    tokenizer = findComponent(interpreter, 'SpacyTokenizer')
+    regexFeaturizer = findComponent(interpreter, 'RegexFeaturizer')
+    classifier = findComponent(interpreter, 'SklearnIntentClassifier')
+    if spacyComponent is None or classifier is None or classifier.clf is None:
+        raise ValueError('The interpreter needs a SpacyNLP component and a trained SklearnIntentClassifier')
+
+    from rasa_nlu.training_data import Message
+
+    nlp = spacyComponent.nlp
+    caseSensitive = spacyComponent.component_config.get('case_sensitive', False)
+    usePatterns = regexFeaturizer is not None and bool(regexFeaturizer.known_patterns)
+
+    features = []
+    entities = []
+    for doc in nlp.pipe(lines, batch_size=batchSize):
+        lineFeatures = featurizeDoc(doc, caseSensitive)
+
+        # Regex patterns need tokens, so they are only applied line by line when the training data
+        # actually defines some
+        if usePatterns:
+            message = Message(doc.text)
+            message.set('spacy_doc', doc)
+            message.set('tokens', tokenizer.tokenize(doc))
+            message.set('text_features', lineFeatures)
+            regexFeaturizer.process(message)
+            lineFeatures = message.get('text_features')
+
+        features.append(lineFeatures)
+        entities.append([word.text for word in doc.ents])
+
+        if len(features) == batchSize:
+            yield classifyBatch(classifier, features, entities)
+            features = []
+            entities = []
+
+    if features:
+        yield classifyBatch(classifier, features, entities)
+
+# ************************************************************************************************
+# Function: classifyBatch()
+# Description: This function classifies a batch of feature vectors with the trained intent
+#              classifier and packs the results into a dataframe
+# Input Parameters: The SklearnIntentClassifier component, a list of feature vectors, and a list of
+#                   entity lists for the same lines
+# Returns: A dataframe with the columns 'intent', 'confidence', 'sentiment', and 'entities'
+# Pre: The classifier has been trained and the feature vectors all have the same length
+# Post: predict_proba() is called once for the whole batch and the most likely intent of each line
+#       is converted to an adjusted sentiment value
+# ************************************************************************************************
+@profiled('classify', lambda classifier, features, entities: len(features))
+def classifyBatch(classifier, features, entities):
+    countEvent('classifier_calls')
+    probabilities = classifier.clf.predict_proba(np.vstack(features))
+    best = np.argmax(probabilities, axis=1)
+    intents = classifier.le.inverse_transform(best)
+    confidences = probabilities[np.arange(len(best)), best]
+
+    return pd.DataFrame({'intent': intents,
+                         'confidence': confidences,
+                         'sentiment': intentsToSentiments(intents, confidences),
+                         'entities': entities})
+
+# ************************************************************************************************
+# Function: scoreLines()
+# Description: This function scores every line of dialogue in a script
+# Input Parameters: An iterable of dialogue lines, the loaded Rasa Interpreter, and the batch size
+# Returns: A dataframe with one row per line and the columns 'intent', 'confidence', 'sentiment',
+#          and 'entities'
+# Pre: The interpreter has been loaded from a persisted model directory
+# Post: The lines are scored in batches with scoreBatches() and the batches are concatenated in the
+#       original line order
+# ************************************************************************************************
+@profiled('score', lambda lines, *args, **kwargs: len(lines))
+def scoreLines(lines, interpreter, batchSize=256):
+    batches = list(scoreBatches(lines, interpreter, batchSize))
+    if not batches:
+        return pd.DataFrame(columns=['intent', 'confidence', 'sentiment', 'entities'])
+    return pd.concat(batches, ignore_index=True)
+
+# ************************************************************************************************
+# Function: initWorker()
+# Description: This function loads the persisted interpreter into a pool worker process
+# Input Parameters: The path to the persisted model directory and the batch size to score with
+# Returns: N/A
+# Pre: This function is run once by multiprocessing.Pool as each worker process starts
+# Post: The interpreter and its spaCy model are loaded once and kept in module globals so every
+#       shard given to the worker reuses them
+# ************************************************************************************************
+def initWorker(modelPath, batchSize):
+    from rasa_nlu.model import Interpreter
+
+    global _workerInterpreter, _workerBatchSize
+    _workerInterpreter = Interpreter.load(modelPath)
+    _workerBatchSize = batchSize
+
+# ************************************************************************************************
+# Function: scoreShard()
+# Description: This function scores one shard of lines inside a pool worker
+# Input Parameters: A list of dialogue lines
+# Returns: A dataframe with the scores for the shard, as returned by scoreLines()
+# Pre: initWorker() has already been run in this process
+# Post: The shard is scored with the worker's interpreter and the results are sent back to the
+#       parent process
+# ************************************************************************************************
+def scoreShard(shard):
+    return scoreLines(shard, _workerInterpreter, _workerBatchSize)
+
+# ************************************************************************************************
+# Function: scoreCorpus()
+# Description: This function scores the dialogue of several scripts, optionally across a pool of
+#              worker processes
+# Input Parameters: A list of lists (or Series) of dialogue lines, one per script, the path to the
+#                   persisted model directory, the number of worker processes, the batch size, and
+#                   the number of lines in each shard handed to a worker
+# Returns: A list of score dataframes, one per script, in the same order as the scripts
+# Pre: The model directory holds a persisted Rasa model
+# Post: With one worker the interpreter is loaded in this process and the scripts are scored in
+#       turn. With more, every script's lines are pooled and cut into shards so the workers stay
+#       busy even when scripts differ in length. imap() keeps the shards in order, so the scores can
+#       be cut back into one dataframe per script
+# ************************************************************************************************
+@profiled('score_corpus', lambda scripts, *args, **kwargs: sum(len(lines) for lines in scripts))
+def scoreCorpus(scripts, modelPath, workers=1, batchSize=256, shardSize=2048):
+    scripts = [list(lines) for lines in scripts]
+
+    if workers <= 1:
+        from rasa_nlu.model import Interpreter
+        countEvent('interpreter_loads')
+        interpreter = Interpreter.load(str(modelPath))
+        return [scoreLines(lines, interpreter, batchSize) for lines in scripts]
+
+    allLines = [line for lines in scripts for line in lines]
+    shards = [allLines[i:i + shardSize] for i in range(0, len(allLines), shardSize)]
+    countEvent('interpreter_loads', workers)
+    countEvent('shards', len(shards))
+    with multiprocessing.Pool(workers, initializer=initWorker, initargs=(str(modelPath), batchSize)) as pool:
+        results = list(pool.imap(scoreShard, shards))
+
+    if results:
+        allScores = pd.concat(results, ignore_index=True)
+    else:
+        allScores = pd.DataFrame(columns=['intent', 'confidence', 'sentiment', 'entities'])
+
+    scores = []
+    start = 0
+    for lines in scripts:
+        scores.append(allScores.iloc[start:start + len(lines)].reset_index(drop=True))
+        start += len(lines)
+    return scores
+
+# ************************************************************************************************
+# Function: scoreWithCache()
+# Description: This function scores the dialogue of several scripts, only scoring the lines that
+#              aren't already in the line cache
+# Input Parameters: A list of lists (or Series) of dialogue lines, one per script, the open line
+#                   cache connection, the model's input fingerprint, and a function that scores a
+#                   list of lines and returns their score dataframe
+# Returns: A list of score dataframes, one per script, in the same order as the scripts
+# Pre: The line cache was opened with openLineCache() and the scoring function uses the model the
+#      fingerprint belongs to
+# Post: Lines are normalized and deduplicated across every script. Only the distinct lines missing
+#       from the cache are passed to the scoring function, and their scores are stored before the
+#       per-script dataframes are built. If every line is cached, the function is never called
+# ************************************************************************************************
+def scoreWithCache(scripts, connection, modelKey, scoreMissing):
+    scripts = [[normalizeLine(line) for line in lines] for lines in scripts]
+    cached = lookupLines(connection, modelKey, [line for lines in scripts for line in lines])
+
+    missing = list(dict.fromkeys(line for lines in scripts for line in lines if line not in cached))
+    countEvent('line_cache_hits', len(cached))
+    countEvent('line_cache_misses', len(missing))
+    if missing:
+        newScores = scoreMissing(missing)
+        storeLines(connection, modelKey, missing, newScores)
+        for row in zip(missing, newScores['intent'], newScores['confidence'],
+                       newScores['sentiment'], newScores['entities']):
+            cached[row[0]] = tuple(row[1:])
+
+    scores = []
+    for lines in scripts:
+        rows = [cached[line] for line in lines]
+        scores.append(pd.DataFrame(rows, columns=['intent', 'confidence', 'sentiment', 'entities']))
+    return scores
+
+# ************************************************************************************************
+# Function: scoreCorpusCached()
+# Description: This function scores the dialogue of several scripts with scoreCorpus(), only
+#              running the model on lines that aren't already in the line cache
+# Input Parameters: A list of lists (or Series) of dialogue lines, one per script, the path to the
+#                   persisted model directory, the open line cache connection, the model's input
+#                   fingerprint, and any keyword arguments for scoreCorpus()
+# Returns: A list of score dataframes, one per script, in the same order as the scripts
+# Pre: If no model key is given, the model was trained through loadOrTrainModel() and has a key file
+# Post: The cache misses from every script are scored together by scoreCorpus(), so the interpreter
+#       is only loaded (and the worker pool only started) if there is at least one miss
+# ************************************************************************************************
+def scoreCorpusCached(scripts, modelPath, connection, modelKey=None, **kwargs):
+    if modelKey is None:
+        modelKey = readModelKey(modelPath)
+    if modelKey is None:
+        raise ValueError('The model at ' + str(modelPath) + ' has no key file to cache its scores under')
+
+    return scoreWithCache(scripts, connection, modelKey,
+                          lambda missing: scoreCorpus([missing], modelPath, **kwargs)[0])
+
+# ************************************************************************************************
+# Function: rasaScorer()
+# Description: This function makes a scoring function for the Rasa engine that only loads the
+#              interpreter the first time it is called
+# Input Parameters: The path to the persisted model directory and the batch size
+# Returns: A function that takes a list of lines and returns their score dataframe
+# Pre: The model directory holds a persisted Rasa model
+# Post: Nothing is loaded until lines are actually scored, so a run where every line is cached never
+#       loads the interpreter. The loaded interpreter is kept for every later call
+# ************************************************************************************************
+def rasaScorer(modelPath, batchSize=256):
+    interpreters = []
+
+    def scoreFunction(lines):
+        if not interpreters:
+            from rasa_nlu.model import Interpreter
+            countEvent('interpreter_loads')
+            interpreters.append(Interpreter.load(str(modelPath)))
+        return scoreLines(lines, interpreters[0], batchSize)
+
+    return scoreFunction
+
+# ************************************************************************************************
+# Function: scoreScriptStream()
+# Description: This function scores a script file batch by batch, appending each scored batch to
+#              the output CSV as soon as it is done
+# Input Parameters: The path to the source script, the path to the output CSV, a function that
+#                   scores a list of lines (see rasaScorer()), the key of the model it uses, the
+#                   number of script lines per batch, and an optional open line cache
+# Returns: The number of lines in the output
+# Pre: The source is in the quoted, space-separated SW_Episode*.txt format
+# Post: Only one batch of the script is held in memory at a time. After every batch the output's
+#       size and the number of lines done are saved to a progress file next to the output. If a run
+#       is interrupted, the next run with the same source and model cuts the output back to the last
+#       completed batch and carries on from there. The progress file is removed once the whole
+#       script has been written
+# ************************************************************************************************
+def scoreScriptStream(source, output, scoreFunction, modelKey, chunkSize=1024, connection=None):
+    progressPath = pathlib.Path(str(output) + '.progress')
+    sourceDigest = fileDigest(source)
+
+    progress = {'source': sourceDigest, 'model': modelKey, 'lines': 0, 'bytes': 0}
+    if progressPath.is_file() and pathlib.Path(output).is_file():
+        with open(progressPath) as progressFile:
+            saved = json.load(progressFile)
+        if saved['source'] == sourceDigest and saved['model'] == modelKey:
+            progress = saved
+
+    with open(output, 'r+' if progress['lines'] else 'w', newline='', encoding='utf-8') as outputFile:
+        outputFile.seek(progress['bytes'])
+        outputFile.truncate()
+
+        for batch in readScriptBatches(source, chunkSize, skipLines=progress['lines']):
+            if connection is None:
+                scores = scoreFunction(batch['dialogue'].tolist())
+            else:
+                scores = scoreWithCache([batch['dialogue']], connection, modelKey, scoreFunction)[0]
+            batch.insert(3, 'sentiment', scores['sentiment'].values)
+            batch.insert(4, 'entities', scores['entities'].values)
+
+            batch.to_csv(outputFile, index=False, header=progress['lines'] == 0)
+            outputFile.flush()
+            os.fsync(outputFile.fileno())
+
+            progress['lines'] += len(batch.index)
+            progress['bytes'] = outputFile.tell()
+            with open(str(progressPath) + '.tmp', 'w') as progressFile:
+                json.dump(progress, progressFile)
+            os.replace(str(progressPath) + '.tmp', progressPath)
+
+    if progressPath.is_file():
+        progressPath.unlink()
+    return progress['lines']
@@ -0,0 +1,192 @@
+import argparse
+import asyncio
+import json
+from model_cache import loadOrTrainModel
+from scoring import scoreLines
+
+# ************************************************************************************************
+# Function: batchRequests()
+# Description: This function collects queued scoring requests into micro-batches and scores each
+#              micro-batch with one call to scoreLines()
+# Input Parameters: The asyncio queue of (lines, future) requests, the loaded Rasa Interpreter, the
+#                   most lines to put in one micro-batch, and the longest time in seconds to wait
+#                   for more requests after the first one arrives
+# Returns: N/A (this function runs until it is cancelled)
+# Pre: This function is run as a task on the same event loop that fills the queue
+# Post: As soon as a request arrives, more are gathered until the batch is full or the deadline
+#       passes. The batch is scored on a worker thread so the event loop keeps accepting requests,
+#       then each request's future gets its own slice of the scores. Only this task ever uses the
+#       interpreter, so it is never called from two threads at once
+# ************************************************************************************************
+async def batchRequests(queue, interpreter, maxBatch=64, maxWait=0.005):
+    loop = asyncio.get_event_loop()
+    while True:
+        requests = [await queue.get()]
+        numLines = len(requests[0][0])
+        deadline = loop.time() + maxWait
+        while numLines < maxBatch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            requests.append(request)
+            numLines += len(request[0])
+
+        lines = [line for requestLines, future in requests for line in requestLines]
+        try:
+            scores = await loop.run_in_executor(None, scoreLines, lines, interpreter, max(len(lines), 1))
+        except Exception as error:
+            for requestLines, future in requests:
+                if not future.done():
+                    future.set_exception(error)
+            continue
+
+        start = 0
+        for requestLines, future in requests:
+            if not future.done():
+                future.set_result(scores.iloc[start:start + len(requestLines)])
+            start += len(requestLines)
+
+# ************************************************************************************************
+# Function: routeRequest()
+# Description: This function answers one HTTP request
+# Input Parameters: The HTTP method, the request path, the raw request body, and the request queue
+# Returns: The HTTP status line text and a JSON-serializable response payload
+# Pre: batchRequests() is running on the same queue
+# Post: GET /health reports that the server is up. POST /score takes {"text": "..."} or
+#       {"lines": [...]} and waits for the micro-batcher to score the lines, returning the intent,
+#       confidence, sentiment, and entities of each one. Anything else gets an error status
+# ************************************************************************************************
+async def routeRequest(method, path, body, queue):
+    if method == 'GET' and path == '/health':
+        return '200 OK', {'status': 'ok'}
+    if path != '/score':
+        return '404 Not Found', {'error': 'unknown path ' + path}
+    if method != 'POST':
+        return '405 Method Not Allowed', {'error': 'use POST to score lines'}
+
+    try:
+        payload = json.loads(body.decode('utf-8'))
+        lines = payload['lines'] if 'lines' in payload else [payload['text']]
+    except (ValueError, KeyError, TypeError):
+        return '400 Bad Request', {'error': 'expected a JSON object with "text" or "lines"'}
+    if not isinstance(lines, list) or not all(isinstance(line, str) for line in lines):
+        return '400 Bad Request', {'error': '"lines" must be a list of strings'}
+    if not lines:
+        return '200 OK', {'results': []}
+
+    future = asyncio.get_event_loop().create_future()
+    await queue.put((lines, future))
+    scores = await future
+
+    results = [{'intent': str(intent), 'confidence': float(confidence), 'sentiment': float(sentiment),
+                'entities': list(entities)}
+               for intent, confidence, sentiment, entities in zip(scores['intent'], scores['confidence'],
+                                                                  scores['sentiment'], scores['entities'])]
+    return '200 OK', {'results': results}
+
+# ************************************************************************************************
+# Function: handleConnection()
+# Description: This function serves HTTP/1.1 requests on one client connection
+# Input Parameters: The asyncio stream reader and writer for the connection and the request queue
+# Returns: N/A
+# Pre: The connection was accepted by asyncio.start_server() or asyncio.start_unix_server()
+# Post: Requests are read one after another and answered with JSON. The connection is kept open
+#       between requests unless the client asks to close it or sends something that can't be
+#       parsed, so load tests don't pay for a new connection per request
+# ************************************************************************************************
+async def handleConnection(reader, writer, queue):
+    try:
+        while True:
+            requestLine = await reader.readline()
+            if not requestLine:
+                break
+            method, path, version = requestLine.decode('latin-1').split()
+
+            headers = {}
+            while True:
+                headerLine = await reader.readline()
+                if headerLine in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = headerLine.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+            try:
+                status, payload = await routeRequest(method, path, body, queue)
+            except Exception as error:
+                status, payload = '500 Internal Server Error', {'error': str(error)}
+
+            keepAlive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+            data = json.dumps(payload).encode('utf-8')
+            writer.write(('HTTP/1.1 ' + status + '\r\n'
+                          'Content-Type: application/json\r\n'
+                          'Content-Length: ' + str(len(data)) + '\r\n'
+                          'Connection: ' + ('keep-alive' if keepAlive else 'close') + '\r\n\r\n').encode('latin-1') + data)
+            await writer.drain()
+            if not keepAlive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+# ************************************************************************************************
+# Function: serve()
+# Description: This function runs the scoring server until it is stopped
+# Input Parameters: The path to the persisted model directory, the host and port to listen on (or a
+#                   Unix socket path, which takes priority), the most lines per micro-batch, and
+#                   the micro-batch deadline in seconds
+# Returns: N/A
+# Pre: The model directory holds a persisted Rasa model
+# Post: The interpreter and its spaCy model are loaded once, the micro-batcher is started, and
+#       connections are served until the process is interrupted
+# ************************************************************************************************
+async def serve(modelPath, host='127.0.0.1', port=8000, unixSocket=None, maxBatch=64, maxWait=0.005):
+    from rasa_nlu.model import Interpreter
+
+    loop = asyncio.get_event_loop()
+    interpreter = await loop.run_in_executor(None, Interpreter.load, str(modelPath))
+    queue = asyncio.Queue()
+    batcher = asyncio.ensure_future(batchRequests(queue, interpreter, maxBatch, maxWait))
+
+    def onConnection(reader, writer):
+        return handleConnection(reader, writer, queue)
+
+    if unixSocket:
+        server = await asyncio.start_unix_server(onConnection, path=unixSocket)
+        print('Scoring server listening on ' + unixSocket)
+    else:
+        server = await asyncio.start_server(onConnection, host, port)
+        print('Scoring server listening on http://' + host + ':' + str(port))
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batcher.cancel()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve sentiment scores over HTTP with request micro-batching')
+    parser.add_argument('--model', default=None,
+                        help='persisted model directory (default: the cached model for sentiments.json)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--unix-socket', default=None, help='listen on this Unix socket instead of TCP')
+    parser.add_argument('--max-batch', type=int, default=64, help='most lines scored in one micro-batch')
+    parser.add_argument('--max-wait-ms', type=float, default=5.0,
+                        help='how long to wait for more requests before scoring a micro-batch')
+    args = parser.parse_args()
+
+    model_directory = args.model
+    if model_directory is None:
+        model_directory, model_key = loadOrTrainModel('sentiments.json', 'config_spacy.yml', './')
+
+    try:
+        asyncio.run(serve(model_directory, args.host, args.port, args.unix_socket,
+                          args.max_batch, args.max_wait_ms / 1000))
+    except KeyboardInterrupt:
+        pass
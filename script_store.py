@@ -0,0 +1,242 @@
+import ast
+import csv
+import itertools
+import json
+import os
+import pathlib
+import shutil
+import numpy as np
+import pandas as pd
+from manifest import fileDigest
+from profiling import profiled, countEvent
+
+# Columns that are always stored as categories, whatever their dtype in the dataframe
+CATEGORY_COLUMNS = ['character']
+
+# ************************************************************************************************
+# Function: readScriptBatches()
+# Description: This function reads an original script file a fixed number of lines at a time
+# Input Parameters: The path to the script file, the number of lines per batch, and the number of
+#                   lines at the start of the script to skip
+# Returns: A generator of dataframes with the columns from the file's header ('line', 'character',
+#          and 'dialogue'), each holding at most batchSize lines
+# Pre: The script is in the quoted, space-separated format of the SW_Episode*.txt files, with a
+#      header row and backslash as the escape character
+# Post: The file is parsed with the csv module the same way pd.read_csv(sep=' ', escapechar='\\')
+#       parses it, but only one batch is held in memory at a time. Skipped lines are parsed and
+#       thrown away without being kept. The 'line' column is converted to integers
+# ************************************************************************************************
+def readScriptBatches(path, batchSize=1024, skipLines=0):
+    with open(path, newline='', encoding='utf-8') as scriptFile:
+        reader = csv.reader(scriptFile, delimiter=' ', quotechar='"', escapechar='\\')
+        header = next(reader)
+        rows = itertools.islice(reader, skipLines, None)
+        while True:
+            batch = list(itertools.islice(rows, batchSize))
+            if not batch:
+                return
+            batch = pd.DataFrame(batch, columns=header)
+            if 'line' in batch.columns:
+                batch['line'] = pd.to_numeric(batch['line'])
+            yield batch
+
+# ************************************************************************************************
+# Function: storePathFor()
+# Description: This function gives the columnar store path that goes with a scored script CSV
+# Input Parameters: The path to the scored script CSV file
+# Returns: A pathlib.Path to the store folder, e.g. scripts/EpisodeIV_Sentiments.cols for
+#          scripts/EpisodeIV_Sentiments.csv
+# Pre: N/A
+# Post: Nothing is read or written
+# ************************************************************************************************
+def storePathFor(csvPath):
+    return pathlib.Path(csvPath).with_suffix('.cols')
+
+# ************************************************************************************************
+# Function: writeStrings()
+# Description: This function writes a list of strings as one UTF-8 blob plus an array of offsets
+# Input Parameters: The store folder, the file name prefix, and the list of strings
+# Returns: N/A
+# Pre: The store folder exists
+# Post: <name>.utf8 holds every string back to back and <name>.offsets.npy holds where each one
+#       starts, with one extra entry for the end of the last string
+# ************************************************************************************************
+def writeStrings(folder, name, strings):
+    encoded = [('' if pd.isna(text) else str(text)).encode('utf-8') for text in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(text) for text in encoded])
+    np.save(folder / (name + '.offsets.npy'), offsets)
+    (folder / (name + '.utf8')).write_bytes(b''.join(encoded))
+
+# ************************************************************************************************
+# Function: readStrings()
+# Description: This function reads a list of strings written by writeStrings()
+# Input Parameters: The store folder and the file name prefix
+# Returns: A list of strings
+# Pre: writeStrings() was used to write the strings with the same name
+# Post: The offsets are memory-mapped and the blob is sliced and decoded one string at a time
+# ************************************************************************************************
+def readStrings(folder, name):
+    offsets = np.load(folder / (name + '.offsets.npy'), mmap_mode='r')
+    blob = (folder / (name + '.utf8')).read_bytes()
+    return [blob[start:stop].decode('utf-8') for start, stop in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+# ************************************************************************************************
+# Function: writeScript()
+# Description: This function saves a scored script dataframe in the columnar store format
+# Input Parameters: The script dataframe, the path to the store folder, and the path to the CSV the
+#                   store is built from (if any)
+# Returns: N/A
+# Pre: List columns (like 'entities') hold lists of strings
+# Post: Every column is written to its own file(s) in the folder and columns.json records the row
+#       count, each column's kind, and the size, modification time, and digest of the CSV, so a
+#       store whose CSV has changed since can be recognized (see isStoreCurrent()). Character names
+#       become int32 codes plus a category list, floats become float32, integers become int32, list
+#       columns become a flat string column plus offsets, and other columns are stored as strings.
+#       The store is written to a temporary folder first and then moved into place, so readers never
+#       see a half-written store
+# ************************************************************************************************
+def writeScript(script, path, csvPath=None):
+    path = pathlib.Path(path)
+    tempPath = path.with_name(path.name + '.tmp')
+    shutil.rmtree(tempPath, ignore_errors=True)
+    tempPath.mkdir(parents=True)
+
+    kinds = {}
+    for column in script.columns:
+        values = script[column]
+        if column in CATEGORY_COLUMNS or isinstance(values.dtype, pd.CategoricalDtype):
+            categorical = pd.Categorical(values)
+            np.save(tempPath / (column + '.codes.npy'), categorical.codes.astype(np.int32))
+            writeStrings(tempPath, column + '.categories', list(categorical.categories))
+            kinds[column] = 'category'
+        elif pd.api.types.is_float_dtype(values):
+            np.save(tempPath / (column + '.npy'), values.to_numpy(dtype=np.float32))
+            kinds[column] = 'float32'
+        elif pd.api.types.is_integer_dtype(values):
+            np.save(tempPath / (column + '.npy'), values.to_numpy(dtype=np.int32))
+            kinds[column] = 'int32'
+        elif len(values) and isinstance(values.iloc[0], (list, tuple)):
+            lists = values.tolist()
+            listOffsets = np.zeros(len(lists) + 1, dtype=np.int64)
+            listOffsets[1:] = np.cumsum([len(items) for items in lists])
+            np.save(tempPath / (column + '.lists.npy'), listOffsets)
+            writeStrings(tempPath, column, [item for items in lists for item in items])
+            kinds[column] = 'list'
+        else:
+            writeStrings(tempPath, column, values.tolist())
+            kinds[column] = 'string'
+
+    metadata = {'rows': len(script.index), 'columns': kinds}
+    if csvPath is not None:
+        status = os.stat(csvPath)
+        metadata['source'] = {'size': status.st_size, 'mtime_ns': status.st_mtime_ns,
+                              'digest': fileDigest(csvPath)}
+    with open(tempPath / 'columns.json', 'w') as columnsFile:
+        json.dump(metadata, columnsFile, indent=4)
+
+    if path.exists():
+        shutil.rmtree(path)
+    os.replace(tempPath, path)
+
+# ************************************************************************************************
+# Function: readScript()
+# Description: This function loads a scored script from the columnar store format
+# Input Parameters: The path to the store folder and an optional list of the columns to load
+# Returns: A dataframe with the requested columns in the order they were asked for (or the stored
+#          order if no list is given)
+# Pre: The store was written by writeScript()
+# Post: Only the files for the requested columns are opened. Numeric columns and category codes
+#       are memory-mapped, so loading 'character' and 'sentiment' never touches the dialogue text
+# ************************************************************************************************
+def readScript(path, columns=None):
+    path = pathlib.Path(path)
+    with open(path / 'columns.json') as columnsFile:
+        kinds = json.load(columnsFile)['columns']
+    if columns is None:
+        columns = list(kinds)
+
+    data = {}
+    for column in columns:
+        kind = kinds[column]
+        if kind == 'category':
+            codes = np.load(path / (column + '.codes.npy'), mmap_mode='r')
+            data[column] = pd.Categorical.from_codes(codes, readStrings(path, column + '.categories'))
+        elif kind == 'list':
+            listOffsets = np.load(path / (column + '.lists.npy'), mmap_mode='r').tolist()
+            items = readStrings(path, column)
+            data[column] = [items[start:stop] for start, stop in zip(listOffsets[:-1], listOffsets[1:])]
+        elif kind == 'string':
+            data[column] = readStrings(path, column)
+        else:
+            data[column] = np.load(path / (column + '.npy'), mmap_mode='r')
+    return pd.DataFrame(data, columns=columns)
+
+# ************************************************************************************************
+# Function: isStoreCurrent()
+# Description: This function checks whether a scored script's columnar store still matches its CSV
+# Input Parameters: The path to the scored script CSV file
+# Returns: True if the store can be read in place of the CSV, False otherwise
+# Pre: N/A
+# Post: The CSVs are the source of truth, so a store is only current if it exists and records the
+#       CSV as it is now. A matching size and modification time are trusted without reading the CSV.
+#       Only when the size matches but the time doesn't (e.g. after a checkout) is the CSV hashed and
+#       compared to the recorded digest. A store without a CSV next to it is current, and one that
+#       doesn't record its CSV is not
+# ************************************************************************************************
+def isStoreCurrent(csvPath):
+    columnsPath = storePathFor(csvPath) / 'columns.json'
+    if not columnsPath.is_file():
+        return False
+    if not os.path.isfile(csvPath):
+        return True
+
+    with open(columnsPath) as columnsFile:
+        source = json.load(columnsFile).get('source')
+    status = os.stat(csvPath)
+    if source is None or source['size'] != status.st_size:
+        return False
+    if source.get('mtime_ns') == status.st_mtime_ns:
+        return True
+    return source['digest'] == fileDigest(csvPath)
+
+# ************************************************************************************************
+# Function: scriptDigest()
+# Description: This function gives the digest of a scored script's contents
+# Input Parameters: The path to the scored script CSV file
+# Returns: The SHA-256 hex digest of the CSV
+# Pre: The CSV exists
+# Post: If the store is current (see isStoreCurrent()) the digest it recorded is used, so an
+#       unchanged CSV is usually not read at all. Otherwise the CSV is hashed
+# ************************************************************************************************
+def scriptDigest(csvPath):
+    if isStoreCurrent(csvPath):
+        with open(storePathFor(csvPath) / 'columns.json') as columnsFile:
+            return json.load(columnsFile)['source']['digest']
+    return fileDigest(csvPath)
+
+# ************************************************************************************************
+# Function: loadScoredScript()
+# Description: This function loads a scored script, preferring its columnar store over the CSV
+# Input Parameters: The path to the scored script CSV file and an optional list of columns to load
+# Returns: A dataframe with the requested columns
+# Pre: Either the CSV or its store (see storePathFor()) exists
+# Post: If the store is current (see isStoreCurrent()) only the requested columns are read from it.
+#       Otherwise the CSV is read and the stringified lists in its 'entities' column are turned
+#       back into lists. A store that is out of date is counted but left alone, and is rewritten the
+#       next time sentiment_analysis.py scores the script
+# ************************************************************************************************
+@profiled('load', countResult=True)
+def loadScoredScript(csvPath, columns=None):
+    store = storePathFor(csvPath)
+    if isStoreCurrent(csvPath):
+        return readScript(store, columns)
+    if (store / 'columns.json').is_file():
+        countEvent('stale_stores')
+
+    script = pd.read_csv(csvPath, usecols=columns)
+    if 'entities' in script.columns:
+        script['entities'] = [ast.literal_eval(entities) for entities in script['entities']]
+    if columns is not None:
+        script = script[columns]
+    return script
@@ -1,73 +1,139 @@
 import pandas as pd
-# Read CSV file to a pandas dataframe
-df1 = pd.read_csv("scripts/SW_EpisodeIV.txt", sep=' ', escapechar='\\')
-df2 = pd.read_csv("scripts/SW_EpisodeV.txt", sep=' ', escapechar='\\')
-df3 = pd.read_csv("scripts/SW_EpisodeVI.txt", sep=' ', escapechar='\\')
-# print(df)
-
-# lines = df1.dialogue
-movies = [df1, df2, df3]
 
 # Code taken from a friend's Hackathon project
 # The training data was adapted to my purposes but this code remains mostly unmodified
 # Source code available here:
 # https://github.com/Macbee280/CrimsonCode2023
-from rasa_nlu.training_data import load_data
-from rasa_nlu.model import Trainer
-from rasa_nlu.model import Interpreter
-from rasa_nlu import config
-import spacy
-import pathlib
+import argparse
+import os
+from model_cache import fingerprintModelInputs, loadOrTrainModel
+from manifest import loadManifest, saveManifest, isStale, recordBuild
+from script_store import storePathFor, writeScript, loadScoredScript
+from line_cache import openLineCache
+from scoring import scoreCorpus, scoreCorpusCached, scoreWithCache, scoreScriptStream, rasaScorer
+from light_engine import lightModelKey, loadOrTrainLightModel, scoreLinesLight
+from entity_index import indexScoredScripts
+from profiling import enableProfiling, stage
+
+# Each source script and the sentiment file that is built from it
+SCRIPTS = [('scripts/SW_EpisodeIV.txt', 'scripts/EpisodeIV_Sentiments.csv'),
+           ('scripts/SW_EpisodeV.txt', 'scripts/EpisodeV_Sentiments.csv'),
+           ('scripts/SW_EpisodeVI.txt', 'scripts/EpisodeVI_Sentiments.csv')]
+MANIFEST = 'scripts/sentiment_manifest.json'
+# The inverted index from canonical entities to the lines that mention them, rebuilt whenever any
+# sentiment file is
+ENTITY_INDEX = 'scripts/entity_index.npz'
+
+# The main guard keeps pool workers from re-running the training and scoring when they import this
+# file under the spawn start method
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Add sentiment and entity columns to the movie scripts')
+    parser.add_argument('--engine', choices=['rasa', 'light'], default='rasa',
+                        help='score with the Rasa/spaCy model, or with the light hashed n-gram model that '
+                             'starts in under a second (see benchmark_engines.py for how closely they agree)')
+    parser.add_argument('--batch-size', type=int, default=256,
+                        help='number of lines parsed by spaCy and classified at a time')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of worker processes to score with, each loading the model once')
+    parser.add_argument('--shard-size', type=int, default=2048,
+                        help='number of lines handed to a worker at a time')
+    parser.add_argument('--max-models', type=int, default=5,
+                        help='number of cached models to keep in default/ (0 keeps them all, models not trained '
+                             'through the cache are always kept)')
+    parser.add_argument('--retrain', action='store_true',
+                        help='train a new model even if one for the same inputs is cached')
+    parser.add_argument('--line-cache', default='scripts/line_cache.sqlite',
+                        help='SQLite file that remembers the scores of lines already seen by this model')
+    parser.add_argument('--no-line-cache', action='store_true',
+                        help='score every line with the model instead of using the line cache')
+    parser.add_argument('--force', action='store_true',
+                        help='rebuild every sentiment file, even the ones that are up to date')
+    parser.add_argument('--stream', action='store_true',
+                        help='read, score, and write each script a chunk at a time in this process, '
+                             'resuming an interrupted script from its last finished chunk')
+    parser.add_argument('--chunk-size', type=int, default=1024,
+                        help='number of script lines per chunk in --stream mode')
+    parser.add_argument('--profile', default=None,
+                        help='write per-stage timings, memory, and counters to this .json or .csv file '
+                             '(setting SW_PROFILE does the same for any script)')
+    args = parser.parse_args()
+    if args.profile:
+        enableProfiling(args.profile)
+
+    # Only the sentiment files whose source script or model has changed since they were last built
+    # are regenerated. If none have, the model is never loaded
+    if args.engine == 'light':
+        model_key = lightModelKey('sentiments.json')
+    else:
+        model_key = fingerprintModelInputs('sentiments.json', 'config_spacy.yml')
+    manifest = loadManifest(MANIFEST)
+    stale = [(source, output) for source, output in SCRIPTS
+             if args.force or isStale(manifest, source, output, model_key)
+             or not storePathFor(output).is_dir()]
+    if not stale:
+        print('All sentiment files are up to date')
+        if not os.path.isfile(ENTITY_INDEX):
+            indexScoredScripts([output for source, output in SCRIPTS], ENTITY_INDEX)
+        raise SystemExit(0)
 
-train_data = load_data('sentiments.json')
-nlu_config = config.load('config_spacy.yml')
-nlp = spacy.load('en_core_web_lg')
-trainer = Trainer(nlu_config)
-trainer.train(train_data)
-model_directory = trainer.persist('./')
-model_path = pathlib.Path(model_directory)
-interpreter = Interpreter.load(model_path)
+    # The model is only retrained when sentiments.json, config_spacy.yml, or the library versions
+    # have changed since the last run
+    if args.engine == 'light':
+        light_model, model_key = loadOrTrainLightModel('sentiments.json', './')
+        score_function = lambda lines: scoreLinesLight(lines, light_model)
+    else:
+        model_directory, model_key = loadOrTrainModel('sentiments.json', 'config_spacy.yml', './',
+                                                      maxModels=args.max_models, retrain=args.retrain)
+        score_function = rasaScorer(model_directory, args.batch_size)
+    line_cache = None if args.no_line_cache else openLineCache(args.line_cache)
 
-def translationLayer(inputText):
-    result = interpreter.parse(inputText)
-    intent = result['intent']['name']
-    confidence = result['intent']['confidence']
-    return intent, confidence
+    # In stream mode only one chunk of a script is in memory at a time. The columnar store is built
+    # from the finished CSV, one script at a time
+    if args.stream:
+        for source, output in stale:
+            scoreScriptStream(source, output, score_function, model_key, chunkSize=args.chunk_size,
+                              connection=line_cache)
+            writeScript(loadScoredScript(output), storePathFor(output), output)
+            recordBuild(manifest, source, output, model_key)
+            saveManifest(manifest, MANIFEST)
+        indexScoredScripts([output for source, output in SCRIPTS], ENTITY_INDEX)
+        raise SystemExit(0)
 
-for movie in movies:
-    intents = []
-    confidences = []
-    entities = []
-    intentAdjusted = []
-    for line in movie.dialogue:
-        intent, confidence = translationLayer(line)
-        intents.append(intent)
-        confidences.append(confidence)
+    # Read CSV file to a pandas dataframe
+    with stage('parse') as record:
+        movies = [pd.read_csv(source, sep=' ', escapechar='\\') for source, output in stale]
+        record['rows'] = sum(len(movie.index) for movie in movies)
 
-        lineEntities = []
-        lineProcessing = nlp(line)
-        for word in lineProcessing.ents:
-            lineEntities.append(word.text)
-        entities.append(lineEntities)
-        
-    for i in range(len(intents)):
-        if intents[i] == 'positive':
-            intentAdjusted.append(2 * (confidences[i] - 0.5))
-        elif intents[i] == 'negative':
-            intentAdjusted.append(-2 * (confidences[i] - 0.5))
-        else:
-            print('INVALID INTENT')
-            quit()
-    movie.insert(3, 'sentiment', intentAdjusted)
-    movie.insert(4, 'entities', entities)
+    # The interpreter's own spaCy model is reused for named entities, so each line is only parsed once
+    # Lines that repeat within or across scripts, or that were scored on an earlier run, are read from
+    # the line cache instead of being run through the model again
+    dialogues = [movie.dialogue for movie in movies]
+    if args.engine == 'light' and line_cache is None:
+        scores = [score_function(lines) for lines in dialogues]
+    elif args.engine == 'light':
+        scores = scoreWithCache(dialogues, line_cache, model_key, score_function)
+    elif line_cache is None:
+        scores = scoreCorpus(dialogues, model_directory, workers=args.workers,
+                             batchSize=args.batch_size, shardSize=args.shard_size)
+    else:
+        scores = scoreCorpusCached(dialogues, model_directory, line_cache, model_key, workers=args.workers,
+                                   batchSize=args.batch_size, shardSize=args.shard_size)
+    for (source, output), movie, movieScores in zip(stale, movies, scores):
+        movie.insert(3, 'sentiment', movieScores['sentiment'].values)
+        movie.insert(4, 'entities', movieScores['entities'].values)
+        with stage('write', len(movie.index)):
+            movie.to_csv(output, index=False)
+            writeScript(movie, storePathFor(output), output)
+        recordBuild(manifest, source, output, model_key)
+        saveManifest(manifest, MANIFEST)
 
-df1.to_csv('scripts/EpisodeIV_Sentiments.csv', index=False)
-df2.to_csv('scripts/EpisodeV_Sentiments.csv', index=False)
-df3.to_csv('scripts/EpisodeVI_Sentiments.csv', index=False)
+    # The entity index covers every script, so the ones that were up to date are read back from
+    # their stores
+    indexScoredScripts([output for source, output in SCRIPTS], ENTITY_INDEX)
 
 # Going forward:
 #   - Verify that AI is producing reliable assessments or train it more
 #   - Put sentiments into dataframe as a new column (I don't know how yet)
 #   - Trace change in average sentiment over the course of a movie
 #   - See which characters are the most positive/negative
-#   - Try to automate cutting up scripts into separate dialogues to analyze sentiment in interactions
\ No newline at end of file
+#   - Try to automate cutting up scripts into separate dialogues to analyze sentiment in interactions
@@ -0,0 +1,115 @@
+import argparse
+import numpy as np
+import pandas as pd
+
+# The lines synthetic dialogue is drawn from, with the characters each one mentions. Drawing from a
+# fixed pool keeps memory flat at millions of lines, and the repeats are realistic (scripts are full of
+# "Yes, sir." and "What?")
+DIALOGUE_POOL = [('What?', []),
+                 ('Yes, sir.', []),
+                 ("I don't know.", []),
+                 ('We have to get out of here!', []),
+                 ('I have a bad feeling about this.', []),
+                 ('Where is the princess?', ['princess']),
+                 ("Don't worry about the Wookiee.", ['Wookiee']),
+                 ('Luke, come with me.', ['Luke']),
+                 ('The Emperor will not be pleased.', ['Emperor']),
+                 ('Han, look out!', ['Han']),
+                 ("It's a trap!", []),
+                 ('May the Force be with you.', []),
+                 ('Artoo, where are you?', ['Artoo']),
+                 ('That was close.', []),
+                 ("I'll be right back.", []),
+                 ('Lord Vader, the fleet is ready.', ['Vader'])]
+
+# ************************************************************************************************
+# Function: makeSyntheticScript()
+# Description: This function generates a script with the columns of the scored scripts, at any scale
+# Input Parameters: The number of lines, the number of characters, the random seed, the average
+#                   number of lines in a scene, the chance a speaker keeps talking on the next line,
+#                   and the chance a third character cuts into a conversation
+# Returns: A dataframe with the columns 'line', 'character', 'dialogue', 'sentiment', and
+#          'entities', like the files in the scripts folder
+# Pre: There are at least three characters
+# Post: The script is a series of scenes between two characters, picked with Zipf-like weights so a
+#       few characters speak most of the lines, like the real movies. Within a scene the two mostly
+#       take turns, sometimes speak twice in a row, and are sometimes cut into by a third character.
+#       Each character has its own typical sentiment that its lines scatter around. Everything is
+#       generated with numpy on whole arrays, and 'character' and 'dialogue' are categoricals, so
+#       10M lines take a couple of seconds and the script itself only about 30 bytes a line
+# ************************************************************************************************
+def makeSyntheticScript(numLines, numCharacters, seed=0, sceneLength=12, repeatChance=0.2, interruptChance=0.05):
+    if numCharacters < 3:
+        raise ValueError('a synthetic script needs at least three characters')
+    rng = np.random.default_rng(seed)
+
+    weights = 1 / np.arange(1, numCharacters + 1)
+    weights /= weights.sum()
+
+    # Enough scenes are drawn to cover every line, then the last one is cut short
+    numScenes = int(numLines / sceneLength * 1.5) + 10
+    sceneLengths = rng.geometric(1 / sceneLength, numScenes)
+    while sceneLengths.sum() < numLines:
+        sceneLengths = np.r_[sceneLengths, rng.geometric(1 / sceneLength, numScenes)]
+    sceneOf = np.repeat(np.arange(len(sceneLengths)), sceneLengths)[:numLines]
+    numScenes = sceneOf[-1] + 1 if numLines else 0
+
+    # Each scene's two speakers and the character who may cut in, all different from one another
+    speakerA = rng.choice(numCharacters, numScenes, p=weights)
+    speakerB = (speakerA + 1 + rng.choice(numCharacters - 1, numScenes, p=weights[:-1] / weights[:-1].sum())) % numCharacters
+    third = rng.integers(0, numCharacters, numScenes)
+    clash = (third == speakerA) | (third == speakerB)
+    while clash.any():
+        third[clash] = rng.integers(0, numCharacters, clash.sum())
+        clash = (third == speakerA) | (third == speakerB)
+
+    # The speaker switches sides on every line except repeats, counted from the start of each scene
+    switches = (rng.random(numLines) >= repeatChance).astype(np.int64)
+    sceneStarts = np.flatnonzero(np.r_[True, sceneOf[1:] != sceneOf[:-1]]) if numLines else np.array([], dtype=np.int64)
+    switches[sceneStarts] = 0
+    turns = np.cumsum(switches)
+    turns -= np.repeat(turns[sceneStarts], np.diff(np.r_[sceneStarts, numLines]))
+    codes = np.where(turns % 2 == 0, speakerA[sceneOf], speakerB[sceneOf])
+    interrupted = rng.random(numLines) < interruptChance
+    codes[interrupted] = third[sceneOf[interrupted]]
+
+    names = ['CHARACTER' + str(i) for i in range(numCharacters)]
+    baselines = rng.normal(0, 0.3, numCharacters)
+    sentiments = np.clip(baselines[codes] + rng.normal(0, 0.5, numLines), -1, 1)
+
+    dialogueCodes = rng.integers(0, len(DIALOGUE_POOL), numLines)
+    entityLists = np.empty(len(DIALOGUE_POOL), dtype=object)
+    entityLists[:] = [entities for text, entities in DIALOGUE_POOL]
+
+    return pd.DataFrame({'line': np.arange(1, numLines + 1),
+                         'character': pd.Categorical.from_codes(codes, names),
+                         'dialogue': pd.Categorical.from_codes(dialogueCodes, [text for text, entities in DIALOGUE_POOL]),
+                         'sentiment': sentiments,
+                         'entities': entityLists[dialogueCodes]})
+
+# ************************************************************************************************
+# Function: makeSyntheticClassifications()
+# Description: This function labels the characters of a synthetic script like
+#              Protagonist_or_Antagonist.csv
+# Input Parameters: The synthetic script and the random seed
+# Returns: A dataframe with the columns 'character' and 'classification'
+# Pre: N/A
+# Post: About a fifth of the characters are protagonists, an eighth antagonists, and the rest
+#       neither, close to the real file's split
+# ************************************************************************************************
+def makeSyntheticClassifications(script, seed=0):
+    rng = np.random.default_rng(seed)
+    characters = pd.Series(script['character'].astype('category').cat.categories.astype(str))
+    return pd.DataFrame({'character': characters,
+                         'classification': rng.choice(['Protagonist', 'Antagonist', 'Neither'], len(characters),
+                                                      p=[0.2, 0.12, 0.68])})
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic scored script for testing at scale')
+    parser.add_argument('output', help='CSV file to write')
+    parser.add_argument('--lines', type=int, default=100000)
+    parser.add_argument('--characters', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    makeSyntheticScript(args.lines, args.characters, args.seed).to_csv(args.output, index=False)
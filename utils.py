@@ -3,7 +3,7 @@ import matplotlib.pyplot as plt
 import numpy as np
 from sklearn.linear_model import LinearRegression
 from sklearn.preprocessing import PolynomialFeatures
-from statistics import mean
+from profiling import profiled
 
 # ************************************************************************************************
 # Function: fitRegression()
@@ -17,6 +17,7 @@ from statistics import mean
 # Post: A LinearRegression() model is created and fitted to the data based on polynomial features
 #       specified by the deg parameter. This model is returned once fitted
 # ************************************************************************************************
+@profiled('fit', lambda X, *args, **kwargs: len(X))
 def fitRegression(X, y, deg):
     polyFeatures = PolynomialFeatures(degree=deg, include_bias=False)
     xPoly = polyFeatures.fit_transform(X)
@@ -28,50 +29,172 @@ def fitRegression(X, y, deg):
 # Function: plotRegression()
 # Description: This function plots a polynomial regression using pyplot
 # Input Parameters: X and y, the independent and dependent variables passed as numpy arrays, the
-#                   LinearRegression() model, and the degree of the polynomial regression
+#                   LinearRegression() model, the degree of the polynomial regression, and the most
+#                   points to scatter (None scatters them all)
 # Returns: N/A
 # Pre: X and y are both stored as numpy arrays reshaped on (-1, 1), the model has been fit to the
 #      data based on polynomial features specified by the degree, and the degree accurately
 #      reflects the degree of the polynomial features used in fitting the model
 # Post: The data and regression line are plotted. The plot is not yet shown because it hasn't had
-#       its axes labeled or a title added. This is left to the user
+#       its axes labeled or a title added. This is left to the user. The powers of the plotted x
+#       values are taken directly, which matches PolynomialFeatures(include_bias=False) without
+#       fitting a new one on every call. With maxPoints, the scatter is thinned by downsampleSeries()
 # ***********************************************************************************************
-def plotRegression(X, y, model, deg):
-    polyFeatures = PolynomialFeatures(degree=deg, include_bias=False)
-    plt.scatter(X, y, color='black')
+def plotRegression(X, y, model, deg, maxPoints=None):
+    kept = downsampleSeries(X, y, maxPoints)
+    plt.scatter(np.ravel(X)[kept], np.ravel(y)[kept], color='black')
     xDelta = np.linspace(X.min(), X.max(), 1000)
-    yDelta = model.predict(polyFeatures.fit_transform(xDelta.reshape(-1, 1)))
+    yDelta = model.predict(xDelta.reshape(-1, 1) ** np.arange(1, deg + 1))
     plt.plot(xDelta, yDelta, color='blue', linewidth=2)
 
+# ***********************************************************************************************
+# Function: downsampleSeries()
+# Description: This function picks the points of a series to plot so that its shape survives with far
+#              fewer points, using Largest-Triangle-Three-Buckets (LTTB)
+# Input Parameters: The x and y values (x in increasing order) and the most points to keep
+# Returns: A sorted array of the positions of the points to keep (every position if the series
+#          already fits or maxPoints is None)
+# Pre: maxPoints is None or at least 3
+# Post: The first and last points are always kept. The rest are split into maxPoints - 2 buckets and
+#       the point kept from each is the one making the largest triangle with the point kept from the
+#       previous bucket and the average of the next bucket, so peaks and dips are kept rather than
+#       averaged away. Each point is looked at once
+# ***********************************************************************************************
+def downsampleSeries(x, y, maxPoints):
+    x = np.asarray(x, dtype=float).ravel()
+    y = np.asarray(y, dtype=float).ravel()
+    numPoints = len(x)
+    if maxPoints is None or numPoints <= maxPoints:
+        return np.arange(numPoints)
+
+    edges = np.linspace(1, numPoints - 1, maxPoints - 1).astype(np.int64)
+    kept = np.empty(maxPoints, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = numPoints - 1
+    previous = 0
+    for bucket in range(maxPoints - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        nextStop = edges[bucket + 2] if bucket + 2 < len(edges) else numPoints
+        averageX = x[stop:nextStop].mean()
+        averageY = y[stop:nextStop].mean()
+        areas = np.abs((x[previous] - averageX) * (y[start:stop] - y[previous]) -
+                       (x[previous] - x[start:stop]) * (averageY - y[previous]))
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
+
+# *************************************************************************************************
+# Function: findCharacterStats()
+# Description: This function calculates summary statistics of the expressed sentiment for all
+#              characters above a set threshold for number of lines
+# Input Parameters: The dataframe containing the script to be analyzed (or the script already grouped
+#                   by 'character'), the minimum number of lines for a character to be included,
+#                   whether to include the variance, and an optional list of quantiles to include
+# Returns: A pandas Dataframe indexed by character with the columns 'mean' and 'count', plus 'var'
+#          and one column per quantile (e.g. 'q0.5') if they were asked for, sorted by mean in
+#          descending order
+# Pre: The script has the columns 'character' and 'sentiment'. If it is already grouped, it was
+#      grouped by 'character'
+# Post: All of the statistics are computed from one groupby, so passing in a script that has already
+#       been grouped (or has a categorical 'character' column) lets repeated calls reuse the grouping.
+#       Characters with fewer lines than the threshold are removed with a boolean mask
+# *************************************************************************************************
+@profiled('aggregate', lambda script, *args, **kwargs: len(getattr(script, 'obj', script)))
+def findCharacterStats(script, minLines=20, variance=False, quantiles=None):
+    if isinstance(script, pd.DataFrame):
+        script = script.groupby('character', observed=True)
+    if isinstance(script, pd.core.groupby.DataFrameGroupBy):
+        script = script['sentiment']
+
+    characterStats = script.agg(['mean', 'size', 'var'] if variance else ['mean', 'size'])
+    characterStats = characterStats.rename(columns={'size': 'count'})
+    if quantiles:
+        characterQuantiles = script.quantile(quantiles).unstack()
+        characterQuantiles.columns = ['q' + str(q) for q in characterQuantiles.columns]
+        characterStats = characterStats.join(characterQuantiles)
+
+    characterStats = characterStats[characterStats['count'] >= minLines]
+    return characterStats.sort_values('mean', ascending=False)
+
 # *************************************************************************************************
 # Function: findCharacterAverages()
 # Description: This function calculates the average expressed sentiment for all characters above a
 #              set threshold for number of lines
-# Input Parameters: The dataframe containing the script to be analyzed and the minimum number of
-#                   lines for a characer to be in the list
+# Input Parameters: The dataframe containing the script to be analyzed (or the script already grouped
+#                   by 'character') and the minimum number of lines for a characer to be in the list
 # Returns: A pandas Series with all characters having more than the specified number of lines
 #          sorted by average expressed sentiment in descending order
 # Pre: The script dataframe is formatted as the sentiment scripts with sentiments have been in this
 #      project have been, or at least has the columns 'character' and 'sentiment'
-# Post: The characters' average expressed sentiments are calculated and stored in a descending
-#       pandas Series, then all characters with less than the threshold number of lines are removed
-#       before the Series is returned
+# Post: The characters' average expressed sentiments and line counts are calculated together by
+#       findCharacterStats(), which drops the characters with less than the threshold number of
+#       lines before the averages are returned as a descending pandas Series
 # *************************************************************************************************
 def findCharacterAverages(script, minLines=20):
-    characterAverages = script.groupby('character')['sentiment'].mean()
-    characterAverages.sort_values(ascending=False, inplace=True)
+    return findCharacterStats(script, minLines)['mean'].rename('sentiment')
 
-    numLines = {}
-    characters = [*set(script['character'].values.tolist())]
-    for character in characters:
-        numLines[character] = script['character'].value_counts()[character]
+# ************************************************************************************************
+# Function: spliceDialogueSpans()
+# Description: This function finds the dialogues in a list of script dataframes and returns them as
+#              a table of line spans instead of copying each one into its own dataframe
+# Input Parameters: The list of scripts and the minimum length of a dialogue to be included in the
+#                   table
+# Returns: A dataframe with one row per dialogue and the columns 'movie' (the position of the script
+#          in the list), 'start' and 'stop' (the row positions of the dialogue, stop exclusive), and
+#          'characterA' and 'characterB' (the two characters the dialogue started between)
+# Pre: The movie dataframes have their character column labeled 'character'
+# Post: A dialogue starts on the last line of the previous one and runs until a third character
+#       speaks. Since consecutive lines by the same speaker always stay together, each script is
+#       reduced to runs of lines by one speaker, and a dialogue can only end at a run whose speaker
+#       differs from the speaker two runs before it. These breaks are found with numpy on the
+#       factorized character codes, so no rows are looked up one at a time
+# ************************************************************************************************
+@profiled('splice', lambda movies, *args, **kwargs: sum(len(movie.index) for movie in movies))
+def spliceDialogueSpans(movies, minLength=4):
+    spans = []
+    for movieId, movie in enumerate(movies):
+        codes, names = pd.factorize(movie['character'])
+        numRows = len(codes)
+        if numRows < 2:
+            continue
+
+        runStarts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        runEnds = np.r_[runStarts[1:], numRows]
+        runCodes = codes[runStarts]
+        numRuns = len(runStarts)
+
+        # Each dialogue after the first ends at the next break and the one after it starts on the last
+        # line of the run just before that break
+        breaks = np.r_[np.flatnonzero(runCodes[2:] != runCodes[:-2]) + 2, numRuns]
+        starts = runEnds[np.r_[0, breaks[:-1] - 1]] - 1
+        stops = runEnds[breaks - 1]
 
-    minorCharacters = []
-    for character in numLines:
-        if (numLines[character] < minLines):
-            minorCharacters.append(character)
-    
-    return characterAverages.drop(labels=minorCharacters)
+        # If the first speaker says more than one line before anyone answers, those lines make up a
+        # dialogue of their own before the first run's last line starts the next one
+        if runEnds[0] > 1:
+            starts = np.r_[0, starts]
+            stops = np.r_[runEnds[0], stops]
+
+        # Splicing stops as soon as a dialogue reaches the second to last line of the script
+        last = np.flatnonzero(stops >= numRows - 1)
+        if len(last):
+            starts = starts[:last[0] + 1]
+            stops = stops[:last[0] + 1]
+
+        keep = stops - starts >= minLength
+        starts = starts[keep]
+        stops = stops[keep]
+        spans.append(pd.DataFrame({'movie': movieId,
+                                   'start': starts,
+                                   'stop': stops,
+                                   'characterA': names.take(codes[starts]),
+                                   'characterB': names.take(codes[starts + 1])}))
+
+    if not spans:
+        return pd.DataFrame({'movie': pd.Series(dtype=int), 'start': pd.Series(dtype=int),
+                             'stop': pd.Series(dtype=int), 'characterA': pd.Series(dtype=object),
+                             'characterB': pd.Series(dtype=object)})
+    return pd.concat(spans, ignore_index=True)
 
 # ************************************************************************************************
 # Function: spliceDialogues()
@@ -82,60 +205,107 @@ def findCharacterAverages(script, minLines=20):
 # Returns: A list of dataframes for each dialogue
 # Pre: The movie dataframes have their character column labeled 'character'
 # Post: The movie scripts are spliced into dialogues, which are put in a list and the list is
-#       returned
+#       returned. The dialogues are found with spliceDialogueSpans(), which should be used directly
+#       when the separate dataframes aren't needed
 # ************************************************************************************************
 def spliceDialogues(movies, minLength=4):
-    dialogues = []
-    for movie in movies:
-        numRows = len(movie.index)
-        start = 0
-        stop = 0
+    spans = spliceDialogueSpans(movies, minLength)
+    return [movies[movieId].iloc[start:stop, :]
+            for movieId, start, stop in zip(spans['movie'], spans['start'], spans['stop'])]
 
-        while stop < numRows - 1:
-            characterA = movie.at[start, 'character']
-            characterB = movie.at[start + 1, 'character']
+# *************************************************************************************************
+# Function: findDialogueListeners()
+# Description: This function finds who every line of every dialogue was spoken to
+# Input Parameters: The list of script dataframes and the table of dialogue spans found in them by
+#                   spliceDialogueSpans()
+# Returns: The index of character names, the sentiment of every line of the scripts concatenated in
+#          order, and three arrays with one entry per line received in dialogue: its row in the
+#          concatenated scripts, its speaker's code, and its listener's code
+# Pre: The spans were found in the same list of scripts, in the same order, and the scripts have the
+#      columns 'character' and 'sentiment'
+# Post: Every dialogue is between the two characters it started with, so each line in it is received
+#       by whichever of the two didn't speak it. The lines of every dialogue are gathered in one
+#       pass. Lines in the one-line overlap between consecutive dialogues are listed for both
+# *************************************************************************************************
+def findDialogueListeners(movies, spans):
+    codes, names = pd.factorize(pd.concat([movie['character'] for movie in movies], ignore_index=True))
+    names = pd.Index(names, name=None)
+    sentiments = np.concatenate([movie['sentiment'].to_numpy(dtype=float) for movie in movies])
 
-            stop = start + 2
-            while (stop < numRows and (movie.at[stop, 'character']==characterA or movie.at[stop, 'character']==characterB)):
-                stop += 1
+    offsets = np.r_[0, np.cumsum([len(movie.index) for movie in movies])[:-1]].astype(np.int64)
+    starts = offsets[spans['movie'].to_numpy(dtype=np.int64)] + spans['start'].to_numpy(dtype=np.int64)
+    lengths = spans['stop'].to_numpy(dtype=np.int64) - spans['start'].to_numpy(dtype=np.int64)
 
-            if stop - start >= minLength:
-                dialogues.append(movie.iloc[start:stop, :])
+    # lineIndex holds the row of every line of every dialogue, one dialogue after another
+    firstLines = np.r_[0, np.cumsum(lengths)[:-1]].astype(np.int64)
+    lineIndex = np.repeat(starts - firstLines, lengths) + np.arange(lengths.sum())
+    speakerA = np.repeat(codes[starts], lengths)
+    speakerB = np.repeat(codes[starts + 1], lengths)
+    speakers = codes[lineIndex]
+    listeners = np.where(speakers == speakerA, speakerB, speakerA)
 
-            start = stop - 1
-    
-    return dialogues
+    # A dialogue that opens with one character talking has nobody receiving those lines
+    received = listeners != speakers
+    return names, sentiments, lineIndex[received], speakers[received], listeners[received]
 
 # *************************************************************************************************
 # Function: findAverageReceived()
 # Description: This function calculates the average received sentiment for each character spoken to
 #              more than a set number of times in dialogue
-# Input Parameters: An array of dataframes containing separate dialogues between characters, a list
-#                   of all characters to be analyzed, and the minimum number of lines to be spoken
-#                   to each character in dialogue
+# Input Parameters: The list of script dataframes, the table of dialogue spans found in them by
+#                   spliceDialogueSpans(), an optional list of characters to limit the results to,
+#                   and the minimum number of lines to be spoken to each character in dialogue
 # Returns: A pandas Series with each major character's average received sentiment
-# Pre: The scripts have been spliced into dialogues in the dialogues list and the characters list
-#      accurately reflects the names of all the character in the dialogues
+# Pre: The spans were found in the same list of scripts, in the same order, and the scripts have the
+#      columns 'character' and 'sentiment'
+# Post: The received lines are found by findDialogueListeners() and their sentiments are summed per
+#       listener with np.bincount(). Lines in the one-line overlap between consecutive dialogues
+#       count toward both, as they always have
 # *************************************************************************************************
-def findAverageReceived(dialogues, characters, minLines=20):
-    characterAverageReceivedDict = {}
-    for character in characters:
-        receivedSentiments = []
-        for dialogue in dialogues:
-            if not np.any(dialogue['character'].values == character):
-                continue
-
-            for i in dialogue.index:
-                if dialogue.at[i, 'character'] != character:
-                    receivedSentiments.append(dialogue.at[i, 'sentiment'])
-
-        if len(receivedSentiments) >= minLines:
-            characterAverageReceivedDict[character] = mean(receivedSentiments)
-
-    characterAverageReceived = pd.Series(characterAverageReceivedDict, name='sentiment')
+@profiled('aggregate', lambda movies, *args, **kwargs: sum(len(movie.index) for movie in movies))
+def findAverageReceived(movies, spans, characters=None, minLines=20):
+    names, sentiments, lineIndex, speakers, listeners = findDialogueListeners(movies, spans)
+    receivedSums = np.bincount(listeners, weights=sentiments[lineIndex], minlength=len(names))
+    receivedCounts = np.bincount(listeners, minlength=len(names))
+
+    keep = receivedCounts >= max(minLines, 1)
+    if characters is not None:
+        keep &= names.isin(characters)
+
+    characterAverageReceived = pd.Series(receivedSums[keep] / receivedCounts[keep], index=names[keep],
+                                         name='sentiment')
     characterAverageReceived.sort_values(ascending=False, inplace=True)
     return characterAverageReceived
 
+# *************************************************************************************************
+# Function: findLineReceived()
+# Description: This function finds the sentiment each line of dialogue is answering
+# Input Parameters: The list of script dataframes and the table of dialogue spans found in them by
+#                   spliceDialogueSpans()
+# Returns: A numpy array with one value per line of the scripts concatenated in order, holding the
+#          sentiment of the line just before it in the same dialogue, or NaN for lines that aren't
+#          answering anyone
+# Pre: The spans were found in the same list of scripts, in the same order, and the scripts have the
+#      columns 'character' and 'sentiment'
+# Post: Every line after the first of a dialogue whose speaker differs from the line before it gets
+#       that line's sentiment. A character continuing their own turn isn't answering anyone
+# *************************************************************************************************
+@profiled('aggregate', lambda movies, *args, **kwargs: sum(len(movie.index) for movie in movies))
+def findLineReceived(movies, spans):
+    codes = pd.factorize(pd.concat([movie['character'] for movie in movies], ignore_index=True))[0]
+    sentiments = np.concatenate([movie['sentiment'].to_numpy(dtype=float) for movie in movies])
+    received = np.full(len(codes), np.nan)
+
+    offsets = np.r_[0, np.cumsum([len(movie.index) for movie in movies])[:-1]].astype(np.int64)
+    starts = offsets[spans['movie'].to_numpy(dtype=np.int64)] + spans['start'].to_numpy(dtype=np.int64) + 1
+    lengths = spans['stop'].to_numpy(dtype=np.int64) - spans['start'].to_numpy(dtype=np.int64) - 1
+
+    firstLines = np.r_[0, np.cumsum(lengths)[:-1]].astype(np.int64)
+    lineIndex = np.repeat(starts - firstLines, lengths) + np.arange(lengths.sum())
+    lineIndex = lineIndex[codes[lineIndex] != codes[lineIndex - 1]]
+    received[lineIndex] = sentiments[lineIndex - 1]
+    return received
+
 # **********************************************************************************************
 # Function: joinSentimentSeries()
 # Description: This function takes in the pandas Series for the average expressed and received
@@ -160,52 +330,106 @@ def joinSentimentSeries(expressed, received):
     sentimentTable = sentimentTable.rename(columns={'index':'character'})
     return sentimentTable
 
+# *************************************************************************************************
+# Function: balanceIndex()
+# Description: This function picks the rows to keep so that every class has the same number of rows
+# Input Parameters: The array of class labels, the random seed (None for a different sample each
+#                   time), an optional array of strata (e.g. the movie of each line) to balance
+#                   within separately, the strategy ('under' to sample every class down to the
+#                   smallest or 'over' to sample every class up to the largest), and the labels of
+#                   rows to leave out entirely
+# Returns: A sorted numpy array of the row positions to keep (with repeats when over-sampling)
+# Pre: The strata, if given, are the same length as the labels
+# Post: Only position arrays are built, so nothing is copied from the data the labels came from. The
+#       classes are those found outside the excluded labels, so under-sampling a stratum that is
+#       missing a class leaves none of that stratum. Over-sampling keeps every row and adds rows
+#       drawn with replacement, and can't add rows to a class a stratum doesn't have
+# *************************************************************************************************
+@profiled('balance', lambda labels, *args, **kwargs: len(labels))
+def balanceIndex(labels, seed=None, strata=None, strategy='under', exclude=()):
+    if strategy not in ('under', 'over'):
+        raise ValueError('UNKNOWN BALANCING STRATEGY: ' + str(strategy))
+
+    labels = np.asarray(labels)
+    rng = np.random.default_rng(seed)
+    keep = ~np.isin(labels, list(exclude))
+    classes = np.unique(labels[keep])
+
+    if strata is None:
+        groups = [np.flatnonzero(keep)]
+    else:
+        strata = np.asarray(strata)
+        groups = [np.flatnonzero(keep & (strata == stratum)) for stratum in pd.unique(strata[keep])]
+
+    chosen = []
+    for positions in groups:
+        members = [positions[labels[positions] == label] for label in classes]
+        counts = [len(rows) for rows in members]
+        target = min(counts) if strategy == 'under' else max(counts)
+        for rows in members:
+            if target <= len(rows):
+                chosen.append(rng.choice(rows, target, replace=False))
+            elif len(rows):
+                chosen.append(np.concatenate([rows, rng.choice(rows, target - len(rows), replace=True)]))
+
+    if not chosen:
+        return np.array([], dtype=np.int64)
+    return np.sort(np.concatenate(chosen))
+
 # *************************************************************************************************
 # Function: balanceScript()
 # Description: This function takes in a pandas Dataframe containing a script with character
-#             classifications and modifies it so that there are no characters classified as
-#             'Neither' and an equal number of character classified as 'Proagonist' and
-#             'Antagonist'
-# Input Parameters: The pandas Dataframe containing the script to be modified
-# Returns: A pandas Dataframe with the modified script
+#             classifications and returns the lines to use so that there are no characters
+#             classified as 'Neither' and an equal number of character classified as 'Proagonist'
+#             and 'Antagonist'
+# Input Parameters: The pandas Dataframe containing the script, the random seed, an optional column
+#                   name (or array) to balance within separately, like the movie, and the sampling
+#                   strategy ('under' or 'over')
+# Returns: A pandas Dataframe with the balanced script
 # Pre: The script has a column named 'classification' specifying if the character speaking each
 #      line is a 'Protagonist', 'Antagonist', or 'Neither'
-# Post: The script is modified to have an equal number of protagonist and antagonist lines and none
-#       from character classified as neither. This modified script is then returned
+# Post: The rows are picked with balanceIndex() and taken from the script in one step, so the script
+#       passed in is left unchanged and no intermediate copies are made. The same seed always gives
+#       the same lines
 # *************************************************************************************************
-def balanceScript(script):
-    script.drop(script[script['classification'] == 'Neither'].index, inplace=True)
-    protagonists = script[script['classification'] == 'Protagonist']
-    antagonists = script[script['classification'] == 'Antagonist']
-
-    if len(protagonists) == len(antagonists):
-        return script
-    elif len(protagonists) > len(antagonists):
-        cut_protagonists = protagonists.sample(n=len(antagonists.index))
-        return pd.concat([cut_protagonists, antagonists])
-    else:
-        cut_antagonists = antagonists.sample(n=len(protagonists.index))
-        return pd.concat([protagonists, cut_antagonists])
+def balanceScript(script, seed=None, strata=None, strategy='under'):
+    if isinstance(strata, str):
+        strata = script[strata].to_numpy()
+    return script.iloc[balanceIndex(script['classification'].to_numpy(), seed, strata, strategy, exclude=['Neither'])]
+
+# ************************************************************************************************
+# Function: decisionSurface()
+# Description: This function finds a fitted classifier's class probabilities over an evenly spaced
+#              range of inputs
+# Input Parameters: The fitted classifier (anything with predict_proba(), e.g. the KNN or decision
+#                   tree models from classification.py), the lower and upper bounds for the inputs,
+#                   and the number of inputs to test
+# Returns: A numpy array of the inputs and a numpy array of probabilities with one row per input and
+#          one column per class, in the order of the classifier's classes_
+# Pre: The classifier was fit on a single feature
+# Post: The inputs come from np.linspace(), so both bounds are always included and the spacing
+#       doesn't drift. Every input is predicted in one predict_proba() call. If the classifier was
+#       fit on a dataframe, the inputs are given the same column name so it doesn't warn
+# ************************************************************************************************
+def decisionSurface(classifier, minX, maxX, resolution=51):
+    xCoors = np.linspace(minX, maxX, resolution)
+    inputs = xCoors.reshape(-1, 1)
+    if hasattr(classifier, 'feature_names_in_'):
+        inputs = pd.DataFrame(inputs, columns=classifier.feature_names_in_)
+    return xCoors, classifier.predict_proba(inputs)
 
 # ************************************************************************************************
 # Function: visualizeKnnClassifier()
 # Description: This function plots the predictions of a KNN classifier on a range of inputs
-# Input Parameters: The KNN classification model and the lower and upper bounds for inputs to be
-#                   tested
+# Input Parameters: The KNN classification model, the lower and upper bounds for inputs to be
+#                   tested, and the number of inputs to test
 # Returns: N/A
 # Pre: This function assumes that there are only two classifications for the KNN classification
 #      model to choose from and that the second is the one to plot
 # Post: The likelihood of the KNN Classifier selecting the second classification is calculated for
-#       50 x-values in the specified range and plotted in a scatter plot
+#       51 x-values (by default) evenly spaced across the specified range with decisionSurface()
+#       and plotted in a scatter plot
 # ************************************************************************************************
-def visualizeKnnClassifier(knnClassifier, minX, maxX):
-    xCoors = []
-    yCoors = []
-
-    x = minX
-    while x <= maxX:
-        xCoors.append(x)
-        yCoors.append(knnClassifier.predict_proba([[x]])[0, 1])
-        x += (maxX - minX) / 50
-
-    plt.scatter(xCoors, yCoors)
\ No newline at end of file
+def visualizeKnnClassifier(knnClassifier, minX, maxX, resolution=51):
+    xCoors, probabilities = decisionSurface(knnClassifier, minX, maxX, resolution)
+    plt.scatter(xCoors, probabilities[:, 1])